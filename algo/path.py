@@ -1,28 +1,59 @@
 # Path Algorithms
 #
 
+from collections import deque
+
+from util.lru import LRUCache
+
+# Marks a path missing from the cache; None is a cached result.
+_MISSING = object()
+
 class ShortestPaths(object):
 	"""
-	Floyd-Warshall shortest path between vertex pairs.
+	All-pairs shortest paths between vertex pairs.
 
 	Computes the shortest path between every vertex pair and stores the
-	weights and path reconstruction matrix. This algorithm is extremely
-	slow: O(n^3) worst case. Path reconstruction takes additional
-	recursive computation between each vertex pair.
+	weights and a next-hop path reconstruction matrix. Two engines are
+	available:
+
+		* 'bfs' -- Breadth first search from every vertex. Only valid
+				   for unit weight graphs, O(n*(n+e)). Molecular graphs
+				   are sparse, so this is close to O(n^2).
+		* 'floyd' -- Floyd-Warshall, for arbitrary weights. This
+					 algorithm is extremely slow: O(n^3) worst case.
+
+	Path reconstruction walks the next-hop matrix, so it takes time
+	proportional to the path length. Reconstructed paths are kept in a
+	least recently used cache.
 
 	You can do the calculation work upfront by calling calculate(), or
 	wait for the first call of getWeight() or findPath() to do so.
 	"""
 
-	def __init__(self, matrix):
+	ENGINES = ('bfs', 'floyd')
+
+	def __init__(self, matrix, engine=None, cacheSize=1024):
 		"""
 		Supply the graph adjacency matrix.
 		Not connected must be represented by float('Infinity').
+
+		The engine is chosen automatically if not specified: 'bfs' if
+		every edge has unit weight, otherwise 'floyd'. At most
+		cacheSize reconstructed paths are cached.
 		"""
+		if engine and engine not in self.ENGINES:
+			raise Exception, "Invalid shortest path engine, `%s`." % engine
+
 		self.matrix = matrix
+		self.engine = engine
 		self.weights = None
 		self.paths = None
-		pass
+
+		# LRU cache of reconstructed paths, keyed by (i, j)
+		self._pathCache = LRUCache(cacheSize)
+
+		if not self.engine:
+			self.engine = 'bfs' if is_unit_weight(matrix) else 'floyd'
 
 	def size(self):
 		"""
@@ -39,7 +70,10 @@ class ShortestPaths(object):
 		# Do not calculate twice!
 		if self.weights:
 			return 		
-		data = shortest_paths(self.matrix)
+		if self.engine == 'bfs':
+			data = bfs_shortest_paths(self.matrix)
+		else:
+			data = shortest_paths(self.matrix)
 		self.weights = data[0]
 		self.paths = data[1]
 
@@ -48,7 +82,7 @@ class ShortestPaths(object):
 		Get the weight of the shortest path between i and j.
 		If the result set has not already been calculated, it will now.
 		"""
-		# Floyd-Warshall. Results will be cached. 
+		# Results will be cached. 
 		self.calculate()
 		return self.weights[i][j]
 
@@ -56,28 +90,31 @@ class ShortestPaths(object):
 		"""
 		Get the shortest path between i and j.
 		If the result set has not already been calculated, it will now.
-		Additionally, a recursive algorithm has to run in order to 
-		reconstruct the path. 
 		Returns one of:
 			* A list containing the path
 			* None, if (i->j) is an edge itself.
 			* float('Infinity'), if DNE
 		"""
-		# Floyd-Warshall. Results will be cached. 
+		# Results will be cached. 
 		self.calculate()
 
-		# TODO: Mechanism to cache?
-		ret = reconstruct_path(self.paths, i, j)
+		ret = self._pathCache.get((i, j), _MISSING)
+		if ret is _MISSING:
+			ret = reconstruct_path(self.paths, i, j)
+			if type(ret) == list:
+				ret = tuple(ret)
+			self._pathCache.put((i, j), ret)
 
-		if not include or type(ret) == float:
+		if type(ret) == float:
 			return ret
 
-		if include and ret == None:
-			ret = []
+		if not include:
+			return list(ret) if ret != None else None
+
+		if ret == None:
+			ret = ()
 
-		ret.insert(0, i)
-		ret.append(j)
-		return ret
+		return [i] + list(ret) + [j]
 
 def shortest_paths(matrix):
 	"""
@@ -100,10 +137,10 @@ def shortest_paths(matrix):
 	# We build this Dynamic Programming matrix as we increment k. 
 	cost = [[inf for x in range(length)] for xx in range(length)]
 
-	# Path reconstruction matrix.
+	# Path reconstruction (next-hop) matrix.
 	# For the shortest path between i and j, path[i][j] is the next
-	# vertex along the path. Next take path[vert][j], and so forth...
-	# (See the reconstruct path routine.)
+	# vertex after i along the path. Next take path[vert][j], and so
+	# forth until j is reached. (See the reconstruct path routine.)
 	path = [[inf for x in range(length)] for xx in range(length)]
 
 	# Initialize cost^(0) = matrix 
@@ -111,48 +148,121 @@ def shortest_paths(matrix):
 		for j in range(length):
 			cost[i][j] = matrix[i][j]
 			if cost[i][j] not in DNE:
-				path[i][j] = None # XXX: None denotes directly exists
+				path[i][j] = j # Directly connected
 
 	# Floyd's Algorithm
 	for k in range(length):
+		costK = cost[k]
 		for i in range(length):
+			costI = cost[i]
+			costIK = costI[k]
+			if costIK in DNE:
+				continue
 			for j in range(length):
 				if i == j:
 					continue
-				if cost[i][j] > cost[i][k] + cost[k][j]:
-					cost[i][j] = cost[i][k] + cost[k][j]
-					path[i][j] = k
+				if costI[j] > costIK + costK[j]:
+					costI[j] = costIK + costK[j]
+					path[i][j] = path[i][k]
 
 	return (cost, path)
 
-def reconstruct_path(pathMat, i, j):
+def is_unit_weight(matrix):
 	"""
-	Recursive algorithm to reconstruct the path between two vertices
-	from the matrix that Floyd-Warshall returns.
+	Determine if every edge in the adjacency matrix has a weight of
+	one, ie. the graph is unweighted. The diagonal is not considered.
 	"""
-	# FIXME: Don't keep redefining these recursively.
-	# FIXME: Will recursion kill the Python stack?
 	inf = float('Infinity')
 	DNE = [inf, -inf]
 
-	k = pathMat[i][j]
+	length = len(matrix)
+	for i in range(length):
+		row = matrix[i]
+		for j in range(length):
+			if i == j or row[j] in DNE:
+				continue
+			if row[j] != 1:
+				return False
+	return True
+
+def bfs_shortest_paths(matrix):
+	"""
+	Unit weight shortest paths algorithm: breadth first search from
+	every vertex.
+
+	Returns a tuple of the cost matrix and the next-hop path
+	reconstruction matrix, with the same conventions as the
+	Floyd-Warshall ones: infinity where no path exists, and the
+	diagonal is taken from the input. Each search runs backwards from
+	a target vertex, so the vertex we arrive from is the next hop
+	towards that target.
+	"""
+	inf = float('Infinity')
+	DNE = [inf, -inf]
+
+	length = len(matrix)
 
-	if k in DNE:
+	# Incoming adjacency lists
+	incoming = [[] for x in range(length)]
+	for i in range(length):
+		row = matrix[i]
+		for j in range(length):
+			if i != j and row[j] not in DNE:
+				incoming[j].append(i)
+
+	cost = [[inf for x in range(length)] for xx in range(length)]
+	path = [[inf for x in range(length)] for xx in range(length)]
+
+	for dst in range(length):
+		# Distances from every vertex to dst
+		dist = [inf for x in range(length)]
+		dist[dst] = 0
+
+		queue = deque([dst])
+		while queue:
+			v = queue.popleft()
+			d = dist[v] + 1
+			for n in incoming[v]:
+				if dist[n] != inf:
+					continue
+				dist[n] = d
+				cost[n][dst] = d
+				path[n][dst] = v
+				queue.append(n)
+
+		# The diagonal follows the input matrix, as in Floyd-Warshall.
+		cost[dst][dst] = matrix[dst][dst]
+		if cost[dst][dst] not in DNE:
+			path[dst][dst] = dst
+
+	return (cost, path)
+
+def reconstruct_path(pathMat, i, j):
+	"""
+	Reconstruct the path between two vertices by walking the next-hop
+	matrix that the shortest path algorithms return. This is iterative
+	and takes time proportional to the path length.
+
+	Returns the intermediate vertices as a list, None if the path is
+	an edge itself, or infinity if no path exists.
+	"""
+	inf = float('Infinity')
+
+	k = pathMat[i][j]
+	if k == inf:
 		# Path does not exist between i and j. 
 		# TODO: Throw exception?
 		return inf
-	if k == None:
-		# This path is an edge itself. 
-		return None
 
-	l = reconstruct_path(pathMat, i, k)
-	r = reconstruct_path(pathMat, k, j)
+	path = []
+	while k != j:
+		path.append(k)
+		k = pathMat[k][j]
+		if len(path) > len(pathMat):
+			raise Exception, "Path reconstruction did not terminate."
 
-	cur = [k]
-	if type(l) == list:
-		cur = l + cur
-	if type(r) == list:
-		cur = cur + r
-
-	return cur
+	if not path:
+		# This path is an edge itself. 
+		return None
 
+	return path
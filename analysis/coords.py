@@ -0,0 +1,206 @@
+"""
+Array-backed coordinate storage for ring construction.
+
+Every ring of a ring group has a block of (x, y) slots in one flat
+array('d'), one slot per ring atom in ring order, plus a center slot.
+Rings are placed from regular polygon templates that only depend on the
+ring size and bond length, by rotating and translating the template
+onto a ring edge.
+"""
+
+from array import array
+from math import pi, sin, cos, tan, sqrt
+
+from ring import Point
+
+# Ring sizes covered by the template table. Templates for other sizes
+# are built on demand, but not kept.
+MIN_TEMPLATE_SIZE = 3
+MAX_TEMPLATE_SIZE = 40
+
+def _build_template(size, bondLen=1.0):
+	"""
+	Regular polygon as a flat array of (x, y) pairs. The first vertex
+	is the origin, the second is (bondLen, 0), and the others follow
+	counter-clockwise, so the polygon lies to the left of its first
+	edge. The final pair is the polygon center.
+	"""
+	# Characteristic angle; the angle between two vertices (from the
+	# polygon center), and the center's distance from each vertex and
+	# from the first edge.
+	phi = 2*pi/size
+	r = 0.5*bondLen/sin(phi/2)
+	h = 0.5*bondLen/tan(phi/2)
+	c = 0.5*bondLen
+
+	template = array('d')
+	theta = -pi/2 - phi/2 # Angle to the first vertex
+	for i in range(size):
+		template.append(c + r*cos(theta + i*phi))
+		template.append(h + r*sin(theta + i*phi))
+
+	template.append(c)
+	template.append(h)
+
+	return template
+
+# Unit bond length templates, keyed by ring size.
+_unitTemplates = dict((n, _build_template(n)) for n in
+		range(MIN_TEMPLATE_SIZE, MAX_TEMPLATE_SIZE + 1))
+
+# Templates scaled to a bond length, keyed by (size, bondLen).
+_templates = {}
+
+def polygon_template(size, bondLen=1.0):
+	"""
+	Regular polygon template for the ring size and bond length (see
+	_build_template() for the layout). Templates are memoized, and
+	must not be modified.
+	"""
+	if size < MIN_TEMPLATE_SIZE:
+		raise Exception, "Invalid polygon size, `%d`." % size
+
+	key = (size, bondLen)
+	if key in _templates:
+		return _templates[key]
+
+	if size > MAX_TEMPLATE_SIZE:
+		return _build_template(size, bondLen)
+
+	template = _unitTemplates[size]
+	if bondLen != 1.0:
+		template = array('d', [bondLen*v for v in template])
+
+	_templates[key] = template
+	return template
+
+def place_template(template, ptA, ptB):
+	"""
+	Place a polygon template onto the directed edge A->B by rotation
+	and translation: the first vertex goes to A, and the second lies
+	in the direction of B. Returns the placed (x, y) pairs, in the same
+	layout as the template.
+	"""
+	ax, ay = ptA
+	dx = ptB[0] - ax
+	dy = ptB[1] - ay
+	length = sqrt(dx**2 + dy**2)
+	if not length:
+		raise Exception, "Cannot place a polygon on a zero length edge."
+
+	# Rotation taking the x-axis to the edge direction.
+	c = dx/length
+	s = dy/length
+
+	placed = array('d', template)
+	for k in range(0, len(template), 2):
+		vx = template[k]
+		vy = template[k+1]
+		placed[k] = ax + c*vx - s*vy
+		placed[k+1] = ay + s*vx + c*vy
+
+	return placed
+
+class GroupCoordinates(object):
+	"""
+	Coordinates for the rings of a ring group.
+
+	Ring atom slots are addressed by the ring's in-group offset and the
+	atom's position within the ring. Nothing is placed initially.
+	"""
+
+	def __init__(self, ringGroup):
+		self.group = ringGroup
+
+		# Start slot of each ring's block, by in-group offset.
+		self.starts = []
+		size = 0
+		for ring in ringGroup:
+			self.starts.append(size)
+			size += len(ring)
+
+		self.xy = array('d', [0.0]) * (2*size)
+		self.centers = array('d', [0.0]) * (2*len(ringGroup))
+		self.placed = [False for x in range(len(ringGroup))]
+
+		# Position of each atom within each ring.
+		self.atomIndex = []
+		for ring in ringGroup:
+			index = {}
+			for i in range(len(ring)):
+				index[ring[i]] = i
+			self.atomIndex.append(index)
+
+	def index(self, ring, atom):
+		"""Position of the atom within the ring."""
+		return self.atomIndex[ring.groupOffset][atom]
+
+	def getPoint(self, ring, i):
+		"""Coordinates of the ring's i-th atom, as an (x, y) tuple."""
+		k = 2*(self.starts[ring.groupOffset] + i)
+		return (self.xy[k], self.xy[k+1])
+
+	def setPoint(self, ring, i, pt):
+		"""Set the coordinates of the ring's i-th atom."""
+		k = 2*(self.starts[ring.groupOffset] + i)
+		self.xy[k] = pt[0]
+		self.xy[k+1] = pt[1]
+
+	def getCenter(self, ring):
+		"""Coordinates of the ring center, as an (x, y) tuple."""
+		k = 2*ring.groupOffset
+		return (self.centers[k], self.centers[k+1])
+
+	def placePolygon(self, ring, i, ptA, ptB, step=1, bondLen=1.0):
+		"""
+		Place the ring as a regular polygon with the given bond length
+		on the directed edge A->B, with the polygon lying to its left.
+		The ring's i-th atom is put at A; walking the ring by step (1
+		or -1) from there gives the atom towards B, and so on around
+		the polygon.
+		"""
+		size = len(ring)
+		placed = place_template(polygon_template(size, bondLen), ptA, ptB)
+
+		start = self.starts[ring.groupOffset]
+		xy = self.xy
+		for v in range(size):
+			k = 2*(start + (i + step*v) % size)
+			xy[k] = placed[2*v]
+			xy[k+1] = placed[2*v+1]
+
+		k = 2*ring.groupOffset
+		self.centers[k] = placed[2*size]
+		self.centers[k+1] = placed[2*size+1]
+
+		self.placed[ring.groupOffset] = True
+
+	def getDirection(self, ring):
+		"""Determine which direction the placed ring is directed."""
+		p1 = self.getPoint(ring, 0)
+		p2 = self.getPoint(ring, 1)
+		p3 = self.getPoint(ring, 2)
+		return direction(p1, p2, p3)
+
+	def exportPoints(self, ring):
+		"""Copy the ring's coordinates to its Point positions."""
+		start = 2*self.starts[ring.groupOffset]
+		ring.pos.xy = self.xy[start:start + 2*len(ring)]
+
+		x, y = self.getCenter(ring)
+		ring.centerPos = Point(x, y)
+
+def direction(p1, p2, p3):
+	"""
+	Turn direction of the points p1, p2, p3 (as (x, y) tuples): 'cw',
+	'ccw' or 'colinear'. Based on the Convex Hull problem:
+	http://en.wikipedia.org/wiki/Graham_scan
+	"""
+	d1 = (p2[0] - p1[0]) * (p3[1] - p1[1])
+	d2 = (p2[1] - p1[1]) * (p3[0] - p1[0])
+	val = d1 - d2
+	if val < 0:
+		return 'ccw'
+	if val > 0:
+		return 'cw'
+	return 'colinear'
@@ -7,9 +7,11 @@ It consists of two subphases:
 This code is adapted from [Helson].
 """
 
-from ring import Ring, RingGroup, RING_TYPES, Point
-from math import *
+from ring import Ring, RingGroup, RING_TYPES
+from analysis.coords import GroupCoordinates, direction
+import heapq
 import sys
+import warnings
 
 """
 PUBLIC IFACE
@@ -30,6 +32,7 @@ def ring_construction(ringGroups):
 	"""
 	for rg in ringGroups:
 		_construct_group(rg)
+		rg.constructed = True
 
 
 """
@@ -38,63 +41,61 @@ RING PEELING CODE
 
 def _assign_ring_types(remainingRings):
 	"""
-	TODO: DOC
+	Peel the rings of a ring group, assigning each its ring type.
+	Returns the peel order; the core ring is last.
+
+	Rings are selected from a priority queue keyed on the number of
+	bonds shared with the other remaining rings (ties go to the lowest
+	in-group offset). The counts are maintained as rings are peeled:
+	only the peeled ring's neighbors change.
 	"""
 
-	def select_fused_spiro_ring(remainingRings):
+	def shared_bonds(i, j):
+		"""Number of bonds shared between two rings by offset."""
+		return group[i].sharedBondCount(group[j])
+
+	def select_fused_spiro_ring():
 		"""
 		Select the next remaining fused (or spiro) ring to peel.
 		The ring chosen has the smallest connectivity with the other
 		remaining rings.
-		"""
-		bestRingPos = None
-		minCount = 10000000 # Nothing should have this many shared edges
 
-		for i in range(len(remainingRings)):
-			ring = remainingRings[i]
-
-			# Ring cannot be a central ring. 
-			if ring.isCentralRing(remainingRings):
-				continue
+		Heap entries whose count is out of date, or whose ring was
+		peeled, are dropped. Central rings are set aside and pushed
+		back, as they may become peelable later.
+		"""
+		best = None
+		skipped = []
+		while heap:
+			count, i = heap[0]
 
-			# Ring cannot be a bridge to other rings. 
-			# FIXME: Can speed this up by taking out both rings at once
-			isBridge = False
-			for r in remainingRings:
-				if r is ring:
-					continue
-				if ring.isBridgedTo(r):
-					isBridge = True
-					break
+			# XXX/TODO/FIXME:
+			# I am unclear about Helson's terminology, but it makes 
+			# sense just to skip the rings with more than three shared
+			# bonds. Nothing else in the heap can have fewer.
+			if count > 3:
+				break
 
-			if isBridge:
+			heapq.heappop(heap)
+			if not group.remaining[i] or count != counts[i]:
 				continue
 
-			# Count the number of bonds shared with other unassigned 
+			# Ring cannot be a central ring, nor a bridge to other
 			# rings.
-			# FIXME: Wickedly inefficient. 
-			count = 0
-			for bond in ring.bonds:		
-				for r in remainingRings:
-					if ring is r:
-						continue
-					if bond in r.bonds:
-						count += 1
-
-			# XXX/TODO/FIXME:
-			# I am unclear about Helson's terminology, but it makes 
-			# sense just to skip the rings.
-			if count > 3:
-				# ring.type = RING_TYPES.IRREGULAR
+			if group.isCentralRing(group[i]) or \
+					[x for x in group.bridgedTo[i] if group.remaining[x]]:
+				skipped.append((count, i))
 				continue
 
-			if minCount > count:
-				minCount = count
-				bestRingPos = i
+			best = i
+			break
+
+		for entry in skipped:
+			heapq.heappush(heap, entry)
 
 		# Best ring to peel.
 		# Could be 'None'
-		return bestRingPos
+		return best
 
 	def select_bridged_ring(remainingRings):
 		"""
@@ -109,39 +110,57 @@ def _assign_ring_types(remainingRings):
 			ring = remainingRings[i]
 
 			# Ring cannot be a central ring
-			if ring.isCentralRing(remainingRings):
+			if group.isCentralRing(ring):
 				continue
 
-			# Count the number of bonds shared with other unassigned
-			# rings.
-			# FIXME: Wickedly inefficient. 
-			count = 0
-			for bond in ring.bonds:		
-				for r in remainingRings:
-					if ring is r:
-						continue
-					if bond in r.bonds:
-						count += 1
+			# Number of bonds shared with other unassigned rings.
+			count = counts[ring.groupOffset]
 
 			if minCount > count:
 				minCount = count
-				bestRing = ring
+				bestRingPos = i
 
 		# Best ring to peel.
 		# Could be 'None'
 		return bestRingPos
 
+	def peel(i):
+		"""
+		Remove the ring from the remaining rings, and update the
+		shared bond counts of its neighbors.
+		"""
+		group.peelRing(group[i])
+		for pos in range(len(remainingRings)):
+			if remainingRings[pos] is group[i]:
+				remainingRings.pop(pos)
+				break
+
+		for j in group.fusedTo[i]:
+			if not group.remaining[j]:
+				continue
+			counts[j] -= shared_bonds(i, j)
+			heapq.heappush(heap, (counts[j], j))
+
 	"""
 	Analyze and Peel Rings from the Ring System(s).
 	"""
 
-	rings = []
-	for ring in remainingRings:
-		rings.append(ring)
+	# The group tracks ring centrality as rings are peeled.
+	group = remainingRings
+	group.resetPeel()
 
 	# Can't work with RingGroup directly, convert to list.
 	remainingRings = list(remainingRings[:])
 
+	# Number of bonds each ring shares with the other remaining rings.
+	counts = [0 for x in range(len(group))]
+	for i in range(len(group)):
+		for j in group.fusedTo[i]:
+			counts[i] += shared_bonds(i, j)
+
+	heap = [(counts[i], i) for i in range(len(group))]
+	heapq.heapify(heap)
+
 	peelOrder = []
 
 	while True:
@@ -153,22 +172,25 @@ def _assign_ring_types(remainingRings):
 			peelOrder.append(ring)
 
 		# Select the next best fused/spiro ring, if exists. 
-		ringPos = select_fused_spiro_ring(remainingRings)
-		if ringPos != None:
-			ring = remainingRings.pop(ringPos)
+		i = select_fused_spiro_ring()
+		if i != None:
+			ring = group[i]
+			peel(i)
 
 			# Determine if fused or spiro to the remaining rings.
 			rtype = None
-			for r in remainingRings:
-				if ring.isFusedTo(r):
+			for j in group.adjacent[i]:
+				if not group.remaining[j]:
+					continue
+				if ring.isFusedTo(group[j]):
 					rtype = RING_TYPES.FUSED
 					break
-				if ring.isSpiroTo(r):
+				if ring.isSpiroTo(group[j]):
 					rtype = RING_TYPES.SPIRO
 
 			if not rtype:
 				# XXX: Error!
-				print "Could not determine ring type."
+				warnings.warn("Could not determine ring type.")
 				rtype = RING_TYPES.FUSED
 
 			ring.type = rtype
@@ -179,7 +201,8 @@ def _assign_ring_types(remainingRings):
 		ringPos = select_bridged_ring(remainingRings)
 		if ringPos != None:
 
-			ring = remainingRings.pop(ringPos)
+			ring = remainingRings[ringPos]
+			peel(ring.groupOffset)
 			ring.type = RING_TYPES.BRIDGED
 			peelOrder.append(ring)
 			continue
@@ -195,6 +218,9 @@ def _assign_ring_types(remainingRings):
 RING CONSTRUCTION
 """
 
+# Bond length used to construct rings.
+BOND_LENGTH = 50.0
+
 # TODO: Bridged attachment
 # TODO: Spiro attachment
 # TODO: Open Polygon positioning
@@ -205,7 +231,13 @@ def _construct_group(ringGroup):
 	"""
 	Construct the coordinates, CFS, etc. for a ring group.
 	Follows from [Helson] p~335
+
+	Coordinates are built in the group's array-backed storage (see
+	analysis.coords), and copied to the rings' Point positions once
+	the group is done.
 	"""
+	coords = GroupCoordinates(ringGroup)
+
 	# Already assigned rings. Accessed by subprocesses. 
 	assigned = []
 
@@ -222,19 +254,17 @@ def _construct_group(ringGroup):
 			fusionRing = r
 			break
 
+		if not fusionAtoms:
+			raise Exception, "No assigned ring to fuse %r to." % (ring,)
+
 		a = fusionAtoms[0]
 		b = fusionAtoms[1]
 
-		# Copy already known fused-edge positions to the ring
-		# They'll be used in the _regular_polygon() procedure. 
-		ring.pos[ring.index(a)] = fusionRing.pos[fusionRing.index(a)]
-		ring.pos[ring.index(b)] = fusionRing.pos[fusionRing.index(b)]
-
 		# XXX/TEMPORARY -- THIS IS JUST FOR DEBUG
-		ring.fusionAtom[ring.index(a)] = True
-		ring.fusionAtom[ring.index(b)] = True
-		fusionRing.fusionAtom[fusionRing.index(a)] = True
-		fusionRing.fusionAtom[fusionRing.index(b)] = True
+		ring.fusionAtom[coords.index(ring, a)] = True
+		ring.fusionAtom[coords.index(ring, b)] = True
+		fusionRing.fusionAtom[coords.index(fusionRing, a)] = True
+		fusionRing.fusionAtom[coords.index(fusionRing, b)] = True
 		# END XXX/TEMPORARY -- THIS IS JUST FOR DEBUG
 
 		# Make sure the edge is directed opposite of the atom being
@@ -245,29 +275,13 @@ def _construct_group(ringGroup):
 
 		swapAB = False
 
-		# Based on the Convex Hull problem:
-		# http://en.wikipedia.org/wiki/Graham_scan
-		def ccw(p1, p2, p3):
-			d1 = (p2.x - p1.x) * (p3.y - p1.y)
-			d2 = (p2.y - p1.y) * (p3.x - p1.x)
-			return d1 - d2
-
-		def direc(val):
-			if val < 0:
-				return 'ccw'
-			if val > 0:
-				return 'cw'
-			return 'colinear'
+		# Already known fused-edge positions.
+		ptA = coords.getPoint(fusionRing, coords.index(fusionRing, a))
+		ptB = coords.getPoint(fusionRing, coords.index(fusionRing, b))
+		cen = coords.getCenter(fusionRing)
 
-		idxA = ring.index(a)
-		idxB = ring.index(b)
-
-		ptA = ring.pos[idxA]
-		ptB = ring.pos[idxB]
-		cen = fusionRing.centerPos
-
-		d1 = direc(ccw(ptB, cen, ptA))
-		d2 = fusionRing.getDirection()
+		d1 = direction(ptB, cen, ptA)
+		d2 = coords.getDirection(fusionRing)
 
 		if d1 == d2:
 			swapAB = True
@@ -277,44 +291,14 @@ def _construct_group(ringGroup):
 		if swapAB:
 			ring.swapped = True # XXX/TEMPORARY: BOOL IS DEBUG ONLY
 			a, b = b, a
+			ptA, ptB = ptB, ptA
 
-		positions = _regular_polygon(ring, atomA=a, atomB=b, 
-									bondLen=50.0, direc='cw')
-
-		# Map positions.
-		aPos = ring.index(a)
-		bPos = ring.index(b)
-
-		aPtPos = None
-		bPtPos = None
-		for i in range(len(positions['ring'])):
-			if positions['ring'][i] == ring.pos[aPos]:
-				aPtPos = i
-			if positions['ring'][i] == ring.pos[bPos]:
-				bPtPos = i
-
-		rDirec = False # Left
-		if (aPos + 1) % len(ring) != bPos:
-			rDirec = True # Right
-
-		pDirec = False # Left
-		if (aPtPos + 1) % len(positions['ring']) != bPtPos:
-			pDirec = False # Right
-
-		if rDirec == pDirec:
-			ring.centerPos = positions['center']
-			for i in range(len(ring)):
-				ri = (aPos + i) % len(ring)
-				pi = (aPtPos + i) % len(ring)
-				ring.pos[ri] = positions['ring'][pi]
-
-		else:
-			ring.centerPos = positions['center']
-			for i in range(len(ring)):
-				ri = (aPos + i) % len(ring)
-				pi = (aPtPos - i) % len(ring) # XXX: Note sign
-				ring.pos[ri] = positions['ring'][pi]
+		# Walk the ring from atom A in the direction of atom B.
+		aPos = coords.index(ring, a)
+		bPos = coords.index(ring, b)
+		step = 1 if (aPos + 1) % len(ring) == bPos else -1
 
+		coords.placePolygon(ring, aPos, ptA, ptB, step, BOND_LENGTH)
 		assigned.append(ring)
 
 	# Copy rings according to peel order. 
@@ -325,11 +309,14 @@ def _construct_group(ringGroup):
 	if core.type != RING_TYPES.CORE:
 		raise Exception, "Last Ring from Ring Peeling is not Core!"
 
-	positions = _regular_polygon(core, bondLen=50.0, direc='cw')
+	# Align the first core bond with the coordinate system.
+	ptA = (0.0, 0.0)
+	if len(core) % 2 == 0:
+		ptB = (0.0, 1.0)
+	else:
+		ptB = (1.0, 0.0)
 
-	core.centerPos = positions['center']
-	for i in range(len(positions['ring'])):
-		core.pos[i] = positions['ring'][i]
+	coords.placePolygon(core, 0, ptA, ptB, 1, BOND_LENGTH)
 
 	# Work on remaining rings.
 	assigned = [core]
@@ -343,120 +330,12 @@ def _construct_group(ringGroup):
 			attach_fused(ring)
 			continue
 
-		print "Unable to handle ring type."
+		warnings.warn("Unable to handle ring type.")
 
-	return
-
-# TODO for regular_polygon: handle cw/ccw. Still not sure how it works.
-def _regular_polygon(ring, atomA=None, atomB=None, bondLen=100.0, direc='cw'):
-	"""
-	Calculate the coordinate positions for a regular polygon.
-
-	Inputs:
-		ring - ring object
-		atomA/atomB - desired first and second atom (for the core ring:
-					  both are optional)
-		bondLen - desired length of the bonds.
-		direc - direction of the construction.
-
-	Objectives: 
-		1. Find center point O
-		2. Find angle to first vertex
-		3. Find vertex points by adding or subtracting phi 
-		   once per vertex. (Easy).
-	
-	Returns: A dictionary containing a list of Point object coordinates
-	for each vertex and the center point.
-	"""
-	if direc not in ('cw', 'ccw'):
-		raise Exception, 'Direction supplied `%s` is invalid.' % direc
-
-	# TODO: Update to ensure proper cw/ccw handling
-
-	ptA = None # Point objects
-	ptB = None
-	idxA = 0 # Ring index of the atom, that is ring[idx]
-	idxB = 0
-
-	# If atoms are not specified, this is probably a core ring, and we
-	# are free to align the ring with the coordinate system. All other
-	# rings should be looked up in the ring index.
+	for ring in ringGroup:
+		if coords.placed[ring.groupOffset]:
+			coords.exportPoints(ring)
 
-	if atomA != None and atomB != None:
-		idxA = ring.index(atomA)
-		idxB = ring.index(atomB)
-		ptA = ring.pos[idxA]
-		ptB = ring.pos[idxB]
-
-	else:
-		idxA = 0
-		# TODO: is this correct cw/ccw handling?
-		idxB = ((idxA + 1) if direc == 'cw' else (idxA - 1)) % len(ring)
-
-		# Align to coordinate system.
-		ptA = Point(0.0, 0.0)
-		if len(ring) % 2 == 0:
-			ptB = Point(ptA.x, ptA.y + bondLen)
-		else: 
-			ptB = Point(ptA.x + bondLen, ptA.y)
-
-	# Discern bond length.
-	# FIXME: Inconsistent to recalculate bond length.
-	x = abs(ptA.x - ptB.x)
-	y = abs(ptA.y - ptB.y)
-	L = sqrt(x**2 + y**2) # Bond length
-
-	# Characteristic angle; the angle between two vertices (from
-	# polygon center 'O'), eg. angle <AOB
-	phi = radians(360.0)/len(ring)
-
-	# Distance from polygon center 'O' to each vertex, eg. O->A
-	r = L/(2*sin(phi/2))
-
-	# Point between the line joining A and B
-	cX = ptA.x + 0.5*(ptB.x - ptA.x)
-	cY = ptA.y + 0.5*(ptB.y - ptA.y)
-	ptC = Point(cX, cY)
-
-	# Distance from polygon center 'O' to the point in the 
-	# center of line AB, 'C'. ie. O->C
-	z = sqrt(r**2 - 0.25*L**2) # Also: z = r*cos(phi/2)
-
-	# Scaled Perpendicular direction vector from C to O
-	# http://answers.google.com/answers/threadview/id/419874.html
-	k = L/2.0
-	u = ((ptA.y - ptC.y)/k,
-		(ptC.x - ptA.x)/k)
-
-	# Polygon central point, calculated with the direction vector.
-	oX = ptC.x + z* u[0]
-	oY = ptC.y + z* u[1]
-	ptO = Point(oX, oY)
-
-	# Find angle to point A. 
-	adj = ptA.x - ptO.x
-	opp = ptA.y - ptO.y
-
-	theta = 0
-	if adj == 0.0:
-		# TODO: Verify
-		if opp >= 0:
-			theta = pi * 1/2
-		else:
-			theta = pi * 3/2
-	else:
-		theta = atan(opp/adj)
-
-	# Calculate the atom positions in the ring.
-	i = idxA
-	positions = []
-	for x in range(len(ring)):
-		px = ptO.x + cos(theta) * r
-		py = ptO.y + sin(theta) * r
-		positions.append(Point(px, py))
-
-		i = (i + 1) % len(ring)
-		theta += phi # XXX: CW
-
-	return {'ring': positions, 'center': ptO}
+	ringGroup.coords = coords
 
+	return
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""
+Chain perception benchmark.
+
+Compares the 'tree' (linear time diameter) and 'allpairs' (shortest
+paths) algorithms of identify_chains() on the hydrocarbons and
+multiring examples, as well as on synthetic C200 alkanes.
+
+Usage: python benchmarks/chains.py [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir))
+
+from examples import EXAMPLES
+from smiles import smiles_to_molecule
+from perception.rings import identify_rings
+from perception.chains import identify_chains, CHAIN_ALGORITHMS
+from benchmarks.synthetic import linear_alkane, branched_alkane
+
+def synthetic_alkanes():
+	"""Linear and branched C200 alkanes, (name, smiles) pairs."""
+	return [
+		('C200 linear', linear_alkane(200)),
+		('C200 branched', branched_alkane(200)),
+	]
+
+def time_chains(mol, rings, algorithm, repeats):
+	"""Best wall time of identify_chains() over the repeats."""
+	best = None
+	for x in range(repeats):
+		start = time.time()
+		chains = identify_chains(mol, rings, algorithm=algorithm)
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return (best, chains)
+
+def main():
+	"""Main function"""
+	repeats = 3 if len(sys.argv) < 2 else int(sys.argv[1])
+
+	molecules = []
+	for category in ('hydrocarbons', 'multiring'):
+		for name in sorted(EXAMPLES[category]):
+			molecules.append((name, EXAMPLES[category][name]))
+	molecules.extend(synthetic_alkanes())
+
+	print "%-32s %6s %12s %12s %8s" % ('molecule', 'atoms', 'allpairs (s)',
+			'tree (s)', 'speedup')
+
+	for name, smiles in molecules:
+		try:
+			mol = smiles_to_molecule(smiles)
+			rings = identify_rings(mol)
+		except Exception, e:
+			print "%-32s skipped (%s)" % (name[:32], type(e).__name__)
+			continue
+
+		times = {}
+		results = {}
+		for algorithm in CHAIN_ALGORITHMS:
+			times[algorithm], results[algorithm] = \
+					time_chains(mol, rings, algorithm, repeats)
+
+		if repr(results['tree']) != repr(results['allpairs']):
+			print "%-32s MISMATCH between algorithms" % name[:32]
+			continue
+
+		speedup = times['allpairs'] / max(times['tree'], 1e-9)
+		print "%-32s %6d %12.5f %12.5f %7.1fx" % (name[:32], mol.size,
+				times['allpairs'], times['tree'], speedup)
+
+if __name__ == '__main__':
+	main()
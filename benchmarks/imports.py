@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""
+Import time benchmark.
+
+Times importing the library modules in a fresh interpreter, and checks
+that none of them loads a GUI toolkit. Exits with an error if one does,
+or if an import takes longer than the optional limit.
+
+Usage: python benchmarks/imports.py [repeats] [limit (ms)]
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Modules that must stay importable without a display.
+MODULES = ('smiles', 'molecule', 'perception.rings', 'perception.chains',
+		'analysis.rings', 'sdg', 'main')
+
+# Modules that only the GUI may load.
+GUI_MODULES = ('gtk', 'gobject', 'glib', 'pango', 'cairo', 'pygtk')
+
+# Run in the child interpreter: prints the import time (ms) and the GUI
+# modules that got loaded.
+CHILD = """
+import sys, time
+start = time.time()
+import %s
+elapsed = (time.time() - start) * 1000.0
+loaded = [m for m in %r if m in sys.modules]
+print elapsed, ','.join(loaded)
+"""
+
+def time_import(module):
+	"""Import time (ms) and loaded GUI modules, in a fresh process."""
+	out = subprocess.check_output([sys.executable, '-c',
+			CHILD % (module, GUI_MODULES)], cwd=ROOT)
+	fields = out.split()
+	loaded = fields[1].split(',') if len(fields) > 1 else []
+	return (float(fields[0]), loaded)
+
+def main():
+	"""Main function"""
+	repeats = 5 if len(sys.argv) < 2 else int(sys.argv[1])
+	limit = None if len(sys.argv) < 3 else float(sys.argv[2])
+
+	print "%-24s %12s  %s" % ('module', 'time (ms)', 'gui modules')
+
+	failed = False
+	for module in MODULES:
+		best = None
+		for x in range(repeats):
+			elapsed, loaded = time_import(module)
+			if best is None or elapsed < best:
+				best = elapsed
+
+		print "%-24s %12.2f  %s" % (module, best, ', '.join(loaded) or '-')
+
+		if loaded or (limit is not None and best > limit):
+			failed = True
+
+	if failed:
+		print "FAILED: GUI modules loaded, or import time over the limit."
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Ring memory benchmark.
+
+Runs ring perception, analysis and construction over every bundled
+example, and reports the memory held by the rings: the Ring objects and
+everything they own (bonds, positions, per-atom data), but not the ring
+groups or molecules they refer to.
+
+Usage: python benchmarks/memory.py
+"""
+
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir))
+
+from examples import EXAMPLES
+from smiles import smiles_to_molecule
+from perception.rings import identify_rings
+from ring import partition_rings, Ring, RingGroup
+from analysis.rings import ring_analysis, ring_construction
+
+def deep_size(obj, seen):
+	"""
+	Size in bytes of the object and the objects it owns. Ring groups
+	are not followed, and objects already in seen are not counted.
+	"""
+	if id(obj) in seen or isinstance(obj, RingGroup):
+		return 0
+	seen.add(id(obj))
+
+	size = sys.getsizeof(obj)
+	children = []
+	if isinstance(obj, Ring):
+		children.extend(obj)
+		children.append(obj.__dict__)
+	elif isinstance(obj, dict):
+		children.extend(obj.items())
+	elif isinstance(obj, (list, tuple, set, frozenset)):
+		children.extend(obj)
+	elif not isinstance(obj, (array, basestring)):
+		if hasattr(obj, '__dict__'):
+			children.append(obj.__dict__)
+		for slot in getattr(type(obj), '__slots__', ()):
+			if hasattr(obj, slot):
+				children.append(getattr(obj, slot))
+
+	for child in children:
+		size += deep_size(child, seen)
+	return size
+
+def main():
+	"""Main function"""
+	print "%-32s %6s %10s" % ('molecule', 'rings', 'bytes')
+
+	# Everything measured is kept alive, so object ids are not reused.
+	seen = set()
+	kept = []
+	totalRings = 0
+	totalSize = 0
+	for category in sorted(EXAMPLES):
+		for name in sorted(EXAMPLES[category]):
+			try:
+				mol = smiles_to_molecule(EXAMPLES[category][name])
+				rings = identify_rings(mol)
+				groups = partition_rings(rings) if rings else []
+				ring_analysis(groups)
+				ring_construction(groups)
+			except Exception, e:
+				print "%-32s skipped (%s)" % (name[:32], type(e).__name__)
+				continue
+
+			kept.append(groups)
+			size = 0
+			for group in groups:
+				for ring in group:
+					size += deep_size(ring, seen)
+
+			totalRings += len(rings)
+			totalSize += size
+			print "%-32s %6d %10d" % (name[:32], len(rings), size)
+
+	print "%-32s %6d %10d" % ('total', totalRings, totalSize)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Ring partitioning benchmark.
+
+Times partition_rings() on the pah and multiring examples, as well as
+on synthetic acenes and polyphenyls with many rings.
+
+Usage: python benchmarks/partition.py [repeats]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir))
+
+from examples import EXAMPLES
+from smiles import smiles_to_molecule
+from perception.rings import identify_rings
+from ring import partition_rings
+from benchmarks.synthetic import acene, polyphenyl
+
+def synthetic_ring_systems():
+	"""Large ring systems, (name, smiles) pairs."""
+	return [
+		('acene(12)', acene(12)),
+		('acene(50)', acene(50)),
+		('polyphenyl(20)', polyphenyl(20)),
+		('polyphenyl(60)', polyphenyl(60)),
+	]
+
+def time_partition(rings, repeats):
+	"""Best wall time of partition_rings() over the repeats."""
+	best = None
+	for x in range(repeats):
+		start = time.time()
+		groups = partition_rings(rings)
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return (best, groups)
+
+def main():
+	"""Main function"""
+	repeats = 3 if len(sys.argv) < 2 else int(sys.argv[1])
+
+	molecules = []
+	for category in ('pah', 'multiring'):
+		for name in sorted(EXAMPLES[category]):
+			molecules.append((name, EXAMPLES[category][name]))
+	molecules.extend(synthetic_ring_systems())
+
+	print "%-32s %6s %6s %6s %12s" % ('molecule', 'atoms', 'rings',
+			'groups', 'time (s)')
+
+	for name, smiles in molecules:
+		try:
+			mol = smiles_to_molecule(smiles)
+			rings = identify_rings(mol, algorithm='sssr')
+		except Exception, e:
+			print "%-32s skipped (%s)" % (name[:32], type(e).__name__)
+			continue
+
+		elapsed, groups = time_partition(rings, repeats)
+		print "%-32s %6d %6d %6d %12.5f" % (name[:32], mol.size,
+				len(rings), len(groups), elapsed)
+
+if __name__ == '__main__':
+	main()
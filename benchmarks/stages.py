@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+"""
+Pipeline stage benchmark.
+
+Runs every example in every category of examples.EXAMPLES, and the
+synthetic scale-up molecules, through the SDG pipeline one stage at a
+time, and reports each stage's wall time and allocations:
+
+	tokenize, toMolecule, identify_rings, identify_chains,
+	partition_rings, ring_analysis, ring_construction
+
+toMolecule() streams its own tokens, so its time includes tokenizing.
+Allocations are the net number of objects tracked by the garbage
+collector that a stage leaves behind (gc.get_count(), with collection
+disabled while the stage runs). Times are the best over the repeats.
+
+Results are written as JSON, so runs from different versions can be
+compared:
+
+	python benchmarks/stages.py --json before.json
+	... change things ...
+	python benchmarks/stages.py --json after.json --compare before.json
+
+Usage: python benchmarks/stages.py [-r repeats] [--json FILE]
+			[--compare FILE] [--rings ALGORITHM] [--no-synthetic]
+"""
+
+import os
+import sys
+import time
+import gc
+import json
+import platform
+import subprocess
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir))
+
+from examples import EXAMPLES
+from smiles import Smiles
+from perception.rings import identify_rings, RING_ALGORITHMS
+from perception.chains import identify_chains
+from ring import partition_rings
+from analysis.rings import ring_analysis, ring_construction
+from benchmarks.synthetic import linear_alkane, branched_alkane, acene, \
+		polyphenyl
+
+STAGES = ('tokenize', 'toMolecule', 'identify_rings', 'identify_chains',
+		'partition_rings', 'ring_analysis', 'ring_construction')
+
+def synthetic_molecules():
+	"""
+	Scale-up molecules, (name, smiles) pairs. Zamora ring perception
+	grows quickly with the number of rings in a chain of ring systems,
+	so the ring counts are kept modest; see partition.py for larger
+	ones with the 'sssr' algorithm.
+	"""
+	return [
+		('C200 linear', linear_alkane(200)),
+		('C200 branched', branched_alkane(200)),
+		('acene(8)', acene(8)),
+		('acene(16)', acene(16)),
+		('polyphenyl(6)', polyphenyl(6)),
+		('polyphenyl(10)', polyphenyl(10)),
+	]
+
+def run_stage(func, *args):
+	"""
+	Run one stage. Returns (result, wall time, net tracked objects
+	allocated).
+	"""
+	gcWasEnabled = gc.isenabled()
+	gc.collect()
+	gc.disable()
+	try:
+		before = gc.get_count()[0]
+		start = time.time()
+		result = func(*args)
+		elapsed = time.time() - start
+		allocs = gc.get_count()[0] - before
+	finally:
+		if gcWasEnabled:
+			gc.enable()
+	return (result, elapsed, allocs)
+
+def run_pipeline(smiles, ringAlgorithm='zamora'):
+	"""
+	Run every stage once, on fresh inputs. Returns {stage: (time,
+	allocs)} and the molecule. A failing stage raises, with the stage
+	name set as the exception's stage attribute.
+	"""
+	def stage(name, func, *args):
+		try:
+			result, elapsed, allocs = run_stage(func, *args)
+		except Exception, e:
+			e.stage = name
+			raise
+		results[name] = (elapsed, allocs)
+		return result
+
+	results = {}
+	stage('tokenize', Smiles.tokenizeString, smiles)
+	mol = stage('toMolecule', lambda: Smiles(smiles).toMolecule())
+	rings = stage('identify_rings', identify_rings, mol, ringAlgorithm)
+	stage('identify_chains', identify_chains, mol, rings)
+	groups = stage('partition_rings', partition_rings, rings)
+	stage('ring_analysis', ring_analysis, groups)
+	stage('ring_construction', ring_construction, groups)
+	return (results, mol)
+
+def benchmark_molecule(category, name, smiles, repeats,
+		ringAlgorithm='zamora'):
+	"""Benchmark one molecule; a JSON-ready dict."""
+	entry = {'category': category, 'name': name, 'smiles': smiles}
+
+	best = {}
+	for x in range(repeats):
+		try:
+			results, mol = run_pipeline(smiles, ringAlgorithm)
+		except Exception, e:
+			entry['error'] = "%s in %s: %s" % (type(e).__name__,
+					getattr(e, 'stage', '?'), e)
+			return entry
+
+		for stage, (elapsed, allocs) in results.items():
+			if stage not in best or elapsed < best[stage]['time']:
+				best[stage] = {'time': elapsed, 'allocs': allocs}
+
+	entry['atoms'] = mol.size
+	entry['stages'] = best
+	return entry
+
+def source_revision():
+	"""The git revision of the tree, if it can be found."""
+	root = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+			os.pardir)
+	try:
+		out = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'],
+				cwd=root, stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE).communicate()[0]
+	except OSError:
+		return None
+	return out.strip() or None
+
+def stage_totals(molecules):
+	"""Sum of every stage over the molecules that did not fail."""
+	totals = dict((stage, {'time': 0.0, 'allocs': 0}) for stage in STAGES)
+	for entry in molecules:
+		for stage, result in entry.get('stages', {}).items():
+			totals[stage]['time'] += result['time']
+			totals[stage]['allocs'] += result['allocs']
+	return totals
+
+def print_table(report, out):
+	"""Print the report as a table, times in milliseconds."""
+	header = "%-28s %5s" % ('molecule', 'atoms')
+	for stage in STAGES:
+		header += " %10s" % stage[:10]
+	print >>out, header
+
+	for entry in report['molecules']:
+		line = "%-28s" % entry['name'][:28]
+		if 'error' in entry:
+			print >>out, "%s skipped (%s)" % (line, entry['error'][:60])
+			continue
+		line += " %5d" % entry['atoms']
+		for stage in STAGES:
+			line += " %10.3f" % (1000*entry['stages'][stage]['time'])
+		print >>out, line
+
+	line = "%-28s %5s" % ('total (ms)', '')
+	allocLine = "%-28s %5s" % ('total allocs', '')
+	for stage in STAGES:
+		line += " %10.3f" % (1000*report['totals'][stage]['time'])
+		allocLine += " %10d" % report['totals'][stage]['allocs']
+	print >>out, line
+	print >>out, allocLine
+
+def print_comparison(report, old, out):
+	"""Print per-stage total times against an earlier report."""
+	print >>out
+	print >>out, "Compared to %s (%s):" % (old.get('revision'),
+			old.get('date'))
+	print >>out, "%-18s %12s %12s %8s" % ('stage', 'before (ms)',
+			'after (ms)', 'speedup')
+
+	# Only molecules that ran in both reports are counted.
+	names = lambda r: set((e['category'], e['name'])
+			for e in r['molecules'] if 'stages' in e)
+	common = names(report) & names(old)
+	pick = lambda r: [e for e in r['molecules']
+			if (e['category'], e['name']) in common]
+	before = stage_totals(pick(old))
+	after = stage_totals(pick(report))
+
+	for stage in STAGES:
+		b = before[stage]['time']
+		a = after[stage]['time']
+		print >>out, "%-18s %12.3f %12.3f %7.2fx" % (stage, 1000*b, 1000*a,
+				b / max(a, 1e-9))
+	print >>out, "(%d molecules in both runs)" % len(common)
+
+def main():
+	"""Main function"""
+	parser = OptionParser(usage="python benchmarks/stages.py [options]")
+	parser.add_option('-r', '--repeats', type='int', default=3,
+			help="runs per molecule; the best time is kept")
+	parser.add_option('--json', metavar='FILE',
+			help="write the results as JSON ('-' for stdout)")
+	parser.add_option('--compare', metavar='FILE',
+			help="compare against the JSON results of an earlier run")
+	parser.add_option('--rings', metavar='ALGORITHM', type='choice',
+			default='zamora',
+			choices=list(RING_ALGORITHMS),
+			help="ring perception algorithm (default: zamora)")
+	parser.add_option('--no-synthetic', action='store_true', default=False,
+			help="only run the examples")
+	options, args = parser.parse_args()
+
+	molecules = []
+	for category in sorted(EXAMPLES):
+		for name in sorted(EXAMPLES[category]):
+			molecules.append((category, name, EXAMPLES[category][name]))
+	if not options.no_synthetic:
+		for name, smiles in synthetic_molecules():
+			molecules.append(('synthetic', name, smiles))
+
+	report = {
+		'revision': source_revision(),
+		'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'repeats': options.repeats,
+		'ringAlgorithm': options.rings,
+		'stages': list(STAGES),
+		'molecules': [],
+	}
+	for category, name, smiles in molecules:
+		report['molecules'].append(benchmark_molecule(category, name,
+				smiles, options.repeats, options.rings))
+	report['totals'] = stage_totals(report['molecules'])
+
+	# The table goes to stderr when stdout carries the JSON.
+	out = sys.stderr if options.json == '-' else sys.stdout
+	print_table(report, out)
+
+	if options.compare:
+		with open(options.compare) as f:
+			print_comparison(report, json.load(f), out)
+
+	if options.json == '-':
+		json.dump(report, sys.stdout, indent=1, sort_keys=True)
+		print
+	elif options.json:
+		with open(options.json, 'w') as f:
+			json.dump(report, f, indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,30 @@
+"""
+Synthetic scale-up molecules for the benchmarks, as SMILES.
+"""
+
+from smiles import ring_label
+
+def linear_alkane(n):
+	"""Straight chain alkane with n carbons."""
+	return 'C' * n
+
+def branched_alkane(n):
+	"""Alkane with n carbons and a methyl branch on every other one."""
+	return 'C' + 'C(C)' * ((n - 2) / 2) + 'C' * (1 + n % 2)
+
+def acene(n):
+	"""Linear fused benzenoid with n rings (naphthalene, anthracene...)"""
+	smiles = 'c1ccc2'
+	for k in range(3, n + 1):
+		smiles += 'cc' + ring_label(k)
+	smiles += 'cccc' + 'c' + ring_label(n)
+	for k in range(n - 1, 1, -1):
+		smiles += 'cc' + ring_label(k)
+	return smiles + 'c1'
+
+def polyphenyl(n):
+	"""
+	Chain of n benzene rings joined by single bonds. Each ring is
+	closed before the next opens, so they all use label 1.
+	"""
+	return 'c1ccccc1' * n
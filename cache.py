@@ -0,0 +1,241 @@
+"""
+Persistent layout cache.
+
+Stores the 2D coordinates and perception results of depicted molecules
+in a sqlite database, keyed by a hash of the canonical molecular graph
+(see canonical.morgan). Any SMILES of the same structure finds the same
+entry, whatever its atom order:
+
+	>>> cache = LayoutCache('layouts.db')
+	>>> depiction = depict('c1ccc2ccccc2c1', cache=cache) # Miss
+	>>> depiction = depict('c2cccc1ccccc12', cache=cache) # Hit
+	>>> cache.hits, cache.misses
+	(1, 1)
+
+Entries are stored in canonical atom order, as binary molecule records
+(see store.py), and mapped onto the atom labels of the molecule looked
+up. Coordinates go through float32.
+
+When the stored entries outgrow maxBytes, the least recently used are
+evicted. Several processes may share one database; the persisted
+counters (see stats()) cover all of them.
+"""
+
+import sqlite3
+from hashlib import sha1
+
+from canonical.morgan import canonical_permutation, canonicalize
+from store import encode_molecule, decode_molecule
+
+DEFAULT_MAX_BYTES = 256*1024*1024
+
+# Seconds to wait on a database locked by another process.
+LOCK_TIMEOUT = 30.0
+
+# Rows evicted per query while the cache is over its size.
+_EVICT_BATCH = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS layouts (
+	key TEXT PRIMARY KEY,
+	data BLOB NOT NULL,
+	numChains INTEGER NOT NULL,
+	numRingGroups INTEGER NOT NULL,
+	size INTEGER NOT NULL,
+	accessed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS layouts_accessed ON layouts (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+	id INTEGER PRIMARY KEY CHECK (id = 0),
+	hits INTEGER NOT NULL,
+	misses INTEGER NOT NULL,
+	bytes INTEGER NOT NULL,
+	clock INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats VALUES (0, 0, 0, 0, 0);
+"""
+
+class CachedLayout(object):
+	"""
+	A cache entry, in the atom labels of the molecule looked up:
+
+		* coords -- {atom: (x, y)} for every positioned atom
+		* rings -- the perceived rings, as atom cycles
+		* numChains, numRingGroups -- perception counts
+	"""
+
+	def __init__(self, coords, rings, numChains, numRingGroups):
+		self.coords = coords
+		self.rings = rings
+		self.numChains = numChains
+		self.numRingGroups = numRingGroups
+
+class LayoutCache(object):
+	"""
+	Layouts on disk, keyed by canonical graph. See the module docs.
+
+	hits and misses count the lookups made through this object.
+	"""
+
+	def __init__(self, path, maxBytes=DEFAULT_MAX_BYTES):
+		"""
+		Open (or create) the cache database at the path. maxBytes
+		bounds the size of the stored entries; None for no bound.
+		"""
+		self.path = path
+		self.maxBytes = maxBytes
+		self.hits = 0
+		self.misses = 0
+
+		self._db = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+		self._db.text_factory = str
+		self._db.executescript(_SCHEMA)
+
+		# A lost write only costs a recomputation, so writes need not
+		# wait on the disk. WAL lets readers run alongside a writer.
+		self._db.execute("PRAGMA journal_mode = WAL")
+		self._db.execute("PRAGMA synchronous = NORMAL")
+
+		# Canonical form of the last molecule seen, as a miss is
+		# usually followed by a put() of the same molecule.
+		self._last = (None, None, None, None)
+
+	def _canonical(self, mol):
+		"""
+		Canonical form of the molecule: (order, canonMol, key). order is
+		the canonical order of its atoms (see canonical_permutation()),
+		canonMol the molecule renumbered in that order, and key a hash
+		of canonMol.
+		"""
+		if self._last[0] is mol:
+			return self._last[1:]
+
+		order = canonical_permutation(mol)
+		canonMol = canonicalize(mol, order)
+		key = sha1(encode_molecule(canonMol)).hexdigest()
+		self._last = (mol, order, canonMol, key)
+		return (order, canonMol, key)
+
+	def _tick(self):
+		"""Advance the shared access clock. Returns the new time."""
+		self._db.execute("UPDATE stats SET clock = clock + 1")
+		return self._db.execute("SELECT clock FROM stats").fetchone()[0]
+
+	def get(self, mol):
+		"""The molecule's CachedLayout, or None on a miss."""
+		order, canonMol, key = self._canonical(mol)
+
+		with self._db:
+			row = self._db.execute("SELECT data, numChains, numRingGroups "
+					"FROM layouts WHERE key = ?", (key,)).fetchone()
+			if row is None:
+				self.misses += 1
+				self._db.execute("UPDATE stats SET misses = misses + 1")
+				return None
+
+			self.hits += 1
+			self._db.execute("UPDATE stats SET hits = hits + 1")
+			self._db.execute("UPDATE layouts SET accessed = ? WHERE key = ?",
+					(self._tick(), key))
+
+		stored, canonCoords = decode_molecule(str(row[0]))
+
+		coords = {}
+		for rank, xy in canonCoords.items():
+			coords[order[rank]] = xy
+		rings = [tuple(order[a] for a in ring) for ring in stored.rings]
+
+		return CachedLayout(coords, rings, row[1], row[2])
+
+	def put(self, mol, coords, numChains=0, numRingGroups=0):
+		"""
+		Store the molecule's layout: coords is {atom: (x, y)}, and the
+		molecule's rings are stored with it. Evicts the least recently
+		used entries if the cache grows beyond maxBytes.
+
+		A layout that leaves any ring atom unpositioned is not stored.
+		Returns whether the layout was stored.
+		"""
+		for ring in mol.rings:
+			for atom in ring:
+				if atom not in coords:
+					return False
+
+		order, canonMol, key = self._canonical(mol)
+
+		ranks = [0 for x in range(mol.size)]
+		for i in range(len(order)):
+			ranks[order[i]] = i
+
+		canonCoords = {}
+		for atom, xy in coords.items():
+			canonCoords[ranks[atom]] = xy
+		rings = [[ranks[a] for a in ring] for ring in mol.rings]
+
+		data = encode_molecule(canonMol, canonCoords, rings)
+
+		with self._db:
+			row = self._db.execute("SELECT size FROM layouts WHERE key = ?",
+					(key,)).fetchone()
+			oldSize = row[0] if row else 0
+
+			self._db.execute("INSERT OR REPLACE INTO layouts VALUES "
+					"(?, ?, ?, ?, ?, ?)", (key, sqlite3.Binary(data),
+					numChains, numRingGroups, len(data), self._tick()))
+			self._db.execute("UPDATE stats SET bytes = bytes + ?",
+					(len(data) - oldSize,))
+			self._evict()
+		return True
+
+	def _evict(self):
+		"""Drop the least recently used entries while over maxBytes."""
+		if self.maxBytes is None:
+			return
+
+		size = self._db.execute("SELECT bytes FROM stats").fetchone()[0]
+		while size > self.maxBytes:
+			rows = self._db.execute("SELECT key, size FROM layouts "
+					"ORDER BY accessed LIMIT ?", (_EVICT_BATCH,)).fetchall()
+			if not rows:
+				break
+			for key, entrySize in rows:
+				if size <= self.maxBytes:
+					break
+				self._db.execute("DELETE FROM layouts WHERE key = ?", (key,))
+				size -= entrySize
+			self._db.execute("UPDATE stats SET bytes = ?", (size,))
+
+	def stats(self):
+		"""
+		Persisted counters, over every process using the database:
+		{'hits', 'misses', 'entries', 'bytes'}.
+		"""
+		hits, misses, size = self._db.execute(
+				"SELECT hits, misses, bytes FROM stats").fetchone()
+		entries = self._db.execute("SELECT COUNT(*) FROM layouts").fetchone()
+		return {'hits': hits, 'misses': misses, 'entries': entries[0],
+				'bytes': size}
+
+	def __len__(self):
+		return self._db.execute("SELECT COUNT(*) FROM layouts").fetchone()[0]
+
+	def clear(self):
+		"""Drop every entry and reset the counters."""
+		with self._db:
+			self._db.execute("DELETE FROM layouts")
+			self._db.execute("UPDATE stats SET hits = 0, misses = 0, "
+					"bytes = 0")
+		self.hits = 0
+		self.misses = 0
+
+	def close(self):
+		"""Close the database."""
+		if self._db is not None:
+			self._db.close()
+			self._db = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
@@ -1,174 +1,380 @@
-# TODO: No longer works. Needs to be refactored to support
-# the current Molecule object.
-
-	def getConnectMat(self):
+"""
+Canonical atom ranking, adapted from Morgan's algorithm as presented in
+[Handbook of Cheminformatics Algorithms] and Weininger's CANON, as
+partition refinement:
+
+1. Partition the atoms into cells of equal invariants (type, degree,
+   charge, ...), with the cells ordered by invariant.
+2. Refine the partition: split cells whose atoms differ in their bonds
+   (counted with bond order) to another cell, until no cell splits.
+3. While a cell holds more than one atom, branch: for every atom of
+   the first such cell, put the atom in a cell of its own, in front,
+   and refine again. Each branch ends in a discrete partition, ie. an
+   order of the atoms.
+4. Of all the orders found, keep the one whose bond list (in the
+   atoms' positions) is smallest.
+
+An atom's rank is the position of its cell in the ordered partition.
+Only the cells bonded to a cell that just split are examined again, and
+of the parts of a split cell, the largest is not used to split others
+(Hopcroft's trick), so each refinement round takes O(N log N) sorting
+work rather than re-ranking every atom.
+
+Nothing in steps 1-4 looks at the input atom labels, so isomorphic
+molecules get the same bond list. Two orders with the same bond list
+differ by a symmetry (automorphism) of the molecule; branches that a
+known symmetry maps onto an explored branch are skipped, as is the rest
+of a branch that turned out to be symmetric to the first one explored
+(as in McKay's nauty). Most molecules refine to a discrete partition
+at once, and the search is only one order.
+"""
+
+from collections import deque
+from molecule import Molecule
+
+def atom_invariants(mol):
+	"""
+	Invariant of each atom, as a tuple that orders atoms: type, degree,
+	charge, isotope and the sorted orders of its bonds.
+	"""
+	invariants = []
+	for i in range(mol.size):
+		start = mol.adjOffsets[i]
+		end = mol.adjOffsets[i+1]
+		orders = sorted(mol.adjOrders[start:end])
+		isotope = int(mol.isotopes[i] or 0)
+		invariants.append((mol.types[i], end - start, mol.charges[i],
+				isotope, tuple(orders)))
+	return invariants
+
+class Partition(object):
+	"""
+	Ordered partition of the atoms into cells, for refinement.
+
+	The atoms are kept in one list, ordered by cell. A cell is named by
+	the position of its first atom, which is also the rank of all the
+	atoms it holds.
+	"""
+
+	def __init__(self, mol):
+		self.size = mol.size
+
+		# Neighbors of each atom, as (neighbor, bond order).
+		self.neighbors = []
+		for i in range(mol.size):
+			nbrs = []
+			for k in range(mol.adjOffsets[i], mol.adjOffsets[i+1]):
+				nbrs.append((mol.adjAtoms[k], mol.adjOrders[k]))
+			self.neighbors.append(nbrs)
+
+		invariants = atom_invariants(mol)
+		self.order = sorted(range(mol.size), key=lambda v: invariants[v])
+
+		self.position = [0 for x in range(mol.size)] # Index in order
+		self.cell = [0 for x in range(mol.size)] # Cell of each atom
+		self.cellEnd = {} # Cell -> end position (exclusive)
+
+		start = 0
+		for i in range(mol.size):
+			v = self.order[i]
+			self.position[v] = i
+			if i and invariants[v] != invariants[self.order[i-1]]:
+				self.cellEnd[start] = i
+				start = i
+			self.cell[v] = start
+		if mol.size:
+			self.cellEnd[start] = mol.size
+
+		# Cells still to be used as splitters, in the order queued.
+		self.queue = deque(sorted(self.cellEnd))
+		self.queued = set(self.queue)
+
+	def isDiscrete(self):
+		"""Whether every atom is in a cell of its own."""
+		return len(self.cellEnd) == self.size
+
+	def refine(self):
+		"""Split cells until no splitter in the queue splits any cell."""
+		while self.queue:
+			splitter = self.queue.popleft()
+			self.queued.discard(splitter)
+			self._split_by(splitter)
+
+	def _split_by(self, splitter):
+		"""Split every cell by its atoms' bonds into the splitter."""
+		# Bond orders into the splitter, for every atom bonded to it.
+		bondsInto = {}
+		for i in range(splitter, self.cellEnd[splitter]):
+			for n, order in self.neighbors[self.order[i]]:
+				bondsInto.setdefault(n, []).append(order)
+
+		touched = {}
+		for v in bondsInto:
+			touched.setdefault(self.cell[v], []).append(v)
+
+		for cell in sorted(touched):
+			atoms = touched[cell]
+			if self.cellEnd[cell] - cell == 1:
+				continue
+
+			keys = {}
+			for v in atoms:
+				keys[v] = tuple(sorted(bondsInto[v]))
+			self._split_cell(cell, atoms, keys)
+
+	def _split_cell(self, cell, atoms, keys):
 		"""
-		Build a connection matrix we can use in Floyd's algorithm.
-		'Not connected' is represented by infinity.
+		Split the cell by the keys of its touched atoms. Untouched atoms
+		(no key) come first, then the touched ones by key order.
 		"""
-		# TODO: Move to module where this is actually used...
-
-		inf = float('Infinity')
-		newMat = [[inf for x in range(self.size)] for xx in range(self.size)]
-
-		for i in range(self.size):
-			for j in range(self.size):
-				val = self.connectMat[i][j]
-				val = inf if not val else 1
-				newMat[i][j] = val
-
-		return newMat
-
-	def canonicalize(self):
+		end = self.cellEnd[cell]
+		order = self.order
+		position = self.position
+
+		# Move the touched atoms to the end of the cell.
+		tail = end
+		for v in atoms:
+			tail -= 1
+			u = order[tail]
+			i = position[v]
+			order[i] = u
+			position[u] = i
+			order[tail] = v
+			position[v] = tail
+
+		touchedAtoms = sorted(atoms, key=lambda v: keys[v])
+		if tail == cell and keys[touchedAtoms[0]] == keys[touchedAtoms[-1]]:
+			return # Every atom has the same key: no split.
+
+		for i in range(len(touchedAtoms)):
+			v = touchedAtoms[i]
+			order[tail + i] = v
+			position[v] = tail + i
+
+		# New cell boundaries.
+		starts = [cell]
+		if tail > cell:
+			starts.append(tail)
+		for i in range(1, len(touchedAtoms)):
+			if keys[touchedAtoms[i]] != keys[touchedAtoms[i-1]]:
+				starts.append(tail + i)
+
+		bounds = starts + [end]
+		for k in range(len(starts)):
+			self.cellEnd[starts[k]] = bounds[k+1]
+			if k:
+				for i in range(starts[k], bounds[k+1]):
+					self.cell[order[i]] = starts[k]
+
+		# Queue the new cells. If the cell was not queued, the largest
+		# part is not needed as a splitter.
+		skip = None
+		if cell not in self.queued:
+			skip = max(starts, key=lambda s: (self.cellEnd[s] - s, -s))
+		for s in starts:
+			if s != skip and s not in self.queued:
+				self.queue.append(s)
+				self.queued.add(s)
+
+	def copy(self):
+		"""A copy to refine separately; the neighbor lists are shared."""
+		other = Partition.__new__(Partition)
+		other.size = self.size
+		other.neighbors = self.neighbors
+		other.order = self.order[:]
+		other.position = self.position[:]
+		other.cell = self.cell[:]
+		other.cellEnd = self.cellEnd.copy()
+		other.queue = deque(self.queue)
+		other.queued = set(self.queued)
+		return other
+
+	def targetCell(self):
+		"""The atoms of the first cell with more than one atom."""
+		for cell in sorted(self.cellEnd):
+			if self.cellEnd[cell] - cell > 1:
+				return self.order[cell:self.cellEnd[cell]]
+		return []
+
+	def individualize(self, v):
 		"""
-		Adapted from Morgan's original algorithm as presented in
-		[Handbook of Cheminformatics Algorithms]
-
-		1. Label each node with its degree.
-		2. Count number of different values.
-		3. Recalculate labels by summing label values at neighbor nodes
-		4. Count number of different values.
-		5. Repeat from 3 until there is no change in number of different vals
-			Awesome!!
-
+		Break a tie: atom v is put in a cell of its own, in front of
+		the rest of its cell.
 		"""
-
-		# Some subroutines used in the canonicalization procedure
-
-		def num_distinct(li):
-			"""Get the number of distinct vals in a list."""
-			m = {}
-			for x in li:
-				m[x] = True
-			return len(m)
-
-		def get_neighbors(mat, atom):
-			"""Get the neighbors of atom i."""
-			n = []
-			for i in range(len(mat)):
-				if mat[atom][i]:
-					n.append(i)
-			return n
-
-		def max_pos(li):
-			"""Find the position of the maximum value in a list"""
-			hi = li[0]
-			hiPos = 0
-			for i in range(len(li)):
-				if li[i] > hi:
-					hi = li[i]
-					hiPos = i
-				elif li[i] == hi:
-					pass # TODO: Bond orders to differentiate?
-			return hiPos
-
-		matrix = self.connectMat # Shortcut XXX: Remove?
-
-		size = len(matrix) # XXX: Remove this.
-
-		# Atom labels -- used to build the new indices
-		labels = [0 for x in range(size)]
-
-		# Initially label each atom with its degree
-		for i in range(size):
-			for j in range(size):
-				if matrix[i][j]:
-					labels[i] += 1
-
-		"""MORGAN'S ALGORITHM - PART ONE"""
-
-		# Calculate atom labels until the number of distinct labels no
-		# longer changes
-		diff = num_distinct(labels)
-		diff2 = diff
-		repeatLoop = 5
-		iterCount = 0
-		while repeatLoop > 0 and iterCount < 1000:
-			newLabels = [0 for x in range(size)]
-			# Recompute label as the sum of the neighbor atom's labels.
-			for i in range(size):
-				for j in range(size):
-					if not matrix[i][j]: 
-						continue
-					newLabels[i] += labels[j]
-
-			labels = newLabels
-			diff2 = num_distinct(labels)
-
-			# XXX: Hack -- Continue at least 5 times after the values
-			# appear to have converged.
-			if diff == diff2:
-				repeatLoop -= 1
-				#break
-			diff = diff2
-			iterCount += 1 # XXX: Hack, "CCCCC" alkane gets stuck in inf loop
-
-		"""MORGAN'S ALGORITHM - PART TWO"""
-
-		# Score / Order the atoms by their labels.
-		canonicalOrder = []
-
-		# Node One will be the maximum labelled atom.
-		queue = []
-		queue.append(max_pos(labels))
-
-		# Canonicalization procedure. 
-		while len(queue) > 0:
-			front = queue.pop(0)
-			canonicalOrder.append(front)
-			nbrs = get_neighbors(matrix, front)
-			while len(nbrs) > 0:
-				# TODO: Need to use bond orders!
-				hi = nbrs.pop(max_pos(nbrs))
-				if hi not in canonicalOrder \
-					and hi not in queue:
-						queue.append(hi)
-
-		"""RECONSTRUCT THE NEW MATRIX"""
-
-		newMolMat = MolMatrix(self.size)
-
-		def map_connectivity(newMat, newAtmPos, oldAtmPos, 
-				newNbrPos, oldNbrPos):
-			"""
-			This function is called for each atom in order to map its
-			previous old graph connectivity into the new one. (Atoms 
-			are still bonded to the same neighbors.)
-			"""
-			def mapGraphs(newMat, oldMat):
-				newMat[newAtmPos][newNbrPos] = \
-						oldMat[oldAtmPos][oldNbrPos]
-				newMat[newNbrPos][newAtmPos] = \
-						oldMat[oldNbrPos][oldAtmPos]
-			
-			# Connectivity and Bond Order matrices
-			mapGraphs(newMat.connectMat, self.connectMat)
-			mapGraphs(newMat.bondOrderMat, self.bondOrderMat)
-
-
-		def map_atom(newMat, newPos, oldPos):
-			"""
-			Transfer the atom type, charge, isotope, etc. data to its 
-			new labeled position.
-			"""
-			newMat.atomTypes[newPos] = self.atomTypes[oldPos]
-			newMat.atomCharges[newPos] = self.atomCharges[oldPos]
-			newMat.atomIsotopes[newPos] = self.atomIsotopes[oldPos]
-
-		# Build new matrix
-		for i in range(size):
-			newAtmPos = i
-			oldAtmPos = canonicalOrder[i]
-			neighbors = get_neighbors(matrix, oldAtmPos)
-
-			map_atom(newMolMat, newAtmPos, oldAtmPos)
-
-			for n in neighbors:
-				oldNbrPos = n
-				newNbrPos = canonicalOrder.index(n)
-
-				map_connectivity(newMolMat, newAtmPos, oldAtmPos, 
-							newNbrPos, oldNbrPos)
-
-		return newMolMat
-
+		cell = self.cell[v]
+		end = self.cellEnd[cell]
+
+		# Swap it to the front of the cell, and split it off.
+		i = self.position[v]
+		u = self.order[cell]
+		self.order[i] = u
+		self.position[u] = i
+		self.order[cell] = v
+		self.position[v] = cell
+
+		self.cellEnd[cell] = cell + 1
+		self.cellEnd[cell + 1] = end
+		for k in range(cell + 1, end):
+			self.cell[self.order[k]] = cell + 1
+
+		# The rest of the cell needn't be a splitter (see _split_cell()).
+		if cell not in self.queued:
+			self.queue.append(cell)
+			self.queued.add(cell)
+
+def _certificate(mol, order):
+	"""
+	The bonds of the molecule with its atoms in the order, as a sorted
+	tuple of (position, position, bond order). Atom invariants need not
+	be included: every order the search finds has the same invariant
+	at each position.
+	"""
+	position = [0 for x in range(mol.size)]
+	for i in range(len(order)):
+		position[order[i]] = i
+
+	bonds = []
+	for i in range(mol.size):
+		for k in range(mol.adjOffsets[i], mol.adjOffsets[i+1]):
+			j = mol.adjAtoms[k]
+			if i < j:
+				a = position[i]
+				b = position[j]
+				if a > b:
+					a, b = b, a
+				bonds.append((a, b, mol.adjOrders[k]))
+	bonds.sort()
+	return tuple(bonds)
+
+def _orbits(atoms, automorphisms, fixed):
+	"""
+	Orbits of the atoms under the automorphisms that fix every atom in
+	fixed. Returns {atom: orbit representative}.
+	"""
+	parent = {}
+	for v in atoms:
+		parent[v] = v
+
+	def find(v):
+		while parent[v] != v:
+			parent[v] = parent[parent[v]]
+			v = parent[v]
+		return v
+
+	for perm in automorphisms:
+		if any(perm[v] != v for v in fixed):
+			continue
+		for v in atoms:
+			w = perm[v]
+			if w not in parent:
+				continue
+			a = find(v)
+			b = find(w)
+			if a != b:
+				parent[max(a, b)] = min(a, b)
+
+	return dict((v, find(v)) for v in atoms)
+
+def canonical_permutation(mol):
+	"""
+	Canonical order of the atoms: a list where the i-th entry is the
+	atom that goes to position i.
+	"""
+	partition = Partition(mol)
+	partition.refine()
+	if partition.isDiscrete():
+		return partition.order[:]
+
+	# Search state: the first and the best leaves found, as (order,
+	# certificate, path of individualized atoms), and the symmetries
+	# found, as atom -> atom lists.
+	first = []
+	best = []
+	automorphisms = []
+
+	def automorphism(order, otherOrder):
+		"""The permutation taking one leaf's order onto the other's."""
+		perm = [0 for x in range(mol.size)]
+		for i in range(mol.size):
+			perm[order[i]] = otherOrder[i]
+		return perm
+
+	def search(partition, path):
+		"""
+		Explore the partition's subtree. Returns the depth to jump back
+		to when the subtree proved symmetric to the first leaf's, or
+		None to carry on.
+		"""
+		if partition.isDiscrete():
+			order = partition.order[:]
+			cert = _certificate(mol, order)
+			if not first:
+				first[:] = [order, cert, path]
+				best[:] = [order, cert, path]
+				return None
+
+			if cert == first[1]:
+				automorphisms.append(automorphism(order, first[0]))
+				# Jump back to where this path left the first one.
+				depth = 0
+				while depth < len(path) - 1 and \
+						path[depth] == first[2][depth]:
+					depth += 1
+				return depth
+
+			if cert == best[1]:
+				automorphisms.append(automorphism(order, best[0]))
+			elif cert < best[1]:
+				best[:] = [order, cert, path]
+			return None
+
+		depth = len(path)
+		atoms = partition.targetCell()
+		explored = []
+		for v in sorted(atoms):
+			if explored:
+				orbits = _orbits(atoms, automorphisms, path)
+				if orbits[v] in set(orbits[u] for u in explored):
+					continue
+			explored.append(v)
+
+			child = partition.copy()
+			child.individualize(v)
+			child.refine()
+			jump = search(child, path + [v])
+			if jump is not None and jump < depth:
+				return jump
+		return None
+
+	search(partition, [])
+	return best[0]
+
+def canonical_ranks(mol):
+	"""Canonical rank of every atom: distinct integers 0..n-1."""
+	ranks = [0 for x in range(mol.size)]
+	order = canonical_permutation(mol)
+	for i in range(len(order)):
+		ranks[order[i]] = i
+	return ranks
+
+def canonicalize(mol, order=None):
+	"""
+	Renumber the atoms of a molecule in canonical order. The order from
+	canonical_permutation() may be given if already known.
+	"""
+	if order is None:
+		order = canonical_permutation(mol)
+	ranks = [0 for x in range(mol.size)]
+	for i in range(len(order)):
+		ranks[order[i]] = i
+
+	bonds = []
+	for i in range(mol.size):
+		for k in range(mol.adjOffsets[i], mol.adjOffsets[i+1]):
+			j = mol.adjAtoms[k]
+			if i < j:
+				bonds.append((ranks[i], ranks[j], mol.adjOrders[k]))
+
+	return Molecule([mol.types[v] for v in order], bonds=bonds,
+			charges=[mol.charges[v] for v in order],
+			isotopes=[mol.isotopes[v] for v in order])
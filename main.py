@@ -12,13 +12,12 @@ At present, the code I am working on is in 'matrix.py' and 'smiles.py'.
 # Python libs
 import sys
 import random
-import cairo
-from cairo import *
-from glib import markup_escape_text
 from math import radians, sin, cos, ceil 
 
+# GUI toolkits (gtk, cairo, glib) are imported where they are used, so
+# that importing this module stays cheap until a window is opened.
+
 # Parsing, misc.
-from gui import Window
 from examples import get_example
 from smiles import Smiles
 from smiles import smiles_to_molecule
@@ -35,6 +34,7 @@ from perception.chains import *
 
 # Analysis Phase
 from analysis.rings import *
+from sdg import analyze_molecule
 
 class Globals(object):
 	"""Used as a Global Dictionary."""
@@ -46,6 +46,9 @@ def redraw():
 	"""
 	# XXX: DO NOT CHANGE OTHER GUI COMPONENTS! ONLY IMAGE
 
+	import cairo
+	from cairo import SolidPattern
+
 	# Extract globals.
 	ringGroups = Globals.ringGroups
 	drawable = Globals.drawable
@@ -197,6 +200,8 @@ def parse_smiles_text(smiles, informalName=None):
 	Process SMILES text into molecular information and a structure
 	diagram.
 	"""
+	from glib import markup_escape_text
+
 	# Extract globals
 	window = Globals.window
 	debugText = Globals.debugText
@@ -209,17 +214,11 @@ def parse_smiles_text(smiles, informalName=None):
 
 	debugText = ""
 
-	# Perception algorithms. 
-	rings = identify_rings(mol)
-	chains = identify_chains(mol, rings)
+	# Perception algorithms and ring analysis.
+	rings, chains, ringGroups = analyze_molecule(mol)
 	
 	print chains
 
-	# Ring analysis
-	ringGroups = partition_rings(rings)
-	ring_analysis(ringGroups)
-	ring_construction(ringGroups)
-
 	# Pango markup for debug window
 	debugText += "<b>Informal Name</b>:\n%s\n\n" % informalName
 	debugText += "<b>Ring Groups</b>: %d\n" % len(ringGroups)
@@ -282,6 +281,7 @@ def main():
 		print "\n>>> Using %s per argument.\n" % informalName
 
 	# Init GUI.
+	from gui import Window
 	win = Window('Chemical Structure Diagram Generation (WIP)')
 
 	# Set globals.
@@ -2,6 +2,7 @@
 TODO: Doc.
 """
 
+from array import array
 from weights import ATOMIC_WEIGHTS
 
 # TODO: Add a __key__ check for assignment
@@ -14,22 +15,27 @@ class Molecule(object):
 	TODO: Docs.
 	"""
 
-	def __init__(self, types, bondOrderMat, connectMat=None, charges=None,
-				 isotopes=None, ringSystem=None, smiles=None):
+	def __init__(self, types, bondOrderMat=None, connectMat=None,
+				 charges=None, isotopes=None, ringSystem=None, smiles=None,
+				 bonds=None):
 		"""
 		Molecule constructor.
 		Supply input necessary to build the molecule object:
 
 		Mandatory:
 			* types	-- Labels of the atoms. C, N, O, etc.
+		One of (no bonds if neither is given):
+			* bonds -- Edge list of (atomA, atomB, bondOrder) tuples.
+					   Bond orders: 1, 1.5 (aromatic), 2, and 3. 
 			* bondOrderMat -- Weighted adjacency matrix; weights are
 							  the bond orders between atom pairs.
-							  Weights : 1, 1.5 (aromatic), 2, and 3. 
+							  (Legacy input, converted to an edge list.)
 		Optional:
-			* connectMat -- Boolean adjacency matrix.
+			* connectMat -- Boolean adjacency matrix. (Legacy input.)
 			* charges -- Charges on the atoms. Defaults to 0.
 			* isotopes -- Atom isotopes. Default to 0, meaning regular.
-			* ringSystem -- Rings in the system.
+			* ringSystem -- Rings in the system, if already perceived.
+							Ring objects, or atom cycles to build them.
 			* smiles -- Smiles text.
 
 		Everything else is calculated from the supplied information.
@@ -38,11 +44,18 @@ class Molecule(object):
 		# Number of atoms. Typically non-Hydrogen included.
 		self.size = 0
 
-		# Connectivity matrix 
-		self.connectMat = None
+		# Sparse (CSR) bond storage. The neighbors of atom i are
+		# adjAtoms[adjOffsets[i]:adjOffsets[i+1]], and adjOrders holds
+		# the bond order of each of those bonds in parallel. Bond
+		# orders: 1, 1.5 (aromatic), 2, and 3
+		self.adjOffsets = None
+		self.adjAtoms = None
+		self.adjOrders = None
 
-		# Bond orders between atom pairs: 1, 1.5 (aromatic), 2, and 3
-		self.bondOrderMat = None
+		# Dense matrices are only built on request. See the connectMat
+		# and bondOrderMat properties.
+		self._connectMat = None
+		self._bondOrderMat = None
 
 		# Atom labels (tuples)
 		self.types = None # C, O, N, Cl, etc.
@@ -57,10 +70,11 @@ class Molecule(object):
 		self.alphaAtoms = None
 		self.betaAtoms = None
 
-		# Rings and chains
-		self.chains = None
-		self.rings = None
-		self.ringGroups = None
+		# Rings and chains are perceived on first access. See the rings,
+		# chains and ringGroups properties.
+		self._rings = None
+		self._chains = None
+		self._ringGroups = None
 
 		# Smiles text, etc. (optional)
 		self.smiles = None
@@ -97,24 +111,58 @@ class Molecule(object):
 		def make_immutable(func):
 			"""Function decorator version."""
 			def wrap(arg1, arg2=None):
-				if arg2:
+				if arg2 is not None:
 					return immutable(func(arg1, arg2))
 				return immutable(func(arg1))
 			return wrap
 
-		@make_immutable
-		def generate_alpha_table(mat):
-			"""Compute the alpha (direct neighbor) connection table 
-			upfront from the connection matrix."""
+		def matrix_to_bonds(bondOrderMat, connectMat):
+			"""Convert legacy dense matrix input into an edge list. The
+			connection matrix (if any) determines connectivity."""
+			mat = connectMat if connectMat else bondOrderMat
 			sz = len(mat)
-			table = [[] for x in range(sz)]
+			bonds = []
 			for i in range(sz):
-				for j in range(sz):
-					if i == j:
+				for j in range(i+1, sz):
+					if not mat[i][j]:
 						continue
-					if mat[i][j]:
-						table[i].append(j)
-			return table
+					order = 1
+					if bondOrderMat and bondOrderMat[i][j]:
+						order = bondOrderMat[i][j]
+					bonds.append((i, j, order))
+			return bonds
+
+		def build_csr(sz, bonds):
+			"""
+			Build the compressed sparse row (CSR) arrays from an edge
+			list: (offsets, neighbor atoms, bond orders). Neighbors are
+			sorted per atom. Self-bonds are ignored, and repeated bonds
+			keep the last bond order given.
+			"""
+			rows = [{} for x in range(sz)]
+			for a, b, order in bonds:
+				if a == b:
+					continue
+				rows[a][b] = order
+				rows[b][a] = order
+
+			offsets = array('i', [0])
+			atoms = array('i')
+			orders = array('d')
+			for i in range(sz):
+				row = rows[i]
+				for n in sorted(row):
+					atoms.append(n)
+					orders.append(row[n])
+				offsets.append(len(atoms))
+			return (offsets, atoms, orders)
+
+		@make_immutable
+		def generate_alpha_table(offsets, atoms):
+			"""Compute the alpha (direct neighbor) connection table 
+			upfront from the CSR arrays."""
+			sz = len(offsets) - 1
+			return [atoms[offsets[i]:offsets[i+1]] for i in range(sz)]
 
 		@make_immutable
 		def generate_beta_table(alpha):
@@ -130,7 +178,7 @@ class Molecule(object):
 						table[i].append(k)
 			return table
 
-		def compute_hybridizations(bondOrderMat, neighborTable):
+		def compute_hybridizations(offsets, orders):
 			"""
 			Generate Hybridization State for each atom.
 			This is determined by analyzing the number of pi bond
@@ -140,12 +188,12 @@ class Molecule(object):
 			"""
 			HYBRID_VALUES = {0: 'sp3', 1: 'sp2', 2: 'sp'}
 
-			sz = len(bondOrderMat)
+			sz = len(offsets) - 1
 			hybrids = ['error' for x in range(sz)]
 			for i in range(sz):
 				numPi = 0 # Number of pi systems
-				for n in neighborTable[i]:
-					bond = bondOrderMat[i][n]
+				for k in range(offsets[i], offsets[i+1]):
+					bond = orders[k]
 					if bond >= 2:
 						numPi += bond - 1
 				if numPi in HYBRID_VALUES:
@@ -236,22 +284,34 @@ class Molecule(object):
 		Setup from constructor input.
 		"""
 
-		# FIXME: Handle data that isn't supplied.
+		self.size = len(types)
 
-		self.size = len(connectMat)
+		if bonds is None:
+			if bondOrderMat is None and connectMat is None:
+				bonds = [] # Unbonded atoms
+			else:
+				bonds = matrix_to_bonds(bondOrderMat, connectMat)
 
-		self.connectMat = immutable(connectMat)
-		self.bondOrderMat = immutable(bondOrderMat)
+		csr = build_csr(self.size, bonds)
+		self.adjOffsets = csr[0]
+		self.adjAtoms = csr[1]
+		self.adjOrders = csr[2]
 
-		self.alphaAtoms = generate_alpha_table(connectMat)
+		self.alphaAtoms = generate_alpha_table(self.adjOffsets,
+								self.adjAtoms)
 		self.betaAtoms = generate_beta_table(self.alphaAtoms)
 
+		if not charges:
+			charges = [0 for x in range(self.size)]
+		if not isotopes:
+			isotopes = [0 for x in range(self.size)]
+
 		self.types = tuple(types)
 		self.charges = tuple(charges)
 		self.isotopes = tuple(isotopes)
 		self.degrees = compute_degrees(types, self.alphaAtoms)
-		self.hybridizations = compute_hybridizations(bondOrderMat, 
-								self.alphaAtoms)
+		self.hybridizations = compute_hybridizations(self.adjOffsets,
+								self.adjOrders)
 
 		self.hydrogens = calculate_hydrogens(types, self.hybridizations,
 								self.alphaAtoms)
@@ -260,12 +320,110 @@ class Molecule(object):
 
 		self.smiles = smiles
 
+		if ringSystem is not None:
+			from ring import Ring
+			self._rings = tuple(r if isinstance(r, Ring) else Ring(r, mol=self)
+					for r in ringSystem)
+
+	def getBondOrder(self, i, j):
+		"""
+		Get the bond order between atoms i and j, or 0 if they are
+		not bonded. Scans only the neighbors of i.
+		"""
+		for k in range(self.adjOffsets[i], self.adjOffsets[i+1]):
+			if self.adjAtoms[k] == j:
+				return self.adjOrders[k]
+		return 0
+
+	def getBondIndex(self, i, j):
+		"""
+		Get a unique index for the bond between atoms i and j: its
+		position in the sparse storage, as seen from the lower labeled
+		atom. Indices are less than twice the number of bonds.
+		"""
+		if i > j:
+			i, j = j, i
+		for k in range(self.adjOffsets[i], self.adjOffsets[i+1]):
+			if self.adjAtoms[k] == j:
+				return k
+		raise Exception, "Atoms %d and %d are not bonded." % (i, j)
+
+	def _dense_matrix(self, useOrders):
+		"""
+		Materialize a dense N x N tuple-of-tuples view of the bonds.
+		Unbonded pairs are False; bonded pairs are True, or the bond
+		order if useOrders is set.
+		"""
+		mat = []
+		for i in range(self.size):
+			row = [False for x in range(self.size)]
+			for k in range(self.adjOffsets[i], self.adjOffsets[i+1]):
+				row[self.adjAtoms[k]] = \
+						self.adjOrders[k] if useOrders else True
+			mat.append(tuple(row))
+		return tuple(mat)
+
+	@property
+	def connectMat(self):
+		"""
+		Boolean adjacency matrix. Legacy view, built from the sparse
+		bond storage on first access. Prefer alphaAtoms.
+		"""
+		if not self._connectMat:
+			self._connectMat = self._dense_matrix(False)
+		return self._connectMat
+
+	@property
+	def bondOrderMat(self):
+		"""
+		Weighted adjacency matrix of bond orders. Legacy view, built
+		from the sparse bond storage on first access. Prefer
+		getBondOrder().
+		"""
+		if not self._bondOrderMat:
+			self._bondOrderMat = self._dense_matrix(True)
+		return self._bondOrderMat
+
+	@property
+	def rings(self):
+		"""
+		Rings of the molecule (see perception.rings). Perceived on first
+		access, and shared from then on.
+		"""
+		if self._rings is None:
+			from perception.rings import identify_rings
+			self._rings = identify_rings(self)
+		return self._rings
+
+	@property
+	def chains(self):
+		"""
+		Chains of the molecule (see perception.chains). Perceived on
+		first access, and shared from then on.
+		"""
+		if self._chains is None:
+			from perception.chains import identify_chains
+			self._chains = identify_chains(self, self.rings)
+		return self._chains
+
+	@property
+	def ringGroups(self):
+		"""
+		The rings partitioned into ring groups (see ring.py). Built on
+		first access, and shared from then on; ring analysis and
+		construction annotate these groups.
+		"""
+		if self._ringGroups is None:
+			from ring import partition_rings
+			self._ringGroups = partition_rings(self.rings)
+		return self._ringGroups
 
 	def __setattr__(self, k, v):
 		"""Limit the ability to manage the object's dictionary."""
 		valid = ('size',
-				'connectMat',
-				'bondOrderMat',
+				'adjOffsets',
+				'adjAtoms',
+				'adjOrders',
 				'types',
 				'charges',
 				'isotopes',
@@ -297,10 +455,13 @@ class Molecule(object):
 		if self.size != other.size:
 			return False
 
-		if self.connectMat != other.connectMat:
+		if self.adjOffsets != other.adjOffsets:
+			return False
+
+		if self.adjAtoms != other.adjAtoms:
 			return False
 
-		if self.bondOrderMat != other.bondOrderMat:
+		if self.adjOrders != other.adjOrders:
 			return False
 
 		# FIXME: This doesn't mean two molecules are the same. 
@@ -356,11 +517,10 @@ class Molecule(object):
 
 		# Bond Order Graph data
 		for i in range(self.size):
-			ln = row_header(i)
-			for j in range(self.size):
-				ln += str(int(self.bondOrderMat[i][j])) + " " \
-						if self.bondOrderMat[i][j] else ". "
-			txt += "%s\n" % ln
+			row = [". " for x in range(self.size)]
+			for k in range(self.adjOffsets[i], self.adjOffsets[i+1]):
+				row[self.adjAtoms[k]] = "%d " % int(self.adjOrders[k])
+			txt += "%s\n" % (row_header(i) + "".join(row))
 
 		# Lots of information 
 		txt += "\nLabels; Hybridization; Degree; Alpha and Beta Atoms:\n"
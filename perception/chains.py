@@ -17,49 +17,56 @@ capping substituents. Core Chain Atoms are:
 # FIXME: Better documentation
 # FIXME: Cleanup messy code
 
+from collections import deque
 from algo.path import ShortestPaths
 from chain import Chain
 	
-def identify_chains(mol, rings=None):
+CHAIN_ALGORITHMS = ('tree', 'allpairs')
+
+def identify_chains(mol, rings=None, algorithm='tree'):
 	"""
 	Identify all chains in the molecule.
+
+	The core chain atoms form one or more connected components. The
+	longest path over all components is extracted as a chain, and its
+	atoms are removed. Only the component the chain came from has
+	changed, so only its remains are searched again; the longest paths
+	of all other components are kept from before.
+
+	The longest path of a component is found with one of:
+		* 'tree' -- Linear time diameter search (repeated BFS) for
+					acyclic components, which core chain atoms are
+					when the rings are supplied. Components with
+					cycles fall back to 'allpairs'.
+		* 'allpairs' -- Longest of all shortest paths (ShortestPaths).
+	Both yield the same chains.
 	"""
-	
-	def build_connect_mat(mol):
-		"""Build a connection matrix we can use in Floyd's algorithm"""
-		inf = float('Infinity') # 'Not connected' is repr by infinity
-		newMat = [[inf for x in range(mol.size)] for y in range(mol.size)]
-		for i in range(mol.size):
-			for j in range(mol.size):
-				val = mol.connectMat[i][j]
-				val = inf if not val else 1
-				newMat[i][j] = val
-		return newMat
-
-	def get_core_vertices(coreFlags):
-		"""Get a list of core vertices from core chain flags"""
-		core = []
-		for i in range(len(coreFlags)):
-			if coreFlags[i]:
-				core.append(i)
-		return core
-
-	def get_noncore_vertices(coreFlags):
-		"""Get a list of non-core vertices from core chain flags."""
-		noncore = []
-		for i in range(len(coreFlags)):
-			if not coreFlags[i]:
-				noncore.append(i)
-		return noncore
-
-	def disconnect_vertices(matrix, removeVerts = []):
-		"""Disconnect the vertices specified from the adj matrix"""
-		inf = float('Infinity')
-		length = len(matrix)
-		for vert in removeVerts:
-			for i in range(length):
-				matrix[i][vert] = inf
-				matrix[vert][i] = inf
+	if algorithm not in CHAIN_ALGORITHMS:
+		raise Exception, "Invalid chain algorithm, `%s`." % algorithm
+
+	def find_components(verts, alive):
+		"""
+		Split the vertices into connected components (sorted lists),
+		only traversing vertices flagged as alive.
+		"""
+		seen = {}
+		components = []
+		for v in verts:
+			if v in seen:
+				continue
+			seen[v] = True
+			component = [v]
+			stack = [v]
+			while stack:
+				cur = stack.pop()
+				for n in mol.alphaAtoms[cur]:
+					if alive[n] and n not in seen:
+						seen[n] = True
+						component.append(n)
+						stack.append(n)
+			component.sort()
+			components.append(component)
+		return components
 
 	def find_maxweight_verts(shortestPaths):
 		"""
@@ -82,6 +89,135 @@ def identify_chains(mol, rings=None):
 
 		return maxPath
 
+	def find_longest_path(component):
+		"""
+		Find the longest shortest path within a component. Ties are
+		broken by the lowest atom labels. Returns (weight, path), or
+		None if the component has no paths.
+		"""
+		inf = float('Infinity') # 'Not connected' is repr by infinity
+		length = len(component)
+		if length < 2:
+			return None
+
+		# Connection matrix over the component, for ShortestPaths.
+		index = {}
+		for i in range(length):
+			index[component[i]] = i
+
+		mat = [[inf for x in range(length)] for y in range(length)]
+		for i in range(length):
+			for n in mol.alphaAtoms[component[i]]:
+				if n in index:
+					mat[i][index[n]] = 1
+
+		s = ShortestPaths(mat)
+		verts = find_maxweight_verts(s)
+		path = s.findPath(verts[0], verts[1], include=True)
+		if type(path) != list:
+			return None
+
+		weight = s.getWeight(verts[0], verts[1])
+		return (weight, [component[x] for x in path])
+
+	def bfs(src, alive):
+		"""
+		Breadth first search over alive vertices. Returns distance
+		and parent dictionaries.
+		"""
+		dist = {src: 0}
+		parent = {src: None}
+		queue = deque([src])
+		while queue:
+			v = queue.popleft()
+			for n in mol.alphaAtoms[v]:
+				if alive[n] and n not in dist:
+					dist[n] = dist[v] + 1
+					parent[n] = v
+					queue.append(n)
+		return (dist, parent)
+
+	def is_acyclic(component, alive):
+		"""A connected component is a tree if it has n-1 edges."""
+		degreeSum = 0
+		for v in component:
+			for n in mol.alphaAtoms[v]:
+				if alive[n]:
+					degreeSum += 1
+		return degreeSum == 2*(len(component) - 1)
+
+	def find_tree_diameter(component, alive):
+		"""
+		Find the longest path within an acyclic component in linear
+		time. The farthest vertex 'a' from any vertex is an end of a
+		diameter, and the farthest vertex 'b' from 'a' is the other.
+		In a tree, every vertex's eccentricity is its larger distance
+		to 'a' or 'b'. So the lowest labeled diameter end 'i', and its
+		lowest labeled partner 'j', are found with two more searches.
+		Returns (weight, path), or None if the component has no paths.
+		"""
+		if len(component) < 2:
+			return None
+
+		def farthest(dist):
+			"""Lowest labeled vertex at the maximum distance."""
+			best = component[0]
+			for v in component:
+				if dist[v] > dist[best]:
+					best = v
+			return best
+
+		a = farthest(bfs(component[0], alive)[0])
+		distA = bfs(a, alive)[0]
+		b = farthest(distA)
+		diameter = distA[b]
+		distB = bfs(b, alive)[0]
+
+		i = None
+		for v in component:
+			if max(distA[v], distB[v]) == diameter:
+				i = v
+				break
+
+		distI, parentI = bfs(i, alive)
+		j = None
+		for v in component:
+			if distI[v] == diameter:
+				j = v
+				break
+
+		path = [j]
+		while path[-1] != i:
+			path.append(parentI[path[-1]])
+		path.reverse()
+
+		return (diameter, path)
+
+	def add_components(verts, alive, found):
+		"""Find the longest path of each component among verts."""
+		for component in find_components(verts, alive):
+			if algorithm == 'tree' and is_acyclic(component, alive):
+				longest = find_tree_diameter(component, alive)
+			else:
+				longest = find_longest_path(component)
+			if longest:
+				found.append((longest, component))
+
+	def pop_longest(found):
+		"""
+		Remove and return the longest path of all components, ties
+		going to the lowest atom labels. Returns (path, component).
+		"""
+		best = 0
+		for k in range(1, len(found)):
+			w, path = found[k][0]
+			bw, bestPath = found[best][0]
+			if w > bw or (w == bw and (path[0], path[-1]) < \
+					(bestPath[0], bestPath[-1])):
+				best = k
+		longest, component = found.pop(best)
+		return (longest[1], component)
+
 	# Ring atoms cannot be considered in chain perception. 
 	ringAtoms = []
 	if rings:
@@ -90,33 +226,23 @@ def identify_chains(mol, rings=None):
 			ratoms += r
 		ringAtoms = list(set(ratoms))
 
-	# Find, identify the "core chain" atoms
+	# Find, identify the "core chain" atoms. Only these are
+	# considered "alive" for chain paths in the first pass.
 	coreFlags = _identify_core_chain_atoms(mol, ringAtoms)
-
-	# Copy the molecule's connectivity matrix, then specify that all
-	# non-"core chain" atoms are to be removed in the first pass.
-	connectMat = build_connect_mat(mol)
-	removeAtoms = get_noncore_vertices(coreFlags)
+	alive = coreFlags[:]
 
 	# Don't reuse capping substituents.
 	unusableCaps = []
 
+	# Longest path of each component, as ((weight, path), component)
+	found = []
+	add_components([i for i in range(mol.size) if alive[i]], alive, found)
+
 	# Get all of the chains, starting with the longest. 
 	# Assign arbitrary capping substituents. 
 	chains = []
-	while True:
-		# Disconnect the specified atoms from the connection matrix
-		# This ensures no two chains consist of the same atoms. 
-		disconnect_vertices(connectMat, removeAtoms)
-
-		# (Re)calculate the shortest paths, and extract the longest chain
-		s = ShortestPaths(connectMat)
-		verts = find_maxweight_verts(s)
-		chain = s.findPath(verts[0], verts[1], include=True)
-
-		# FIXME: I assume this is the only condition that breaks the loop...
-		if type(chain) != list:
-			break
+	while found:
+		chain, component = pop_longest(found)
 
 		def reserve_end_cap(chain, pos):
 			"""
@@ -137,10 +263,13 @@ def identify_chains(mol, rings=None):
 		end1 = reserve_end_cap(chain, 0)
 		end2 = reserve_end_cap(chain, -1)
 
-		# Save the chain, end caps, then set up the removal of all
-		# atoms that were in it. 
-		removeAtoms = chain[:]
-		removeAtoms.extend([end1, end2])
+		# Remove all atoms in the chain, and its end caps. This
+		# ensures no two chains consist of the same atoms. 
+		for atom in chain + [end1, end2]:
+			alive[atom] = False
+
+		# Only the chain's component is affected; search its remains.
+		add_components([v for v in component if alive[v]], alive, found)
 
 		chain = Chain(chain)
 		chain.caps = (end1, end2) # FIXME: Not a good interface!
@@ -16,20 +16,34 @@ Chemical Graphs", J. Chem. Inf. Comput. Sci., vol 29 (1989).
 
 [3] Figueras, J. "Efficient Exact Solution of the Ring Perception
 Problem", J. Chem. Inf. Comput. Sci., vol 34 (1994).
+
+An exact SSSR algorithm based on Horton [4] is also available. See
+identify_rings().
 """
 
+from collections import deque
 from ring import Ring
 
 # TODO: Implement phase 1 heuristics
 # TODO: Implement phase 2
 # TODO: Implement phase 3
 
-def identify_rings(mol):
+RING_ALGORITHMS = ('zamora', 'sssr')
+
+def identify_rings(mol, algorithm='zamora'):
 	"""
-	Identify the rings in the system with Zamora's SSSR ring perception
-	algorithm. 
+	Identify the rings in the system with one of the SSSR ring
+	perception algorithms:
+
+		* 'zamora' -- Zamora's algorithm [1]. Only phase one is
+					  implemented, so the ring set may be incomplete.
+		* 'sssr' -- Exact Smallest Set of Smallest Rings (a minimum
+					cycle basis) from Horton's candidate cycles. See
+					_find_sssr().
 	TODO: Further Documentation.
 	"""
+	if algorithm not in RING_ALGORITHMS:
+		raise Exception, "Invalid ring algorithm, `%s`." % algorithm
 
 	def zamora_connectivity(mol):
 		"""
@@ -113,14 +127,156 @@ def identify_rings(mol):
 		return rings
 
 	# TODO: Implement phase two and three.
-	rings = phase1(mol)
+	if algorithm == 'sssr':
+		rings = _find_sssr(mol)
+	else:
+		rings = phase1(mol)
 
 	# Return Ring objects.
 	for i in range(len(rings)):
-		rings[i] = Ring(rings[i])
+		rings[i] = Ring(rings[i], mol=mol)
 
 	return tuple(rings)
 
+def _find_sssr(mol):
+	"""
+	Find the Smallest Set of Smallest Rings, exactly, in polynomial
+	time. Returns a list of atom paths, smallest rings first.
+
+	Based on Horton's algorithm [4]:
+		1. Atoms that cannot be in a ring (degree < 2, repeatedly)
+		   are pruned.
+		2. A shortest path (BFS) tree is grown from every atom v. Each
+		   edge (x, y) closes a candidate cycle P(v, x) + (x, y) +
+		   P(y, v), provided the two paths only share v.
+		3. Candidates are sorted by size. A candidate is kept if it is
+		   linearly independent of those already kept, by Gaussian
+		   elimination over GF(2). Cycles are sets of edges, which we
+		   store as integer bitmasks, so elimination is just XOR.
+		4. Stop once the cyclomatic number (E - V + C) of rings is
+		   found.
+
+	[4] Horton, J. D., "A Polynomial-Time Algorithm to Find the
+	Shortest Cycle Basis of a Graph", SIAM J. Comput., vol 16 (1987).
+	"""
+	# Prune atoms that cannot be in a ring.
+	degree = [len(mol.alphaAtoms[i]) for i in range(mol.size)]
+	alive = [True for x in range(mol.size)]
+	stack = [i for i in range(mol.size) if degree[i] < 2]
+	while stack:
+		v = stack.pop()
+		if not alive[v]:
+			continue
+		alive[v] = False
+		for n in mol.alphaAtoms[v]:
+			if alive[n]:
+				degree[n] -= 1
+				if degree[n] < 2:
+					stack.append(n)
+
+	atoms = [i for i in range(mol.size) if alive[i]]
+	neighbors = {}
+	for v in atoms:
+		neighbors[v] = [n for n in mol.alphaAtoms[v] if alive[n]]
+
+	# Assign each edge a bit.
+	edgeBit = {}
+	for v in atoms:
+		for n in neighbors[v]:
+			if v < n:
+				edgeBit[(v, n)] = 1 << len(edgeBit)
+
+	def bit(a, b):
+		return edgeBit[(a, b)] if a < b else edgeBit[(b, a)]
+
+	# Cyclomatic number: E - V + C
+	numComponents = 0
+	seen = {}
+	for v in atoms:
+		if v in seen:
+			continue
+		numComponents += 1
+		seen[v] = True
+		stack = [v]
+		while stack:
+			cur = stack.pop()
+			for n in neighbors[cur]:
+				if n not in seen:
+					seen[n] = True
+					stack.append(n)
+
+	numRings = len(edgeBit) - len(atoms) + numComponents
+	if numRings < 1:
+		return []
+
+	# Candidate cycles, keyed by edge mask to drop duplicates. Values
+	# are (size, root, x, y), enough to rebuild the atom path.
+	candidates = {}
+	parents = {}
+	for v in atoms:
+		parent = {v: None}
+		branch = {v: v} # Child of the root that an atom descends from
+		dist = {v: 0}
+		mask = {v: 0} # Edges on the path from the root
+		order = [v]
+		queue = deque([v])
+		while queue:
+			cur = queue.popleft()
+			for n in neighbors[cur]:
+				if n in dist:
+					continue
+				dist[n] = dist[cur] + 1
+				parent[n] = cur
+				branch[n] = n if cur == v else branch[cur]
+				mask[n] = mask[cur] | bit(cur, n)
+				order.append(n)
+				queue.append(n)
+		parents[v] = parent
+
+		for x in order:
+			for y in neighbors[x]:
+				if x > y or parent[x] == y or parent[y] == x:
+					continue
+				if branch[x] == branch[y]:
+					continue # Paths overlap beyond the root
+				cycle = mask[x] | mask[y] | bit(x, y)
+				if cycle not in candidates:
+					candidates[cycle] = (dist[x] + dist[y] + 1, v, x, y)
+
+	def build_path(root, x, y):
+		"""Atom path root -> x, then y -> (back towards) root."""
+		parent = parents[root]
+		left = [x]
+		while left[-1] != root:
+			left.append(parent[left[-1]])
+		left.reverse()
+		right = [y]
+		while parent[right[-1]] != root and right[-1] != root:
+			right.append(parent[right[-1]])
+		return left + right
+
+	# Gaussian elimination over GF(2). The basis is keyed by the
+	# highest set bit (pivot) of each reduced vector.
+	basis = {}
+	rings = []
+	for cycle in sorted(candidates, key=candidates.get):
+		vec = cycle
+		while vec:
+			pivot = vec.bit_length() - 1
+			if pivot not in basis:
+				break
+			vec ^= basis[pivot]
+
+		if not vec:
+			continue # Dependent on the rings already found.
+
+		basis[vec.bit_length() - 1] = vec
+		rings.append(build_path(*candidates[cycle][1:]))
+		if len(rings) == numRings:
+			break
+
+	return rings
+
 def _find_smallest_ring(mol, first=0, second=None):
 	"""
 	Find the smallest ring containing the atom 'first', or to find the
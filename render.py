@@ -0,0 +1,260 @@
+"""
+Structure diagram rendering without a display server.
+
+Renders Depiction objects (see sdg.py) to SVG, built as plain strings,
+or through an offscreen cairo surface to PNG and multi-page PDF. Only
+atoms with coordinates are drawn, along with the bonds between them;
+chain atoms have no layout yet.
+
+	>>> depictions = depict_many(smilesList, workers=4)
+	>>> render_many(depictions, 'out/', format='svg')
+
+pycairo is only needed for PNG and PDF output, and is imported on first
+use.
+"""
+
+import os
+from math import sqrt, pi
+
+from sdg import Depiction
+
+# Drawing defaults, in output units (px for SVG and PNG, pt for PDF).
+MARGIN = 20.0
+LINE_WIDTH = 1.5
+FONT_SIZE = 12.0
+DOUBLE_BOND_GAP = 6.0 # Distance between the lines of a multiple bond
+
+RENDER_FORMATS = ('svg', 'png')
+
+def _layout(depiction, scale=1.0, margin=MARGIN):
+	"""
+	Scale and translate the depiction's coordinates into the drawing
+	area. Returns (width, height, points, segments, labels):
+		* points -- {atom: (x, y)}
+		* segments -- (x1, y1, x2, y2) lines for every drawn bond
+		* labels -- (x, y, text) for positioned non-carbon atoms
+
+	The second line of a double bond goes on the side with more bonded
+	neighbours, which is inside the ring for a ring bond, and is
+	shortened so that it stays clear of the neighbouring bonds.
+	"""
+	coords = depiction.coords
+	if not coords:
+		return (2*margin, 2*margin, {}, [], [])
+
+	xs = [pt[0] for pt in coords.values()]
+	ys = [pt[1] for pt in coords.values()]
+	minX = min(xs)
+	minY = min(ys)
+
+	points = {}
+	for atom, (x, y) in coords.items():
+		points[atom] = (margin + scale*(x - minX), margin + scale*(y - minY))
+
+	width = 2*margin + scale*(max(xs) - minX)
+	height = 2*margin + scale*(max(ys) - minY)
+
+	# Drawn bonds of every positioned atom.
+	neighbors = dict((atom, []) for atom in points)
+	for a, b, order in depiction.bonds:
+		if a in points and b in points:
+			neighbors[a].append(b)
+			neighbors[b].append(a)
+
+	segments = []
+	for a, b, order in depiction.bonds:
+		if a not in points or b not in points:
+			continue
+		x1, y1 = points[a]
+		x2, y2 = points[b]
+		segments.append((x1, y1, x2, y2))
+
+		if order not in (2, 3):
+			continue
+		length = sqrt((x2 - x1)**2 + (y2 - y1)**2)
+		if not length:
+			continue
+		nx = (y1 - y2)/length
+		ny = (x2 - x1)/length
+
+		# Extra lines of a triple bond, on both sides.
+		if order == 3:
+			for off in (-DOUBLE_BOND_GAP, DOUBLE_BOND_GAP):
+				segments.append((x1 + nx*off, y1 + ny*off,
+						x2 + nx*off, y2 + ny*off))
+			continue
+
+		# Count the neighbours on either side of the bond.
+		side = 0
+		for atom, other in ((a, b), (b, a)):
+			x, y = points[atom]
+			for n in neighbors[atom]:
+				if n == other:
+					continue
+				dot = nx*(points[n][0] - x) + ny*(points[n][1] - y)
+				if dot > 0:
+					side += 1
+				elif dot < 0:
+					side -= 1
+
+		off = -DOUBLE_BOND_GAP if side < 0 else DOUBLE_BOND_GAP
+		trim = 0.0
+		if side:
+			trim = min(DOUBLE_BOND_GAP/length, 0.25)
+		dx = (x2 - x1)*trim
+		dy = (y2 - y1)*trim
+		segments.append((x1 + dx + nx*off, y1 + dy + ny*off,
+				x2 - dx + nx*off, y2 - dy + ny*off))
+
+	labels = []
+	for atom in sorted(points):
+		if atom >= len(depiction.types):
+			continue
+		text = depiction.types[atom]
+		if text.upper() == 'C':
+			continue
+		x, y = points[atom]
+		labels.append((x, y, text))
+
+	return (width, height, points, segments, labels)
+
+def _escape(text):
+	"""Escape text for use in XML."""
+	return text.replace('&', '&amp;').replace('<', '&lt;') \
+			.replace('>', '&gt;').replace('"', '&quot;')
+
+def depiction_to_svg(depiction, scale=1.0, margin=MARGIN):
+	"""Render a depiction as an SVG document string."""
+	width, height, points, segments, labels = _layout(depiction, scale,
+			margin)
+
+	out = []
+	out.append('<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+			'width="%.1f" height="%.1f" viewBox="0 0 %.1f %.1f">' %
+			(width, height, width, height))
+	out.append('<title>%s</title>' % _escape(depiction.smiles))
+	out.append('<rect width="100%" height="100%" fill="white"/>')
+
+	out.append('<g stroke="black" stroke-width="%.1f" '
+			'stroke-linecap="round">' % LINE_WIDTH)
+	for seg in segments:
+		out.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f"/>' % seg)
+	out.append('</g>')
+
+	if labels:
+		out.append('<g font-family="sans-serif" font-size="%.1f" '
+				'text-anchor="middle" dominant-baseline="central">' %
+				FONT_SIZE)
+		r = 0.7*FONT_SIZE
+		for x, y, text in labels:
+			out.append('<circle cx="%.2f" cy="%.2f" r="%.1f" fill="white"/>'
+					% (x, y, r))
+			out.append('<text x="%.2f" y="%.2f">%s</text>' %
+					(x, y, _escape(text)))
+		out.append('</g>')
+
+	out.append('</svg>')
+	return '\n'.join(out) + '\n'
+
+def _cairo():
+	"""Import pycairo, which is only needed for PNG and PDF output."""
+	try:
+		import cairo
+	except ImportError:
+		raise Exception, "PNG and PDF rendering requires pycairo."
+	return cairo
+
+def _draw_cairo(ctx, layout):
+	"""Draw a layout (see _layout()) onto a cairo context."""
+	width, height, points, segments, labels = layout
+
+	ctx.set_source_rgb(1.0, 1.0, 1.0)
+	ctx.rectangle(0, 0, width, height)
+	ctx.fill()
+
+	ctx.set_source_rgb(0.0, 0.0, 0.0)
+	ctx.set_line_width(LINE_WIDTH)
+	for x1, y1, x2, y2 in segments:
+		ctx.move_to(x1, y1)
+		ctx.line_to(x2, y2)
+	ctx.stroke()
+
+	ctx.set_font_size(FONT_SIZE)
+	r = 0.7*FONT_SIZE
+	for x, y, text in labels:
+		ctx.set_source_rgb(1.0, 1.0, 1.0)
+		ctx.arc(x, y, r, 0, 2*pi)
+		ctx.fill()
+
+		ext = ctx.text_extents(text)
+		ctx.set_source_rgb(0.0, 0.0, 0.0)
+		ctx.move_to(x - ext[2]/2.0 - ext[0], y - ext[3]/2.0 - ext[1])
+		ctx.show_text(text)
+
+def depiction_to_png(depiction, path, scale=1.0, margin=MARGIN):
+	"""Render a depiction to a PNG file with an offscreen surface."""
+	cairo = _cairo()
+	layout = _layout(depiction, scale, margin)
+
+	surface = cairo.ImageSurface(cairo.FORMAT_RGB24,
+			int(layout[0] + 0.5), int(layout[1] + 0.5))
+	_draw_cairo(cairo.Context(surface), layout)
+	surface.write_to_png(path)
+
+def render_many(depictions, directory, format='svg', scale=1.0,
+		margin=MARGIN):
+	"""
+	Render depictions into a directory, one file per depiction, named
+	by its position in the input (eg. '000042.svg'). Failed entries
+	(DepictionError objects) are skipped.
+	Returns the number of files written.
+	"""
+	if format not in RENDER_FORMATS:
+		raise Exception, "Invalid render format, `%s`." % format
+
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	count = 0
+	for i, depiction in enumerate(depictions):
+		if not isinstance(depiction, Depiction):
+			continue
+
+		path = os.path.join(directory, '%06d.%s' % (i, format))
+		if format == 'svg':
+			with open(path, 'w') as f:
+				f.write(depiction_to_svg(depiction, scale, margin))
+		else:
+			depiction_to_png(depiction, path, scale, margin)
+		count += 1
+
+	return count
+
+def render_pdf(depictions, path, scale=1.0, margin=MARGIN):
+	"""
+	Render depictions into a single PDF file, one page per depiction,
+	each page sized to its depiction. Failed entries are skipped.
+	Returns the number of pages written.
+	"""
+	cairo = _cairo()
+
+	surface = None
+	count = 0
+	for depiction in depictions:
+		if not isinstance(depiction, Depiction):
+			continue
+
+		layout = _layout(depiction, scale, margin)
+		if surface is None:
+			surface = cairo.PDFSurface(path, layout[0], layout[1])
+		else:
+			surface.set_size(layout[0], layout[1])
+
+		_draw_cairo(cairo.Context(surface), layout)
+		surface.show_page()
+		count += 1
+
+	if surface is not None:
+		surface.finish()
+
+	return count
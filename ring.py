@@ -10,6 +10,8 @@ Ring-related data structures and essential functions.
 	partition_rings()
 """
 
+from array import array
+
 from util.enum import enum
 
 """
@@ -26,13 +28,24 @@ RING_TYPES = enum(
 	'NONE'			# No type assigned
 )
 
+def popcount(mask):
+	"""Number of set bits in an integer bitmask."""
+	return bin(mask).count('1')
+
 class Point(object):
 	"""Represents a 2D position."""
 
+	__slots__ = ('x', 'y')
+
 	def __init__(self, x=None, y=None):
 		self.x = x
 		self.y = y
 
+	def __iter__(self):
+		"""Unpack as an (x, y) pair."""
+		yield self.x
+		yield self.y
+
 	def __eq__(self, o):
 		"""Equal if within a certain delta."""
 		DELTA = 0.00005
@@ -50,6 +63,49 @@ class Point(object):
 	def __repr__(self):
 		return str(self)
 
+class PointArray(object):
+	"""
+	Sequence of Points backed by a flat array('d') of (x, y) pairs.
+	Unset coordinates are stored as NaN, and read back as None. Points
+	are created on access; assigning to a Point read from the sequence
+	does not change the sequence.
+	"""
+
+	__slots__ = ('xy',)
+
+	def __init__(self, size, points=None):
+		self.xy = array('d', [float('nan')]) * (2*size)
+		if points:
+			for i in range(size):
+				self[i] = points[i]
+
+	def __len__(self):
+		return len(self.xy) // 2
+
+	def __getitem__(self, i):
+		if i < 0:
+			i += len(self)
+		x = self.xy[2*i]
+		y = self.xy[2*i+1]
+		return Point(None if x != x else x, None if y != y else y)
+
+	def __setitem__(self, i, pt):
+		if i < 0:
+			i += len(self)
+		x, y = pt
+		self.xy[2*i] = float('nan') if x is None else x
+		self.xy[2*i+1] = float('nan') if y is None else y
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def __str__(self):
+		return str(list(self))
+
+	def __repr__(self):
+		return str(self)
+
 # FIXME: Remove most of Ring's methods. They belong in analysis only!
 class Ring(tuple):
 	"""
@@ -58,7 +114,7 @@ class Ring(tuple):
 	Also assists in processing tasks.
 	"""
 
-	def __new__(cls, path, positions=None):
+	def __new__(cls, path, positions=None, mol=None):
 		"""
 		Build tuple subclass instance. The underlying tuple holds the
 		ring path itself, so we do some cleanup to ensure each atom
@@ -78,29 +134,26 @@ class Ring(tuple):
 		# TODO: Throw exception on twice-included atoms?
 		return tuple.__new__(cls, build_path(path))
 
-	def __init__(self, path, positions=None):
+	def __init__(self, path, positions=None, mol=None):
 		"""
 		Ring Constructor
-		Must specify the atom cycle that constitutes the ring.
+		Must specify the atom cycle that constitutes the ring. If the
+		molecule is supplied, the bonds are also encoded as a bitmask.
 		"""
-		def build_bonds(path):
-			"""Build a tuple of sets that represent the bonds."""
-			l = len(path)
-			bonds = []
-			for i in range(l):
-				a = path[i]
-				a2 = path[(i+1)%l]
-				bonds.append(frozenset([a, a2]))
-			return frozenset(bonds)
-
-		# XXX/FIXME/TODO: DEPRECATED! This is handled by the tuple 
-		# superclass.
-		self.ringPath = self[:]
-
-		# Bonds in the ring. 
-		# A set of sets (each inner set is an edge), which makes testing
-		# for bridged rings easy. 
-		self.bonds = build_bonds(self.ringPath)
+		# Bitmasks of the atoms (bit per atom label) and bonds (bit per
+		# Molecule.getBondIndex()) in the ring. Shared atoms and bonds
+		# between two rings are just the AND of their masks. The bond
+		# mask is None if the molecule wasn't supplied.
+		self.atomMask = 0
+		for a in self:
+			self.atomMask |= 1 << a
+
+		self.bondMask = None
+		if mol is not None:
+			self.bondMask = 0
+			for i in range(len(self)):
+				self.bondMask |= 1 << mol.getBondIndex(self[i],
+						self[(i+1)%len(self)])
 
 		# Assigned ring group and in-group ID/offset assigned by
 		# RingGroup.
@@ -111,25 +164,51 @@ class Ring(tuple):
 		# TODO: rename peelStrategy.
 		self.type = RING_TYPES.NONE
 
-		# Ring-Local coordinate position of every atom in the ring.
-		self.pos = None
+		# Per-atom data is kept in parallel arrays, indexed by the
+		# atom's position in the ring.
 
+		# Ring-Local coordinate position of every atom in the ring.
 		if positions and len(self) == len(positions):
-			self.pos = positions
+			self.pos = PointArray(len(self), positions)
 		else:
-			self.pos = [Point() for x in range(len(self[:]))]
+			self.pos = PointArray(len(self))
 
 		# Center position (for debug)
 		self.centerPos = Point()
 
 		# Ring-Local CFS (in radians) for every atom in the ring.
-		self.cfs = [{'hi':0, 'lo':0} for x in range(len(self[:]))]
+		self.cfsHi = array('d', [0.0]) * len(self)
+		self.cfsLo = array('d', [0.0]) * len(self)
 
 		# XXX/TEMPORARY DEBUG
-		self.fusionAtom = [False for x in range(len(self))]
+		self.fusionAtom = array('b', [0]) * len(self)
 		self.swapped = False
 		# END XXX/TEMPORARY DEBUG
 
+	@property
+	def bonds(self):
+		"""
+		Bonds in the ring. 
+		A set of sets (each inner set is an edge), which makes testing
+		for bridged rings easy. Built on each access rather than kept,
+		as the bond mask covers most uses.
+		"""
+		l = len(self)
+		bonds = []
+		for i in range(l):
+			a = self[i]
+			a2 = self[(i+1)%l]
+			bonds.append(frozenset([a, a2]))
+		return frozenset(bonds)
+
+	@property
+	def ringPath(self):
+		"""
+		XXX/FIXME/TODO: DEPRECATED! This is handled by the tuple
+		superclass.
+		"""
+		return self[:]
+
 	def getDirection(self):
 		"""Determine which direction the ring is directed."""
 		# Based on the Convex Hull problem:
@@ -191,9 +270,11 @@ class Ring(tuple):
 				positions.append(self.pos[i])
 				i = (i - 1) % sz # Next: Right atom
 
-		return Ring(path, positions)
+		ring = Ring(path, positions)
+		ring.bondMask = self.bondMask # Same bonds, reordered
+		return ring
 
-	# TODO: Deprecated. Move into relevant module.
+	# TODO: Deprecated. Use RingGroup.isCentralRing() instead.
 	def isCentralRing(self, ringList):
 		"""
 		Determine ring centrality.
@@ -274,17 +355,23 @@ class Ring(tuple):
 
 		return True
 
+	def sharedAtomCount(self, otherRing):
+		"""Number of atoms shared with the other ring."""
+		return popcount(self.atomMask & otherRing.atomMask)
+
+	def sharedBondCount(self, otherRing):
+		"""Number of bonds (edges) shared with the other ring."""
+		if self.bondMask is None or otherRing.bondMask is None:
+			return len(self.bonds & otherRing.bonds)
+		return popcount(self.bondMask & otherRing.bondMask)
+
 	# TODO: Deprecated. Move into relevant module.
 	def isSpiroTo(self, otherRing):
 		"""
 		Returns True if the ring shares only one atom with the other
 		ring.
 		"""
-		count = 0
-		for a in self.ringPath:
-			if a in otherRing.ringPath:
-				count += 1
-		return count == 1
+		return self.sharedAtomCount(otherRing) == 1
 
 	# TODO: Deprecated. Move into relevant module.
 	def isFusedTo(self, otherRing):
@@ -292,12 +379,8 @@ class Ring(tuple):
 		Returns True if the ring shares one bond (edge) with the other
 		ring.
 		"""
-		count = 0
-		for b in self.bonds:
-			if b in otherRing.bonds:
-				count += 1
 		# TODO: Can they share more than one and be considered fused?
-		return count == 1
+		return self.sharedBondCount(otherRing) == 1
 
 	# TODO: Deprecated. Move into relevant module.
 	def isBridgedTo(self, otherRing):
@@ -389,6 +472,12 @@ class RingGroup(tuple):
 		# Peel order established in ring analysis.
 		self.peelOrder = []
 
+		# Set once ring construction has finished the group.
+		self.constructed = False
+
+		# Array-backed ring coordinates from ring construction.
+		self.coords = None
+
 		# Connection tables. The subscripts and values used are NOT the
 		# atom labels, rather they are the subscripts internal to the
 		# ring.
@@ -396,18 +485,165 @@ class RingGroup(tuple):
 		self.fusedTo = [[] for x in range(len(self))]
 		self.bridgedTo = [[] for x in range(len(self))]
 
+		# Ring adjacency graph: rings that are spiro or fused to each
+		# other. Used for the ring centrality test during peeling.
+		self.adjacent = [[] for x in range(len(self))]
+
+		# Rings not yet peeled, and the cached set of offsets of the
+		# central rings among them (None when it must be recomputed).
+		self.remaining = [True for x in range(len(self))]
+		self._central = None
+
 		# Assign in-group offsets to each ring.
 		for i in range(len(self)):
 			rings[i].group = self
 			rings[i].groupOffset = i
 
-		# Build fused table.
+		# Build the connection tables. Only rings that share an atom
+		# can be related, so candidate pairs come from each atom's
+		# rings.
+		atomRings = {}
 		for i in range(len(self)):
-			for j in range(len(self)):
-				if i == j:
+			for atom in self[i]:
+				atomRings.setdefault(atom, []).append(i)
+
+		pairs = {}
+		for group in atomRings.values():
+			for x in range(len(group)):
+				for y in range(x+1, len(group)):
+					pairs[(group[x], group[y])] = True
+
+		for i, j in sorted(pairs):
+			ri = self[i]
+			rj = self[j]
+			if ri.sharedBondCount(rj):
+				self.fusedTo[i].append(j)
+				self.fusedTo[j].append(i)
+			if ri.isSpiroTo(rj):
+				self.spiroTo[i].append(j)
+				self.spiroTo[j].append(i)
+			if ri.isSpiroTo(rj) or ri.isFusedTo(rj):
+				self.adjacent[i].append(j)
+				self.adjacent[j].append(i)
+
+		for table in (self.fusedTo, self.spiroTo, self.adjacent):
+			for row in table:
+				row.sort()
+
+	def _offset(self, ring):
+		"""In-group offset of the ring."""
+		if ring.group is self:
+			return ring.groupOffset
+		return self.index(ring)
+
+	def peelRing(self, ring):
+		"""Remove the ring from the adjacency graph of remaining rings."""
+		self.remaining[self._offset(ring)] = False
+		self._central = None
+
+	def resetPeel(self):
+		"""Restore all rings to the adjacency graph."""
+		self.remaining = [True for x in range(len(self))]
+		self._central = None
+
+	def isCentralRing(self, ring):
+		"""
+		Determine ring centrality among the remaining (unpeeled) rings.
+		If a ring is central, its removal will partition the remaining
+		rings, or it is the last ring. We want to peel the rings on the
+		molecule extremity first.
+
+		Central rings are the articulation points of the ring
+		adjacency graph. They are found for all rings at once (Tarjan)
+		and cached until the next ring is peeled.
+
+		A peel recomputes the whole group rather than only the block
+		that held the peeled ring. The search is linear in the rings
+		and their adjacencies, so peeling a group costs O(R*(R+E)),
+		well below the ring perception that precedes it; tracking the
+		blocks across peels is not worth the bookkeeping.
+		"""
+		if self._central is None:
+			self._central = self._find_central_rings()
+		return self._offset(ring) in self._central
+
+	def _find_central_rings(self):
+		"""
+		Find the offsets of all central rings among the remaining
+		rings, with Tarjan's articulation point algorithm. This is an
+		iterative DFS tracking discovery times and low links.
+		"""
+		rem = [i for i in range(len(self)) if self.remaining[i]]
+		if len(rem) <= 1:
+			return frozenset(rem)
+
+		disc = {}
+		low = {}
+		central = set()
+		numComponents = 0
+		for root in rem:
+			if root in disc:
+				continue
+			numComponents += 1
+			disc[root] = low[root] = len(disc)
+			rootChildren = 0
+			stack = [(root, None, iter(self.adjacent[root]))]
+			while stack:
+				v, parent, neighbors = stack[-1]
+				advanced = False
+				for w in neighbors:
+					if not self.remaining[w]:
+						continue
+					if w not in disc:
+						disc[w] = low[w] = len(disc)
+						stack.append((w, v, iter(self.adjacent[w])))
+						advanced = True
+						break
+					if w != parent:
+						low[v] = min(low[v], disc[w])
+				if advanced:
 					continue
-				if self[i].bonds & self[j].bonds:
-					self.fusedTo[i].append(j)
+
+				stack.pop()
+				if not stack:
+					break
+				u = stack[-1][0]
+				low[u] = min(low[u], low[v])
+				if u == root:
+					rootChildren += 1
+				elif low[v] >= disc[u]:
+					central.add(u)
+
+			if rootChildren > 1:
+				central.add(root)
+
+		if numComponents == 1:
+			return frozenset(central)
+
+		# The remaining rings are not connected (not expected after
+		# peeling non-central rings). A ring is then central unless
+		# the others are connected without it.
+		central = set()
+		for i in rem:
+			others = [x for x in rem if x != i]
+			if not self._is_connected(others):
+				central.add(i)
+		return frozenset(central)
+
+	def _is_connected(self, offsets):
+		"""Whether the given rings are connected in the adjacency graph."""
+		if not offsets:
+			return False
+		allowed = frozenset(offsets)
+		seen = set([offsets[0]])
+		stack = [offsets[0]]
+		while stack:
+			v = stack.pop()
+			for w in self.adjacent[v]:
+				if w in allowed and w not in seen:
+					seen.add(w)
+					stack.append(w)
+		return len(seen) == len(allowed)
 
 	def __repr__(self):
 		"""Debug representation."""
@@ -449,68 +685,74 @@ def partition_rings(ringList):
 	Input: A list of Ring objects.
 	Output: A list of RingGroup objects.
 
+	Rings are merged with a disjoint-set (union-find) structure. Only
+	rings that share an atom can be spiro, fused or bridged, so the
+	candidate pairs are found in one pass over each atom's rings.
+	Groups are ordered by their first ring in the input, and rings
+	keep their input order within a group.
+
 	This is not based on literature, but aids in analysis and
 	construction.
 	"""
 
-	def in_same_group(ring1, ring2, ringList):
-		"""
-		Determine if ring1 and ring2 are in the same group by
-		attempting to traverse from one to the other. This is
-		just BFS without the queue.
-		"""
-		# Easy case -- see if the rings are directly connected.
-		if ring1.isSpiroTo(ring2) or ring1.isFusedTo(ring2) or \
-				ring1.isBridgedTo(ring2):
-					return True
-
-		# Iteratively collect rings that are fused/spiro/bridged from
-		# ring1. If we manage to collect ring2, then the two are in the
-		# same connectivity group. This is similar to [Helson]'s 
-		# "central" test algorithm (Procedure D of Ring Analysis, 
-		# p. 334)
-		rings = list(ringList[:])
-		rings.pop(rings.index(ring1))
-
-		collected = [ring1]
-		justAdded = [ring1]
-		while len(justAdded) != 0:
-			remRings = [x for x in rings if x not in collected]
-			added = []
-			for r in justAdded:
-				for s in remRings:
-					if r.isSpiroTo(s) or r.isFusedTo(s) or r.isBridgedTo(s):
-						collected.append(s)
-						added.append(s)
-			justAdded = added
-
-		# Result.
-		return ring2 in collected
+	def find(i):
+		"""Find the set representative, halving the path."""
+		while parent[i] != i:
+			parent[i] = parent[parent[i]]
+			i = parent[i]
+		return i
+
+	def union(i, j):
+		"""Merge sets; the lower ring index represents the set."""
+		i = find(i)
+		j = find(j)
+		if i < j:
+			parent[j] = i
+		elif j < i:
+			parent[i] = j
 
 	# Simple case -- only one ring in the entire molecule.
 	if len(ringList) == 1:
 		return [RingGroup(ringList)]
 
-	# More than one ring in molecule -- must group memberships.
-	groups = []
-	ungrouped = list(ringList[:])
-	justGrouped = []
-	rId = 0
-
-	while len(ungrouped) > 0:
-		groupRoot = ungrouped.pop(0)
-		justGrouped = []
-		for ring in ungrouped:
-			if in_same_group(groupRoot, ring, ringList):
-				justGrouped.append(ring)
-
-		# This is the next ring group.
-		group = [groupRoot]
-		group.extend(justGrouped)
-		groups.append(RingGroup(group, rId))
-		rId += 1
+	# Rings containing each atom.
+	atomRings = {}
+	for i in range(len(ringList)):
+		for atom in ringList[i]:
+			atomRings.setdefault(atom, []).append(i)
+
+	# Merge rings that are directly connected.
+	parent = range(len(ringList))
+	tested = {}
+	for rings in atomRings.values():
+		for x in range(len(rings)):
+			for y in range(x+1, len(rings)):
+				i = rings[x]
+				j = rings[y]
+				if (i, j) in tested:
+					continue
+				tested[(i, j)] = True
+				if find(i) == find(j):
+					continue
+				r1 = ringList[i]
+				r2 = ringList[j]
+				if r1.isSpiroTo(r2) or r1.isFusedTo(r2) or \
+						r1.isBridgedTo(r2):
+					union(i, j)
+
+	# Collect the groups. The representative is the lowest index, so
+	# groups come out in order of their first ring.
+	members = {}
+	roots = []
+	for i in range(len(ringList)):
+		root = find(i)
+		if root not in members:
+			members[root] = []
+			roots.append(root)
+		members[root].append(ringList[i])
 
-		ungrouped = [x for x in ungrouped if x not in justGrouped]
+	groups = []
+	for rId in range(len(roots)):
+		groups.append(RingGroup(members[roots[rId]], rId))
 
 	return groups
-
@@ -0,0 +1,196 @@
+"""
+Headless structure diagram generation.
+
+Runs the SDG pipeline (SMILES parsing, ring and chain perception, ring
+analysis and ring construction) without the GTK interface, for batch
+layout generation:
+
+	>>> depiction = depict('c1ccc2ccccc2c1')
+	>>> sorted(depiction.coords) == range(10)
+	True
+
+	>>> for depiction in depict_many(smilesList, workers=4):
+	...     store(depiction.smiles, depiction.coords)
+
+This module is also the lightweight import surface for the parser,
+Molecule and perception: none of it touches a GUI toolkit.
+
+Only ring atoms are positioned so far; chain construction is not
+implemented. Every ring group is constructed about the origin.
+"""
+
+from smiles import Smiles, smiles_to_molecule, parse_file, iter_parse_file
+from molecule import Molecule
+from analysis.rings import ring_analysis, ring_construction
+from util.pool import imap_chunks
+
+class DepictionError(Exception):
+	"""
+	A SMILES entry that could not be depicted. Batch depiction yields
+	these in place of Depiction objects rather than raising them.
+	"""
+
+	def __init__(self, message, smiles=None):
+		Exception.__init__(self, message, smiles)
+		self.message = message
+		self.smiles = smiles # Offending SMILES text
+
+	def __str__(self):
+		return "`%s`: %s" % (self.smiles, self.message)
+
+class Depiction(object):
+	"""
+	2D layout of a molecule. Holds only plain data, so it is cheap to
+	send between processes:
+
+		* smiles -- the input SMILES text
+		* size -- number of atoms
+		* coords -- {atom label: (x, y)} for every positioned atom
+		* types -- atom type labels, eg. 'C', 'n'
+		* bonds -- (atomA, atomB, bondOrder) edges, with atomA < atomB
+		* numRings, numChains, numRingGroups -- perception counts
+	"""
+
+	def __init__(self, smiles, size, coords, types=None, bonds=None,
+			numRings=0, numChains=0, numRingGroups=0):
+		self.smiles = smiles
+		self.size = size
+		self.coords = coords
+		self.types = types or []
+		self.bonds = bonds or []
+		self.numRings = numRings
+		self.numChains = numChains
+		self.numRingGroups = numRingGroups
+
+	def __repr__(self):
+		return "Depiction(%r, %d/%d atoms positioned)" % (self.smiles,
+				len(self.coords), self.size)
+
+def analyze_molecule(mol):
+	"""
+	Run perception and ring analysis/construction on a molecule.
+	Returns (rings, chains, ringGroups); the rings of each group have
+	their positions set. Perception results are the molecule's own
+	(see Molecule.rings, etc.), so they are only computed once; a group
+	whose construction did not finish is analyzed and built again.
+	"""
+	ringGroups = mol.ringGroups
+	unbuilt = [group for group in ringGroups if not group.constructed]
+	if unbuilt:
+		ring_analysis(unbuilt)
+		ring_construction(unbuilt)
+
+	return (mol.rings, mol.chains, ringGroups)
+
+def group_coordinates(ringGroups):
+	"""
+	Collect atom positions from constructed ring groups, as a dict of
+	{atom label: (x, y)}. Rings are visited in construction order (the
+	core ring first), and an atom keeps its first position.
+	"""
+	coords = {}
+	for group in ringGroups:
+		order = group.peelOrder[:]
+		order.reverse()
+		for ring in order:
+			xy = ring.pos.xy
+			for i in range(len(ring)):
+				x = xy[2*i]
+				if x != x or ring[i] in coords:
+					continue # Unplaced (NaN), or already positioned
+				coords[ring[i]] = (x, xy[2*i+1])
+	return coords
+
+def molecule_bonds(mol):
+	"""The molecule's bonds, as (atomA, atomB, bondOrder) with A < B."""
+	bonds = []
+	for i in range(mol.size):
+		for k in range(mol.adjOffsets[i], mol.adjOffsets[i+1]):
+			j = mol.adjAtoms[k]
+			if i < j:
+				bonds.append((i, j, mol.adjOrders[k]))
+	return bonds
+
+def depict(smiles, cache=None):
+	"""
+	Generate the 2D layout for a SMILES string. Returns a Depiction;
+	raises DepictionError if any stage of the pipeline fails.
+
+	With a LayoutCache (see cache.py), a structure seen before skips
+	everything after parsing, and a new one is stored.
+	"""
+	try:
+		mol = smiles_to_molecule(str(smiles))
+
+		layout = None
+		if cache is not None:
+			layout = cache.get(mol)
+		if layout is not None:
+			return Depiction(smiles, mol.size, layout.coords,
+					list(mol.types), molecule_bonds(mol), len(layout.rings),
+					layout.numChains, layout.numRingGroups)
+
+		rings, chains, ringGroups = analyze_molecule(mol)
+		coords = group_coordinates(ringGroups)
+		if cache is not None:
+			cache.put(mol, coords, len(chains), len(ringGroups))
+	except Exception, e:
+		raise DepictionError(str(e) or type(e).__name__, smiles)
+
+	return Depiction(smiles, mol.size, coords, list(mol.types),
+			molecule_bonds(mol), len(rings), len(chains), len(ringGroups))
+
+def _depict_or_error(smiles, cache=None):
+	"""Depict, returning the DepictionError on failure."""
+	try:
+		return depict(smiles, cache)
+	except DepictionError, e:
+		return e
+
+# Layout caches opened by worker processes, by (path, maxBytes).
+_workerCaches = {}
+
+def _depict_chunk(chunk):
+	"""
+	Worker process entry point: depict a list of SMILES, or of
+	(SMILES, cache path, cache maxBytes) when a cache is in use.
+	"""
+	results = []
+	for item in chunk:
+		if isinstance(item, tuple):
+			smiles, path, maxBytes = item
+			if (path, maxBytes) not in _workerCaches:
+				from cache import LayoutCache
+				_workerCaches[(path, maxBytes)] = LayoutCache(path, maxBytes)
+			results.append(_depict_or_error(smiles,
+					_workerCaches[(path, maxBytes)]))
+		else:
+			results.append(_depict_or_error(item))
+	return results
+
+def depict_many(smilesIter, workers=1, chunkSize=100, cache=None):
+	"""
+	Depict SMILES strings in bulk, yielding Depiction objects (or
+	DepictionError objects for failed entries) in input order.
+
+	Inputs:
+		smilesIter - iterable of SMILES strings; consumed lazily.
+		workers - number of worker processes. With one worker,
+				  depiction happens in this process.
+		chunkSize - number of SMILES sent to a worker at a time.
+		cache - optional LayoutCache. Worker processes open their own
+				connection to its database, so only its persisted
+				stats() include their hits and misses.
+	"""
+	if workers <= 1:
+		for smiles in smilesIter:
+			yield _depict_or_error(smiles, cache)
+		return
+
+	if cache is not None:
+		smilesIter = ((smiles, cache.path, cache.maxBytes)
+				for smiles in smilesIter)
+
+	for result in imap_chunks(_depict_chunk, smilesIter, workers,
+			chunkSize):
+		yield result
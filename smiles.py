@@ -1,5 +1,15 @@
 import string
 from molecule import Molecule
+from canonical.morgan import canonical_ranks
+from util.pool import imap_chunks
+from util.lru import LRUCache
+
+# Number of parsed SMILES smiles_to_molecule() keeps, by SMILES text.
+MOLECULE_CACHE_SIZE = 1024
+
+# Parsed molecular graphs (see Smiles.toGraph()). Graphs are immutable,
+# so every call can build its own Molecule from one.
+_moleculeCache = LRUCache(MOLECULE_CACHE_SIZE)
 
 # TODO: Reorganize class
 # TODO: Fix documentation 
@@ -15,12 +25,22 @@ class Smiles(object):
 		"""CTOR."""
 
 		self.string = smilesStr
-		self.tokens = self.tokenizeString(smilesStr)
+		self._tokens = None # Tokenized lazily; see tokens property.
 
 		# TODO: Canonoicalization
 		# XXX: Perhaps this isn't something I should even manage here...
 		self._cachedCanonical = None # Should be 'Smiles' instance
 
+	@property
+	def tokens(self):
+		"""
+		The list of tokens in the SMILES string. Only built when
+		requested; toGraph() streams tokens instead.
+		"""
+		if self._tokens is None:
+			self._tokens = self.tokenizeString(self.string)
+		return self._tokens
+
 	def numAtoms(self):
 		"""Calculates the number of non-H atoms"""
 		# XXX: This hydrogen-excluded policy WILL cause problems in the 
@@ -40,9 +60,17 @@ class Smiles(object):
 	@staticmethod
 	def tokenizeString(smileStr):
 		"""
-		Convert SMILES string into a list of tokens. Working with
-		tokens is much more convenient than dealing with a character
-		array. Nothing is removed from the string, simply grouped.
+		Convert SMILES string into a list of tokens. See iterTokens().
+		"""
+		return list(Smiles.iterTokens(smileStr))
+
+	@staticmethod
+	def iterTokens(smileStr):
+		"""
+		Generate the tokens of a SMILES string in a single pass over
+		its characters. Working with tokens is much more convenient
+		than dealing with a character array. Nothing is removed from
+		the string, simply grouped.
 
 		The following items are multiple characters wide, but constitute
 		'one token' each:
@@ -60,8 +88,9 @@ class Smiles(object):
 		CHARGE = '+-' + string.digits
 		CHARGE_SIGN = '+-'
 
+		BAD_PERCENT = "Ring closure label after '%' must have two digits."
+
 		# Process string. 
-		tokens = []
 		pos = 0
 		inBracket = False
 		inPercent = False
@@ -71,25 +100,25 @@ class Smiles(object):
 			# Current bracket state
 			if char == '[':
 				inBracket = True
-				tokens.append(char)
+				yield char
 				pos += 1
 				continue
 
 			if char == ']':
 				inBracket = False
-				tokens.append(char)
+				yield char
 				pos += 1
 				continue
 
 			# Current percent label state (for digits > 9)
 			if char == '%':
 				inPercent = True
-				tokens.append(char)
+				yield char
 				pos += 1
 				continue
 
 			if inPercent and not char.isdigit():
-				inPercent = False
+				raise Exception, BAD_PERCENT
 
 			# Group atom charges.
 			# Charges only occur in brackets. (TODO: Confirm via spec.)
@@ -110,7 +139,7 @@ class Smiles(object):
 					chargeStr += rd
 
 				if isCharge:
-					tokens.append(chargeStr)
+					yield chargeStr
 					pos += len(chargeStr)
 					continue
 
@@ -136,7 +165,7 @@ class Smiles(object):
 							isInorganic = False
 
 					if isInorganic:
-						tokens.append(atomStr)
+						yield atomStr
 						pos += len(atomStr)
 						continue
 
@@ -145,7 +174,7 @@ class Smiles(object):
 			if char is '@' and inBracket and pos < len(smileStr)-1:
 				rd = char + smileStr[pos+1]
 				if rd == '@@':
-					tokens.append(rd)
+					yield rd
 					pos += 2
 					continue
 
@@ -153,22 +182,22 @@ class Smiles(object):
 			if char in READ_AHEAD and pos < len(smileStr)-1:
 				rd = char + smileStr[pos+1]
 				if rd == READ_AHEAD[char]:
-					tokens.append(rd)
+					yield rd
 					pos += 2
 					continue
 
 			# Group connectivity labels greater than nine.
 			# ie, connectivity as in 'c%12cccccc%12'
+			# The label is exactly two digits; a digit after them is
+			# a label of its own, as in 'C%101'.
 			if char in string.digits and inPercent:
-				digitStr = ''
-				for i in range(pos, len(smileStr)):
-					rd = smileStr[i]
-					if rd not in string.digits:
-						break
-					digitStr += rd
+				inPercent = False
+				digitStr = smileStr[pos:pos+2]
+				if len(digitStr) < 2 or not digitStr.isdigit():
+					raise Exception, BAD_PERCENT
 
-				tokens.append(digitStr)
-				pos += len(digitStr)
+				yield digitStr
+				pos += 2
 				continue
 
 			# Group isotope digits. Must be handled separately from
@@ -183,18 +212,38 @@ class Smiles(object):
 						break
 					digitStr += rd
 
-				tokens.append(digitStr)
+				yield digitStr
 				pos += len(digitStr)
 				continue
 
 			# Catch other cases
-			tokens.append(char)
+			yield char
 			pos += 1
 
-		return tokens 
+		if inPercent:
+			raise Exception, BAD_PERCENT
 
 	def toMolecule(self):
-		"""Convert a SMILES string into a adjacency matrix representation."""
+		"""
+		Convert a SMILES string into a Molecule. See toGraph().
+		"""
+		types, bonds, charges, isotopes = self.toGraph()
+		return Molecule(types, bonds=bonds, charges=charges,
+					isotopes=isotopes, smiles=self)
+
+	def toGraph(self):
+		"""
+		Parse the SMILES string into its molecular graph, as tuples:
+		(types, bonds, charges, isotopes); bonds are (atomA, atomB,
+		bondOrder) edges. Tokens are consumed as they are scanned, and
+		atoms and bonds are appended to growable lists, so no N x N
+		matrix is ever allocated.
+
+		Ring closure labels are freed when closed, and may be reused.
+		'.' separates disconnected components, eg. 'CC(=O)O.O'.
+		Raises SmilesParseError for ring closures or branches left
+		open, eg. 'C1CC' or 'C(C'.
+		"""
 
 		# First, we must convert the input string into a proper queue
 		# Organic subset: B, C, N, O, P, S, F, Cl, Br, I 
@@ -205,19 +254,21 @@ class Smiles(object):
 		# Additional Symbols
 		BRANCHING = '()' # Branch Start & End
 		BONDS = '=#'	 # Double and Triple Bonds
+		DISCONNECTED = '.' # No bond between the atoms either side
 		CONNECTIVE = '%' # Connectivity beyond '9' -- TODO NOT YET HANDLED.
 		CHARGE = '+-'    # Cation/anion charge. Only occur in brackets.
 
-		queue = self.tokens
-		sz = self.numAtoms()
+		# Reuse tokens if they already exist, otherwise stream them.
+		queue = self._tokens
+		if queue is None:
+			queue = self.iterTokens(self.string)
 
-		# Output data	
+		# Output data. Bonds are (atomA, atomB, bondOrder) edges.
 		data = {
-			'connectMat': [[False for x in range(sz)] for y in range(sz)],
-			'bondOrderMat': [[False for x in range(sz)] for y in range(sz)],
-			'types': [None for x in range(sz)],
-			'charges': [0 for x in range(sz)],
-			'isotopes': [0 for x in range(sz)],
+			'bonds': [],
+			'types': [],
+			'charges': [],
+			'isotopes': [],
 		}
 
 		# Symbol type tests
@@ -230,15 +281,13 @@ class Smiles(object):
 
 		# Make note of the connection beween two atoms. 
 		def connect(a1, a2, bondOrder=1):
-			data['connectMat'][a1][a2] = True
-			data['connectMat'][a2][a1] = True
-			data['bondOrderMat'][a1][a2] = bondOrder
-			data['bondOrderMat'][a2][a1] = bondOrder
+			data['bonds'].append((a1, a2, bondOrder))
 
-		# Label the atom type
-		def label(a, name, isotope = 0):
-			data['types'][a] = name
-			data['isotopes'][a] = isotope
+		# Add the next atom with its type label
+		def label(name, isotope = 0):
+			data['types'].append(name)
+			data['charges'].append(0)
+			data['isotopes'].append(isotope)
 
 		# Parse the charge. Examples: +, --, 2+, -3
 		# TODO: Make more compact, and more valid to spec.
@@ -271,7 +320,8 @@ class Smiles(object):
 		bondOrder = 1 # Bond order: 1, 2, 3
 		isotope = 0 # Atom isotope
 		branchStack = [] # Branching, eg. C(C)(C)C
-		ringClosures = {} # Keep track of cycles, eg. c1ccccc1
+		ringClosures = {} # Open cycles, eg. c1ccccc1; freed when closed
+		disconnected = False # Next atom starts a new component
 
 		# Bracket state. Brackets denote isotope, charge, inorganics...
 		inBrackets = False # Currently in brackets
@@ -283,17 +333,18 @@ class Smiles(object):
 				atomId = atomCnt
 				atomCnt += 1
 
-				label(atomId, sym, isotope)
+				label(sym, isotope)
 				isotope = 0
 
 				if inBrackets:
 					# Once atom found, isotope can't be set.
 					inBracketsAtomFound = True
 
-				if atomId != 0:
+				if atomId != 0 and not disconnected:
 					# TODO: Conjugated systems bond order = 1.5
 					connect(atomPrev, atomId, bondOrder)
-					bondOrder = 1
+				bondOrder = 1
+				disconnected = False
 
 				atomPrev = atomId
 
@@ -312,17 +363,24 @@ class Smiles(object):
 				branchStack.append(atomPrev)
 				continue
 			if sym == ')':
+				if not branchStack:
+					raise SmilesParseError("Unmatched ')'.",
+							smiles=self.string)
 				atomPrev = branchStack.pop()
 				continue
 
-			if is_closure(sym):
-				# TODO: Won't handle > 9
+			if sym == DISCONNECTED:
+				disconnected = True
+				continue
+
+			# Digits in brackets are isotopes, not ring closures.
+			if is_closure(sym) and not inBrackets:
 				num = int(sym)
 				if num not in ringClosures:
 					ringClosures[num] = atomPrev
 				else:
 					# TODO: Conjugated systems bond order = 1.5
-					connect(atomPrev, ringClosures[num], bondOrder)
+					connect(atomPrev, ringClosures.pop(num), bondOrder)
 					bondOrder = 1
 
 			if is_bond_order(sym):
@@ -342,22 +400,299 @@ class Smiles(object):
 			if sym.isdigit() and inBrackets and not inBracketsAtomFound:
 				isotope = sym
 
-		# End queue processing, build and return Molecule object.
-		return Molecule(data['types'], data['bondOrderMat'],
-					connectMat=data['connectMat'], charges=data['charges'],
-					isotopes=data['isotopes'], smiles=self)
+		if ringClosures:
+			raise SmilesParseError("Unclosed ring closure label(s) %s." %
+					', '.join(map(str, sorted(ringClosures))),
+					smiles=self.string)
+		if branchStack:
+			raise SmilesParseError("Unclosed branch.", smiles=self.string)
 
-def smiles_to_molecule(smiles):
-	"""Function to return a MolMatrix from a smiles string without an
-	intermediate."""
-	# XXX: Do I really need to keep this?
+		# End queue processing, return the graph.
+		return (tuple(data['types']), tuple(data['bonds']),
+				tuple(data['charges']), tuple(data['isotopes']))
 
+def smiles_to_molecule(smiles, cached=True):
+	"""Function to return a MolMatrix from a smiles string without an
+	intermediate.
+
+	Parsed graphs are kept in an LRU cache by SMILES text, so a
+	repeated SMILES is not parsed again. Every call returns a new
+	Molecule, built from the cached graph; perception and analysis
+	results are the molecule's own, and are not shared. Pass
+	cached=False to bypass the cache. See set_molecule_cache_size()
+	and molecule_cache_stats().
+	"""
 	if type(smiles) == str:
 		smiles = Smiles(smiles)
+	if not cached:
+		return smiles.toMolecule()
+
+	graph = _moleculeCache.get(smiles.string)
+	if graph is None:
+		graph = smiles.toGraph()
+		_moleculeCache.put(smiles.string, graph)
+
+	types, bonds, charges, isotopes = graph
+	return Molecule(types, bonds=bonds, charges=charges, isotopes=isotopes,
+			smiles=smiles)
+
+def set_molecule_cache_size(size):
+	"""
+	Set how many parsed SMILES smiles_to_molecule() keeps. 0 disables
+	the cache.
+	"""
+	_moleculeCache.resize(size)
+
+def molecule_cache_stats():
+	"""
+	Counters of the smiles_to_molecule() cache (see util.lru):
+	{'hits', 'misses', 'evictions', 'size', 'maxSize'}.
+	"""
+	return _moleculeCache.stats()
+
+def clear_molecule_cache():
+	"""Empty the smiles_to_molecule() cache and reset its counters."""
+	_moleculeCache.clear()
+
+class SmilesParseError(Exception):
+	"""
+	A SMILES entry that could not be parsed. Bulk parsing yields these
+	in place of Molecule objects rather than raising them.
+	"""
 
-	return smiles.toMolecule()
+	def __init__(self, message, lineNum=None, smiles=None):
+		Exception.__init__(self, message, lineNum, smiles)
+		self.message = message
+		self.lineNum = lineNum # Line number in the input file
+		self.smiles = smiles # Offending SMILES text
 
-def molecule_to_smiles(matrix):
-	# TODO: Need to convert back into a smiles expression.
-	pass
+	def __str__(self):
+		if self.lineNum is None:
+			return "`%s`: %s" % (self.smiles, self.message)
+		return "Line %s, `%s`: %s" % (self.lineNum, self.smiles,
+				self.message)
+
+def _read_smiles_file(path):
+	"""
+	Generate (lineNum, line) pairs from a .smi file, line by line.
+	Blank lines and '#' comment lines are skipped.
+	"""
+	with open(path) as f:
+		lineNum = 0
+		for line in f:
+			lineNum += 1
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			yield (lineNum, line)
+
+def _parse_smiles_line(item):
+	"""
+	Parse a (lineNum, line) pair, where the line is the SMILES text
+	optionally followed by whitespace and a name. Returns a Molecule,
+	or a SmilesParseError on failure.
+	"""
+	lineNum, line = item
+	fields = line.split(None, 1)
+	try:
+		# Not cached: the molecule is given a name, and a bulk parse
+		# would only churn the cache.
+		mol = smiles_to_molecule(fields[0], cached=False)
+		if len(fields) > 1:
+			mol.informalName = fields[1]
+		return mol
+	except SmilesParseError, e:
+		return SmilesParseError(e.message, lineNum, fields[0])
+	except Exception, e:
+		return SmilesParseError(str(e) or type(e).__name__, lineNum,
+				fields[0])
+
+def _parse_smiles_chunk(chunk):
+	"""Worker process entry point: parse a list of lines."""
+	return [_parse_smiles_line(item) for item in chunk]
+
+def iter_parse_file(path, workers=1, chunkSize=1000):
+	"""
+	Parse a .smi file, yielding Molecule objects (or SmilesParseError
+	objects for bad entries) in input order.
+
+	Inputs:
+		path - the file to read. One SMILES per line, optionally
+			   followed by whitespace and a name (informalName).
+		workers - number of worker processes. With one worker,
+				  parsing happens in this process.
+		chunkSize - number of lines sent to a worker at a time.
+
+	The file is read lazily, and at most two chunks per worker are in
+	flight at once, so memory use does not grow with the file size.
+	"""
+	lines = _read_smiles_file(path)
+
+	if workers <= 1:
+		for item in lines:
+			yield _parse_smiles_line(item)
+		return
+
+	for result in imap_chunks(_parse_smiles_chunk, lines, workers,
+			chunkSize):
+		yield result
+
+def parse_file(path, workers=1, chunkSize=1000):
+	"""
+	Parse a .smi file into a list of Molecule (or SmilesParseError)
+	objects in input order. See iter_parse_file().
+	"""
+	return list(iter_parse_file(path, workers, chunkSize))
+
+def ring_label(num):
+	"""SMILES ring closure label, 1 to 99; '%nn' beyond nine."""
+	if not 0 < num < 100:
+		raise Exception, "Invalid ring closure label, %d." % num
+	if num < 10:
+		return str(num)
+	return "%%%d" % num
+
+def molecule_to_smiles(mol):
+	"""
+	Write the canonical SMILES string of a Molecule.
+
+	Atoms are ranked canonically (see canonical.morgan), and each
+	connected component is written by depth first search from its
+	lowest ranked atom, visiting neighbors in rank order. Components
+	are joined with '.', in the order of their first atoms.
+
+	Bond orders of aromatic rings are not perceived, so aromaticity is
+	only kept through lowercase atom types. A ring closure takes the
+	lowest free label ('%nn' beyond nine); labels closed at an atom are
+	only reused after it. More than 99 open ring closures raise an
+	Exception.
+	"""
+	ORGANIC = ['B', 'C', 'N', 'O', 'P', 'S', 'F', 'Cl', 'Br', 'I',
+			'b', 'c', 'n', 'o', 'p', 's']
+	BOND_SYMBOLS = {2: '=', 3: '#'}
+
+	ranks = canonical_ranks(mol)
+
+	def neighbors(v):
+		"""(rank, neighbor, bond order) tuples, in rank order."""
+		nbrs = []
+		for k in range(mol.adjOffsets[v], mol.adjOffsets[v+1]):
+			n = mol.adjAtoms[k]
+			nbrs.append((ranks[n], n, int(mol.adjOrders[k])))
+		nbrs.sort()
+		return nbrs
+
+	def atom_symbol(v):
+		"""Atom symbol, bracketed when needed."""
+		sym = mol.types[v]
+		charge = mol.charges[v]
+		isotope = int(mol.isotopes[v] or 0)
+		if sym in ORGANIC and not charge and not isotope:
+			return sym
+
+		iso = str(isotope) if isotope else ''
+		chg = ''
+		if charge:
+			chg = '+' if charge > 0 else '-'
+			if abs(charge) > 1:
+				chg += str(abs(charge))
+		return "[%s%s%s]" % (iso, sym, chg)
+
+	MAX_RING_LABEL = 99
+
+	def open_label(labels):
+		"""The lowest label not in use."""
+		used = set(labels.values())
+		for num in range(1, MAX_RING_LABEL + 1):
+			if num not in used:
+				return num
+		raise Exception, "More than %d open ring closures." % \
+				MAX_RING_LABEL
+
+	visited = [False for x in range(mol.size)]
+	order = sorted(range(mol.size), key=lambda v: ranks[v])
+	components = []
+
+	for root in order:
+		if visited[root]:
+			continue
+
+		# First pass: depth first search for the spanning tree.
+		# children[v] are (child, bond order); closures[v] are
+		# (rank, partner, bond order) ring closure bonds.
+		children = {}
+		closures = {}
+		seenBonds = set()
+		visited[root] = True
+		stack = [(root, iter(neighbors(root)))]
+		children[root] = []
+		closures[root] = []
+		while stack:
+			v, nbrs = stack[-1]
+			for rank, n, bondOrder in nbrs:
+				bond = (min(v, n), max(v, n))
+				if bond in seenBonds:
+					continue
+				seenBonds.add(bond)
+				if visited[n]:
+					closures[v].append((rank, n, bondOrder))
+					closures[n].append((ranks[v], v, bondOrder))
+					continue
+				visited[n] = True
+				children[v].append((n, bondOrder))
+				children[n] = []
+				closures[n] = []
+				stack.append((n, iter(neighbors(n))))
+				break
+			else:
+				stack.pop()
+
+		# Second pass: write the atoms in depth first order. Ring
+		# closures are opened at the atom written first, and the bond
+		# symbol goes on the closing label.
+		out = []
+		labels = {} # Open ring closure bonds to their labels
+		stack = [(root, 1)]
+		while stack:
+			item = stack.pop()
+			if type(item) is str:
+				out.append(item)
+				continue
+
+			v, bondOrder = item
+			out.append(BOND_SYMBOLS.get(bondOrder, ''))
+			out.append(atom_symbol(v))
+
+			closed = []
+			for rank, n, closureOrder in sorted(closures[v]):
+				bond = (min(v, n), max(v, n))
+				if bond in labels:
+					out.append(BOND_SYMBOLS.get(closureOrder, ''))
+					out.append(ring_label(labels[bond]))
+					closed.append(bond)
+				else:
+					labels[bond] = open_label(labels)
+					out.append(ring_label(labels[bond]))
+
+			# Free the labels closed here, for the atoms after this one.
+			for bond in closed:
+				del labels[bond]
+
+			# Branches in parentheses, the last child continues the
+			# chain. Pushed in reverse, as the stack is LIFO.
+			kids = children[v]
+			if kids:
+				stack.append(kids[-1])
+				for child in reversed(kids[:-1]):
+					stack.append(')')
+					stack.append(child)
+					stack.append('(')
+
+		components.append(''.join(out))
+
+	return '.'.join(components)
+
+def canonical_smiles(smiles):
+	"""Canonical SMILES string for a SMILES string."""
+	return molecule_to_smiles(smiles_to_molecule(smiles))
 
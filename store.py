@@ -0,0 +1,397 @@
+"""
+Compact binary storage of molecules.
+
+A record holds one built Molecule: atom type codes, charges, isotopes
+and the bonds (upper triangle CSR), and optionally the perceived rings,
+2D coordinates and the SMILES text. Records decode straight back into
+a Molecule without reparsing:
+
+	>>> data = encode_molecule(mol, coords=depiction.coords, rings=True)
+	>>> mol, coords = decode_molecule(data)
+
+A collection file holds many records back to back, followed by an
+offset index. It is opened with mmap and read by record number, so
+opening it costs the same for ten records as for fifty million:
+
+	>>> with MoleculeWriter('library.sdgc') as writer:
+	...     for smiles in smilesList:
+	...         writer.add(smiles_to_molecule(smiles))
+
+	>>> library = MoleculeCollection('library.sdgc')
+	>>> mol, coords = library[42000000]
+
+All integers and floats are little-endian. Record layout:
+
+	* header -- flags (uint8), atom count (uint16), bond count (uint32)
+	* types -- one code per atom (uint8). Labels without a code are
+			   stored inline: TYPE_INLINE, length (uint8), label.
+	* charges -- int8 per atom
+	* isotopes -- uint16 per atom
+	* bonds -- per atom, its number of higher labeled neighbors
+			   (uint16); then the neighbors (uint16) and bond orders
+			   (uint8, twice the order so that 1.5 fits) of all bonds
+	* rings (FLAG_RINGS) -- ring count (uint16), ring sizes (uint16),
+							then the ring atoms (uint16)
+	* coords (FLAG_COORDS) -- x, y (float32) per atom; NaN if unset
+	* smiles (FLAG_SMILES) -- length (uint32), then the text
+
+Collection layout: the file header (see FILE_HEADER), the records, and
+the index of count+1 record offsets (uint64), the last of which is the
+end of the last record.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+from molecule import Molecule
+from smiles import Smiles
+
+# Atom type codes. Codes are part of the file format: only append.
+TYPE_CODES = ('C', 'N', 'O', 'F', 'Cl', 'Br', 'I', 'S', 'P', 'B', 'H',
+		'c', 'n', 'o', 's', 'p', 'b', 'CL', 'BR')
+TYPE_INLINE = 0xff
+
+_TYPE_LOOKUP = dict((label, code) for code, label in enumerate(TYPE_CODES))
+
+# Record flags
+FLAG_RINGS = 0x01
+FLAG_COORDS = 0x02
+FLAG_SMILES = 0x04
+
+RECORD_HEADER = struct.Struct('<BHI') # Flags, atoms, bonds
+
+FILE_MAGIC = 'SDGC'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<4sHHQQ') # Magic, version, 0, count, index
+
+MAX_ATOMS = 0xffff
+
+# Array type codes of the fixed size fields.
+_INT8 = 'b'
+_UINT8 = 'B'
+_UINT16 = 'H'
+_FLOAT32 = 'f'
+
+# The writer keeps the record offsets in memory until the index is
+# written. A 64-bit array is used where the platform has one; doubles
+# are exact for any offset a file can hold otherwise.
+_OFFSET_TYPE = 'L' if array('L').itemsize == 8 else 'd'
+
+# Index entries are written this many at a time.
+_INDEX_CHUNK = 65536
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+def _pack_array(typecode, values):
+	"""Little-endian bytes of the values, as an array of the typecode."""
+	arr = array(typecode, values)
+	if _BIG_ENDIAN:
+		arr.byteswap()
+	return arr.tostring()
+
+def _unpack_array(typecode, count, data, offset):
+	"""
+	Read count little-endian items of the typecode from data at the
+	offset. Returns (array, offset past the items).
+	"""
+	arr = array(typecode)
+	end = offset + count*arr.itemsize
+	arr.fromstring(data[offset:end])
+	if len(arr) != count:
+		raise Exception, "Truncated molecule record."
+	if _BIG_ENDIAN:
+		arr.byteswap()
+	return (arr, end)
+
+def encode_molecule(mol, coords=None, rings=False):
+	"""
+	Encode a molecule as a binary record (a string).
+
+	Inputs:
+		mol - the Molecule.
+		coords - optional {atom: (x, y)} positions, eg. from a
+				 Depiction. Stored as float32.
+		rings - also store the molecule's rings. Perceives them if
+				that has not happened yet. May also be the atom cycles
+				to store.
+	"""
+	if mol.size > MAX_ATOMS:
+		raise Exception, "Too many atoms to encode, %d." % mol.size
+
+	flags = 0
+	if rings is not False and rings is not None:
+		flags |= FLAG_RINGS
+	if coords is not None:
+		flags |= FLAG_COORDS
+	if mol.smiles:
+		flags |= FLAG_SMILES
+
+	# Type codes, with uncoded labels inline.
+	typeBytes = []
+	for label in mol.types:
+		if label in _TYPE_LOOKUP:
+			typeBytes.append(chr(_TYPE_LOOKUP[label]))
+		elif 0 < len(label) < 0x100:
+			typeBytes.append(chr(TYPE_INLINE) + chr(len(label)) + label)
+		else:
+			raise Exception, "Cannot encode atom type, `%s`." % label
+
+	# Bonds, seen from the lower labeled atom.
+	counts = []
+	neighbors = []
+	orders = []
+	for i in range(mol.size):
+		count = 0
+		for k in range(mol.adjOffsets[i], mol.adjOffsets[i+1]):
+			j = mol.adjAtoms[k]
+			if j < i:
+				continue
+			order = mol.adjOrders[k]*2
+			if order != int(order) or not 0 < order < 0x100:
+				raise Exception, "Cannot encode bond order, `%s`." % \
+						mol.adjOrders[k]
+			neighbors.append(j)
+			orders.append(int(order))
+			count += 1
+		counts.append(count)
+
+	out = [RECORD_HEADER.pack(flags, mol.size, len(neighbors))]
+	out.append(''.join(typeBytes))
+	out.append(_pack_array(_INT8, mol.charges))
+	out.append(_pack_array(_UINT16, [int(x or 0) for x in mol.isotopes]))
+	out.append(_pack_array(_UINT16, counts))
+	out.append(_pack_array(_UINT16, neighbors))
+	out.append(_pack_array(_UINT8, orders))
+
+	if flags & FLAG_RINGS:
+		ringList = mol.rings if rings is True else rings
+		out.append(_pack_array(_UINT16, [len(ringList)]))
+		out.append(_pack_array(_UINT16, [len(r) for r in ringList]))
+		out.append(_pack_array(_UINT16, [a for r in ringList for a in r]))
+
+	if flags & FLAG_COORDS:
+		xy = array(_FLOAT32, [float('nan')]*(2*mol.size))
+		for atom, (x, y) in coords.items():
+			xy[2*atom] = x
+			xy[2*atom+1] = y
+		out.append(_pack_array(_FLOAT32, xy))
+
+	if flags & FLAG_SMILES:
+		smiles = mol.smiles
+		if isinstance(smiles, Smiles):
+			smiles = smiles.string
+		out.append(struct.pack('<I', len(smiles)))
+		out.append(smiles)
+
+	return ''.join(out)
+
+def decode_molecule(data, offset=0):
+	"""
+	Decode the binary record at the offset of data (a string, or any
+	buffer such as an mmap). Returns (mol, coords); coords is
+	{atom: (x, y)} for the positioned atoms, or None if the record has
+	none. Stored rings seed the molecule's rings (see Molecule.rings).
+	"""
+	flags, size, numBonds = RECORD_HEADER.unpack_from(data, offset)
+	pos = offset + RECORD_HEADER.size
+
+	types = []
+	for i in range(size):
+		code = ord(data[pos])
+		pos += 1
+		if code != TYPE_INLINE:
+			types.append(TYPE_CODES[code])
+			continue
+		length = ord(data[pos])
+		types.append(data[pos+1:pos+1+length])
+		pos += 1 + length
+
+	charges, pos = _unpack_array(_INT8, size, data, pos)
+	isotopes, pos = _unpack_array(_UINT16, size, data, pos)
+	counts, pos = _unpack_array(_UINT16, size, data, pos)
+	neighbors, pos = _unpack_array(_UINT16, numBonds, data, pos)
+	orders, pos = _unpack_array(_UINT8, numBonds, data, pos)
+
+	bonds = []
+	k = 0
+	for i in range(size):
+		for n in range(counts[i]):
+			bonds.append((i, neighbors[k], orders[k]/2.0))
+			k += 1
+
+	ringPaths = None
+	if flags & FLAG_RINGS:
+		numRings, pos = _unpack_array(_UINT16, 1, data, pos)
+		sizes, pos = _unpack_array(_UINT16, numRings[0], data, pos)
+		ringAtoms, pos = _unpack_array(_UINT16, sum(sizes), data, pos)
+		ringPaths = []
+		start = 0
+		for ringSize in sizes:
+			ringPaths.append(tuple(ringAtoms[start:start+ringSize]))
+			start += ringSize
+
+	coords = None
+	if flags & FLAG_COORDS:
+		xy, pos = _unpack_array(_FLOAT32, 2*size, data, pos)
+		coords = {}
+		for i in range(size):
+			x = xy[2*i]
+			if x == x: # NaN if unset
+				coords[i] = (x, xy[2*i+1])
+
+	smiles = None
+	if flags & FLAG_SMILES:
+		length, = struct.unpack_from('<I', data, pos)
+		pos += 4
+		smiles = Smiles(data[pos:pos+length])
+
+	mol = Molecule(types, bonds=bonds, charges=list(charges),
+			isotopes=list(isotopes), ringSystem=ringPaths, smiles=smiles)
+	return (mol, coords)
+
+class MoleculeWriter(object):
+	"""
+	Writes a collection file, one record at a time. The index and final
+	header are written by close(); until then the file is incomplete.
+	"""
+
+	def __init__(self, path, rings=False):
+		"""
+		Create (or overwrite) the collection file at the path. If rings
+		is set, every record also stores the molecule's rings.
+		"""
+		self.path = path
+		self.rings = rings
+		self.offsets = array(_OFFSET_TYPE)
+
+		self._file = open(path, 'wb')
+		self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, 0, 0, 0))
+		self._end = FILE_HEADER.size
+
+	def __len__(self):
+		return len(self.offsets)
+
+	def add(self, mol, coords=None):
+		"""
+		Append a molecule (see encode_molecule()). Returns its record
+		number.
+		"""
+		data = encode_molecule(mol, coords, self.rings)
+		self.offsets.append(self._end)
+		self._file.write(data)
+		self._end += len(data)
+		return len(self.offsets) - 1
+
+	def close(self):
+		"""Write the index and header, and close the file."""
+		if self._file is None:
+			return
+
+		f = self._file
+		indexOffset = self._end
+		self.offsets.append(self._end)
+		for i in range(0, len(self.offsets), _INDEX_CHUNK):
+			chunk = [int(x) for x in self.offsets[i:i+_INDEX_CHUNK]]
+			f.write(struct.pack('<%dQ' % len(chunk), *chunk))
+		self.offsets.pop()
+
+		f.seek(0)
+		f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, 0,
+				len(self.offsets), indexOffset))
+		f.close()
+		self._file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+class MoleculeCollection(object):
+	"""
+	Read-only, random access view of a collection file. The file is
+	memory-mapped: opening reads only the header, and each lookup
+	reads one index entry and one record, as pages are touched.
+
+	collection[i] is (mol, coords) of record i (see decode_molecule()).
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self._file = open(path, 'rb')
+		try:
+			self._map = mmap.mmap(self._file.fileno(), 0,
+					access=mmap.ACCESS_READ)
+		except:
+			self._file.close()
+			raise
+
+		if len(self._map) < FILE_HEADER.size:
+			self.close()
+			raise Exception, "Not a molecule collection, `%s`." % path
+
+		magic, version, reserved, count, indexOffset = \
+				FILE_HEADER.unpack_from(self._map, 0)
+		if magic != FILE_MAGIC or version != FILE_VERSION:
+			self.close()
+			raise Exception, "Not a molecule collection, `%s`." % path
+		if indexOffset + 8*(count + 1) > len(self._map):
+			self.close()
+			raise Exception, "Incomplete molecule collection, `%s`." % path
+
+		self.count = count
+		self._indexOffset = indexOffset
+
+	def __len__(self):
+		return self.count
+
+	def _bounds(self, i):
+		"""Start and end offsets of record i."""
+		if i < 0:
+			i += self.count
+		if not 0 <= i < self.count:
+			raise IndexError, "Record number out of range, %d." % i
+		return struct.unpack_from('<QQ', self._map, self._indexOffset + 8*i)
+
+	def getRecord(self, i):
+		"""The raw binary record i (see encode_molecule())."""
+		start, end = self._bounds(i)
+		return self._map[start:end]
+
+	def __getitem__(self, i):
+		start, end = self._bounds(i)
+		return decode_molecule(self._map, start)
+
+	def __iter__(self):
+		for i in xrange(self.count):
+			yield self[i]
+
+	def close(self):
+		"""Unmap and close the file."""
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+def write_collection(path, molecules, rings=False):
+	"""
+	Write molecules to a collection file. Items may be molecules, or
+	(mol, coords) pairs. Returns the number of records written.
+	"""
+	with MoleculeWriter(path, rings) as writer:
+		for item in molecules:
+			if isinstance(item, Molecule):
+				writer.add(item)
+			else:
+				writer.add(*item)
+		return len(writer)
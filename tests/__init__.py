@@ -0,0 +1,5 @@
+"""
+Unit tests. Run from the repository root:
+
+	python -m unittest discover -s tests -t .
+"""
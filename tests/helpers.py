@@ -0,0 +1,28 @@
+"""
+Shared test helpers.
+"""
+
+from molecule import Molecule
+from sdg import molecule_bonds
+
+def ring_bonds(size, start=0):
+	"""Single bonds of a ring of atoms start..start+size-1."""
+	return [(start + i, start + (i+1) % size, 1) for i in range(size)]
+
+def renumber(mol, rnd):
+	"""
+	The molecule with its atoms randomly renumbered by rnd (a
+	random.Random), and its bonds given in random order.
+	"""
+	new = range(mol.size)
+	rnd.shuffle(new) # Old label -> new label
+	old = [0 for x in range(mol.size)]
+	for i in range(mol.size):
+		old[new[i]] = i
+
+	bonds = [(new[a], new[b], order) for a, b, order in molecule_bonds(mol)]
+	rnd.shuffle(bonds)
+	return Molecule([mol.types[old[i]] for i in range(mol.size)],
+			bonds=bonds,
+			charges=[mol.charges[old[i]] for i in range(mol.size)],
+			isotopes=[mol.isotopes[old[i]] for i in range(mol.size)])
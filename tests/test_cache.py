@@ -0,0 +1,92 @@
+"""
+Tests for the persistent layout cache in cache.py.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from smiles import smiles_to_molecule
+from sdg import depict
+from cache import LayoutCache
+
+NAPHTHALENE = 'c1ccc2ccccc2c1'
+AZULENE = 'c1ccc2cccc2cc1'
+QUINOLINE = 'c1ccc2ncccc2c1'
+
+class LayoutCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, 'layouts.db')
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_renumbered_smiles_hits(self):
+		with LayoutCache(self.path) as cache:
+			first = depict(NAPHTHALENE, cache=cache)
+			mol = smiles_to_molecule('c2cccc1ccccc12', cached=False)
+			layout = cache.get(mol)
+			self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+		self.assertEqual(len(layout.coords), 10)
+		self.assertEqual(sorted(len(r) for r in layout.rings), [6, 6])
+		self.assertEqual(layout.numRingGroups, 1)
+
+		# Bonded atoms are still 50 apart in the new atom labels.
+		for i in range(mol.size):
+			for j in mol.alphaAtoms[i]:
+				(xa, ya), (xb, yb) = layout.coords[i], layout.coords[j]
+				length = ((xa - xb)**2 + (ya - yb)**2) ** 0.5
+				self.assertAlmostEqual(length, 50.0, 3)
+
+	def test_persists(self):
+		with LayoutCache(self.path) as cache:
+			depict(NAPHTHALENE, cache=cache)
+		with LayoutCache(self.path) as cache:
+			self.assertEqual(len(cache), 1)
+			depict(NAPHTHALENE, cache=cache)
+			self.assertEqual(cache.hits, 1)
+			self.assertEqual(cache.stats()['misses'], 1)
+
+	def test_evicts_least_recently_used(self):
+		with LayoutCache(self.path, maxBytes=None) as cache:
+			depict(NAPHTHALENE, cache=cache)
+			entryBytes = cache.stats()['bytes']
+
+		# Room for two entries of the same size.
+		with LayoutCache(self.path, maxBytes=2*entryBytes) as cache:
+			depict(AZULENE, cache=cache)
+			depict(NAPHTHALENE, cache=cache) # Azulene is now the oldest
+			depict(QUINOLINE, cache=cache)
+
+			self.assertEqual(len(cache), 2)
+			self.assertEqual(cache.stats()['bytes'], 2*entryBytes)
+			get = lambda s: cache.get(smiles_to_molecule(s, cached=False))
+			self.assertTrue(get(NAPHTHALENE) is not None)
+			self.assertTrue(get(QUINOLINE) is not None)
+			self.assertTrue(get(AZULENE) is None)
+
+	def test_rejects_incomplete_layout(self):
+		mol = smiles_to_molecule(NAPHTHALENE, cached=False)
+		with LayoutCache(self.path) as cache:
+			self.assertFalse(cache.put(mol, {}))
+			self.assertFalse(cache.put(mol, {0: (0.0, 0.0)}))
+			self.assertEqual(len(cache), 0)
+
+			coords = dict((i, (float(i), 0.0)) for i in range(mol.size))
+			self.assertTrue(cache.put(mol, coords, 0, 1))
+			self.assertEqual(len(cache), 1)
+
+	def test_clear(self):
+		with LayoutCache(self.path) as cache:
+			depict(NAPHTHALENE, cache=cache)
+			cache.clear()
+			self.assertEqual(len(cache), 0)
+			self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0,
+					'entries': 0, 'bytes': 0})
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests for util.lru.
+"""
+
+import unittest
+
+from util.lru import LRUCache
+
+class LRUCacheTest(unittest.TestCase):
+
+	def test_get_and_put(self):
+		cache = LRUCache(2)
+		cache.put('a', 1)
+		self.assertEqual(cache.get('a'), 1)
+		self.assertEqual(cache.get('b'), None)
+		self.assertEqual(cache.get('b', 0), 0)
+		self.assertTrue('a' in cache)
+		self.assertEqual(len(cache), 1)
+
+	def test_evicts_least_recently_used(self):
+		cache = LRUCache(2)
+		cache.put('a', 1)
+		cache.put('b', 2)
+		cache.get('a') # 'b' is now the least recently used
+		cache.put('c', 3)
+		self.assertFalse('b' in cache)
+		self.assertTrue('a' in cache and 'c' in cache)
+		self.assertEqual(cache.evictions, 1)
+
+	def test_replace_does_not_evict(self):
+		cache = LRUCache(2)
+		cache.put('a', 1)
+		cache.put('b', 2)
+		cache.put('a', 3)
+		self.assertEqual(len(cache), 2)
+		self.assertEqual(cache.get('a'), 3)
+		self.assertEqual(cache.evictions, 0)
+
+	def test_zero_size_stores_nothing(self):
+		cache = LRUCache(0)
+		cache.put('a', 1)
+		self.assertEqual(len(cache), 0)
+		self.assertEqual(cache.get('a'), None)
+
+	def test_resize(self):
+		cache = LRUCache(3)
+		for key in 'abc':
+			cache.put(key, key)
+		cache.resize(1)
+		self.assertEqual(len(cache), 1)
+		self.assertTrue('c' in cache)
+		cache.resize(0)
+		self.assertEqual(len(cache), 0)
+
+	def test_stats_and_clear(self):
+		cache = LRUCache(1)
+		cache.put('a', 1)
+		cache.get('a')
+		cache.get('b')
+		cache.put('b', 2)
+		self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1,
+				'evictions': 1, 'size': 1, 'maxSize': 1})
+		cache.clear()
+		self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0,
+				'evictions': 0, 'size': 0, 'maxSize': 1})
+
+if __name__ == '__main__':
+	unittest.main()
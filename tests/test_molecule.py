@@ -0,0 +1,86 @@
+"""
+Tests for the Molecule constructor in molecule.py.
+"""
+
+import unittest
+
+from molecule import Molecule
+
+class MoleculeTest(unittest.TestCase):
+
+	def test_single_atom(self):
+		mol = Molecule(['C'], bonds=[])
+		self.assertEqual(mol.size, 1)
+		self.assertEqual(list(mol.adjOffsets), [0, 0])
+		self.assertEqual(list(mol.adjAtoms), [])
+		self.assertEqual(mol.alphaAtoms, ((),))
+		self.assertEqual(mol.betaAtoms, ((),))
+		self.assertEqual(mol.hydrogens, (4,))
+
+		mol = Molecule(['C'], bondOrderMat=[[0]])
+		self.assertEqual(mol.size, 1)
+
+		mol = Molecule(['O'], bonds=[])
+		self.assertEqual(mol.hydrogens, (2,))
+
+	def test_no_bonds(self):
+		mol = Molecule(['C', 'C'], bonds=[])
+		self.assertEqual(mol.alphaAtoms, ((), ()))
+		self.assertEqual(mol.getBondOrder(0, 1), 0)
+
+	def test_types_only(self):
+		mol = Molecule(['C', 'O'])
+		self.assertEqual(mol.size, 2)
+		self.assertEqual(list(mol.adjOffsets), [0, 0, 0])
+		self.assertEqual(mol.alphaAtoms, ((), ()))
+		self.assertEqual(mol.hydrogens, (4, 2))
+
+		mol = Molecule(['C'])
+		self.assertEqual(mol.size, 1)
+		self.assertEqual(mol.getBondOrder(0, 0), 0)
+
+	def test_bonds(self):
+		# Bonds in any order, either direction; neighbours come out
+		# sorted.
+		mol = Molecule(['C', 'C', 'O', 'C'],
+				bonds=[(3, 1, 1), (0, 1, 1), (1, 2, 2)])
+		self.assertEqual(list(mol.adjOffsets), [0, 1, 4, 5, 6])
+		self.assertEqual(list(mol.adjAtoms), [1, 0, 2, 3, 1, 1])
+		self.assertEqual(list(mol.adjOrders), [1, 1, 2, 1, 2, 1])
+		self.assertEqual(mol.alphaAtoms[1], (0, 2, 3))
+		self.assertEqual(sorted(mol.betaAtoms[0]), [2, 3])
+		self.assertEqual(mol.getBondOrder(2, 1), 2)
+		self.assertEqual(mol.getBondOrder(0, 2), 0)
+		self.assertEqual(mol.hybridizations, ('sp3', 'sp2', 'sp2', 'sp3'))
+		self.assertEqual(mol.hydrogens, (3, 0, 0, 3))
+
+	def test_bond_matrix(self):
+		mat = [[0, 1, 0], [1, 0, 3], [0, 3, 0]]
+		mol = Molecule(['C', 'C', 'N'], bondOrderMat=mat)
+		self.assertEqual(mol.getBondOrder(0, 1), 1)
+		self.assertEqual(mol.getBondOrder(1, 2), 3)
+		self.assertEqual(mol.hybridizations[2], 'sp')
+
+		other = Molecule(['C', 'C', 'N'], bonds=[(0, 1, 1), (1, 2, 3)])
+		self.assertEqual(list(mol.adjAtoms), list(other.adjAtoms))
+		self.assertEqual(list(mol.adjOrders), list(other.adjOrders))
+
+	def test_bond_index(self):
+		mol = Molecule(['C']*4, bonds=[(0, 1, 1), (1, 2, 1), (2, 3, 1)])
+		indices = [mol.getBondIndex(0, 1), mol.getBondIndex(1, 2),
+				mol.getBondIndex(2, 3)]
+		self.assertEqual(len(set(indices)), 3)
+		self.assertEqual(mol.getBondIndex(2, 1), mol.getBondIndex(1, 2))
+
+	def test_defaults(self):
+		mol = Molecule(['C', 'O'], bonds=[(0, 1, 1)])
+		self.assertEqual(mol.charges, (0, 0))
+		self.assertEqual(mol.isotopes, (0, 0))
+		self.assertAlmostEqual(mol.weight, 32.04, 1)
+
+	def test_attributes_are_set_once(self):
+		mol = Molecule(['C'], bonds=[])
+		self.assertRaises(Exception, setattr, mol, 'types', ('N',))
+
+if __name__ == '__main__':
+	unittest.main()
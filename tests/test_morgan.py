@@ -0,0 +1,81 @@
+"""
+Tests for canonical.morgan.
+"""
+
+import random
+import unittest
+
+from molecule import Molecule
+from smiles import smiles_to_molecule
+from canonical.morgan import canonical_ranks, canonicalize
+from tests.helpers import molecule_bonds, ring_bonds, renumber
+
+PRISM = [(0, 1, 1), (1, 2, 1), (2, 0, 1), (3, 4, 1), (4, 5, 1), (5, 3, 1),
+		(0, 3, 1), (1, 4, 1), (2, 5, 1)]
+K33 = [(a, 3 + b, 1) for a in range(3) for b in range(3)]
+
+def shifted(bonds, offset):
+	"""The bonds with every atom label moved up by offset."""
+	return [(a + offset, b + offset, order) for a, b, order in bonds]
+
+def canonical_form(mol):
+	"""Everything canonicalize() keeps, for comparison."""
+	canon = canonicalize(mol)
+	return (canon.types, canon.charges, canon.isotopes,
+			sorted(molecule_bonds(canon)))
+
+class CanonicalTest(unittest.TestCase):
+
+	# Molecules whose refinement leaves ties, so the canonical order
+	# depends on the search over tied atoms.
+	SYMMETRIC = {
+		'C3+C4': (['C']*7, ring_bonds(3) + ring_bonds(4, 3)),
+		'C5+C6': (['C']*11, ring_bonds(5) + ring_bonds(6, 5)),
+		'C6+C3+C3': (['C']*12,
+				ring_bonds(6) + ring_bonds(3, 6) + ring_bonds(3, 9)),
+		'prism+K33': (['C']*12, PRISM + shifted(K33, 6)),
+	}
+
+	SMILES = [
+		'C12C3C4C5C1C6C7C2C8C3C9C4C%10C5C6C%11C7C8C%12C9C%10C%11%12',
+		'C12C3C4C1C5C2C3C45', # Cubane
+		'c1ccccc1',
+		'c1cc2ccc3ccc4ccc5ccc6ccc1c7c2c3c4c5c67', # Coronene
+		'O=C(O)CC(N)C(=O)O',
+		'CC(C)(C)C',
+	]
+
+	def assertInvariant(self, mol, times=8):
+		"""Renumbered copies of mol all get the same canonical form."""
+		rnd = random.Random(7)
+		expected = canonical_form(mol)
+		for x in range(times):
+			self.assertEqual(canonical_form(renumber(mol, rnd)), expected)
+
+	def test_symmetric_graphs(self):
+		for name, (types, bonds) in sorted(self.SYMMETRIC.items()):
+			self.assertInvariant(Molecule(types, bonds=bonds))
+
+	def test_molecules(self):
+		for smiles in self.SMILES:
+			self.assertInvariant(smiles_to_molecule(smiles, cached=False))
+
+	def test_distinguishes_non_isomorphic(self):
+		prism = Molecule(['C']*6, bonds=PRISM)
+		k33 = Molecule(['C']*6, bonds=K33)
+		self.assertNotEqual(canonical_form(prism), canonical_form(k33))
+
+	def test_ranks_are_a_permutation(self):
+		mol = smiles_to_molecule('c1ccc2ccccc2c1', cached=False)
+		self.assertEqual(sorted(canonical_ranks(mol)), range(mol.size))
+
+	def test_canonicalize_keeps_atom_data(self):
+		mol = smiles_to_molecule('[13CH3][N+](C)(C)C', cached=False)
+		canon = canonicalize(mol)
+		self.assertEqual(sorted(canon.types), sorted(mol.types))
+		self.assertEqual(sorted(canon.charges), sorted(mol.charges))
+		self.assertEqual(len(molecule_bonds(canon)),
+				len(molecule_bonds(mol)))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests for algo.path.
+"""
+
+import unittest
+
+from algo.path import ShortestPaths
+
+INF = float('Infinity')
+
+def chain_matrix(length, weight=1):
+	"""Adjacency matrix of a chain 0-1-...-(length-1)."""
+	matrix = [[INF for x in range(length)] for xx in range(length)]
+	for i in range(length):
+		matrix[i][i] = 0
+		if i:
+			matrix[i][i-1] = matrix[i-1][i] = weight
+	return matrix
+
+class ShortestPathsTest(unittest.TestCase):
+
+	def test_engines_agree(self):
+		matrix = chain_matrix(6)
+		matrix[1][5] = matrix[5][1] = 1
+		for engine in ShortestPaths.ENGINES:
+			paths = ShortestPaths(matrix, engine)
+			self.assertEqual(paths.getWeight(0, 5), 2)
+			self.assertEqual(paths.findPath(0, 5), [1])
+			self.assertEqual(paths.findPath(0, 5, include=True), [0, 1, 5])
+			self.assertEqual(paths.findPath(0, 1), None)
+			self.assertEqual(paths.findPath(0, 1, include=True), [0, 1])
+			self.assertEqual(paths.findPath(0, 3), [1, 2])
+
+	def test_engine_choice(self):
+		self.assertEqual(ShortestPaths(chain_matrix(3)).engine, 'bfs')
+		self.assertEqual(ShortestPaths(chain_matrix(3, 2)).engine, 'floyd')
+
+	def test_no_path(self):
+		matrix = chain_matrix(4)
+		matrix[1][2] = matrix[2][1] = INF
+		self.assertEqual(ShortestPaths(matrix).findPath(0, 3), INF)
+
+	def test_long_chain(self):
+		# Deeper than the default recursion limit.
+		paths = ShortestPaths(chain_matrix(1050), 'bfs')
+		self.assertEqual(paths.findPath(0, 1049), range(1, 1049))
+
+	def test_cached_paths_are_copies(self):
+		paths = ShortestPaths(chain_matrix(5))
+		paths.findPath(0, 4).append(9)
+		paths.findPath(0, 4, include=True).append(9)
+		self.assertEqual(paths.findPath(0, 4), [1, 2, 3])
+
+	def test_cache_size(self):
+		for size in (0, 1, 2):
+			paths = ShortestPaths(chain_matrix(5), cacheSize=size)
+			for j in range(1, 5):
+				self.assertEqual(paths.findPath(0, j, include=True),
+						range(j + 1))
+			self.assertTrue(len(paths._pathCache) <= size)
+
+if __name__ == '__main__':
+	unittest.main()
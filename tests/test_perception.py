@@ -0,0 +1,135 @@
+"""
+Tests for the perception results kept on Molecule (rings, chains and
+ring groups).
+"""
+
+import unittest
+
+from molecule import Molecule
+from smiles import smiles_to_molecule
+from ring import Ring
+from perception.rings import identify_rings
+from perception.chains import identify_chains, CHAIN_ALGORITHMS
+from examples import EXAMPLES
+
+class PerceptionTest(unittest.TestCase):
+
+	def test_perceived_once(self):
+		mol = smiles_to_molecule('c1ccc2ccccc2c1CCC', cached=False)
+		rings = mol.rings
+		self.assertEqual(sorted(len(r) for r in rings), [6, 6])
+		self.assertTrue(mol.rings is rings)
+		self.assertTrue(mol.chains is mol.chains)
+
+		groups = mol.ringGroups
+		self.assertEqual(len(groups), 1)
+		self.assertTrue(mol.ringGroups is groups)
+		self.assertEqual(sorted(groups[0]), sorted(rings))
+
+	def test_acyclic(self):
+		mol = smiles_to_molecule('CCCC', cached=False)
+		self.assertEqual(len(mol.rings), 0)
+		self.assertEqual(len(mol.ringGroups), 0)
+
+	def test_ring_system_argument(self):
+		bonds = [(0, 1, 1), (1, 2, 1), (2, 0, 1)]
+		mol = Molecule(['C']*3, bonds=bonds, ringSystem=[[0, 1, 2]])
+		self.assertEqual([list(r) for r in mol.rings], [[0, 1, 2]])
+		self.assertTrue(isinstance(mol.rings[0], Ring))
+
+		ring = Ring([2, 1, 0])
+		mol = Molecule(['C']*3, bonds=bonds, ringSystem=[ring])
+		self.assertTrue(mol.rings[0] is ring)
+
+class SSSRTest(unittest.TestCase):
+
+	# (smiles, ring sizes of the smallest set of smallest rings)
+	KNOWN = [
+		('c1ccc2ccccc2c1', [6, 6]), # Naphthalene
+		('C1CC2CCC1C2', [5, 5]), # Norbornane
+		('C12C3C4C1C5C2C3C45', [4, 4, 4, 4, 4]), # Cubane
+		('c1cc2ccc3ccc4ccc5ccc6ccc1c7c2c3c4c5c67', [6]*7), # Coronene
+		('C1CC12CCC2', [3, 4]), # Spiro
+		('CCCC', []),
+	]
+
+	def assertCycle(self, mol, ring):
+		"""The ring's atoms are distinct and bonded in order."""
+		self.assertEqual(len(set(ring)), len(ring))
+		for i in range(len(ring)):
+			self.assertTrue(mol.getBondOrder(ring[i - 1], ring[i]))
+
+	def test_known_systems(self):
+		for smiles, sizes in self.KNOWN:
+			mol = smiles_to_molecule(smiles, cached=False)
+			rings = identify_rings(mol, 'sssr')
+			self.assertEqual(sorted(len(r) for r in rings), sizes)
+			for ring in rings:
+				self.assertCycle(mol, ring)
+
+	def test_agrees_with_zamora(self):
+		# Zamora misses a ring of cubane and of coronene; here both
+		# find the same rings.
+		for smiles in ('c1ccc2ccccc2c1', 'C1CCCCC1CC1CC1', 'C1CC2CCC1C2'):
+			mol = smiles_to_molecule(smiles, cached=False)
+			ringSets = [sorted(sorted(r) for r in identify_rings(mol, a))
+					for a in ('zamora', 'sssr')]
+			self.assertEqual(ringSets[0], ringSets[1])
+
+def chain_atoms(mol, rings, algorithm):
+	"""The chains found, as (atoms, caps) pairs."""
+	return [(list(chain), chain.caps)
+			for chain in identify_chains(mol, rings, algorithm)]
+
+class ChainTest(unittest.TestCase):
+
+	# (smiles, chains with rings given, chains without rings)
+	KNOWN = [
+		# Three chain components, split by the ring.
+		('CCCCCCC1CCC(CCCC)CC1CCCCCCCCC',
+			[(range(16, 24), (15, 24)), (range(1, 6), (0, 6)),
+				(range(10, 13), (9, 13))],
+			[(range(1, 7) + range(15, 24), (0, 24)),
+				(range(8, 13), (7, 13))]),
+		# The branch is searched again once the main chain is taken.
+		('CCCCCCCCC(CCCCCC)CCCCCCCC',
+			[(range(1, 9) + range(15, 22), (0, 22)),
+				(range(10, 14), (9, 14))],
+			None),
+		# Disconnected components.
+		('CCCCCC.CCCCCCCC',
+			[(range(7, 13), (6, 13)), (range(1, 5), (0, 5))],
+			None),
+	]
+
+	def test_known_chains(self):
+		for smiles, withRings, withoutRings in self.KNOWN:
+			mol = smiles_to_molecule(smiles, cached=False)
+			for algorithm in CHAIN_ALGORITHMS:
+				self.assertEqual(chain_atoms(mol, mol.rings, algorithm),
+						withRings)
+				self.assertEqual(chain_atoms(mol, None, algorithm),
+						withoutRings or withRings)
+
+	def test_algorithms_agree(self):
+		# Without the rings, ring atoms count as chain atoms, so
+		# components have cycles and 'tree' falls back to 'allpairs'.
+		count = 0
+		for category in sorted(EXAMPLES):
+			for name, smiles in sorted(EXAMPLES[category].items()):
+				try:
+					mol = smiles_to_molecule(smiles, cached=False)
+				except KeyError:
+					continue # No atomic weight for the element (eg. S)
+				for rings in (mol.rings, None):
+					self.assertEqual(chain_atoms(mol, rings, 'tree'),
+							chain_atoms(mol, rings, 'allpairs'))
+				count += 1
+		self.assertTrue(count > 30)
+
+	def test_invalid_algorithm(self):
+		mol = smiles_to_molecule('CCCC', cached=False)
+		self.assertRaises(Exception, identify_chains, mol, None, 'dfs')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,121 @@
+"""
+Tests for SVG rendering in render.py.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from xml.dom import minidom
+
+from sdg import Depiction, DepictionError, depict
+from render import _layout, depiction_to_svg, render_many
+
+# Benzaldehyde, with alternating ring bonds.
+BENZALDEHYDE = 'C1=CC=CC=C1C=O'
+
+def midpoint(seg):
+	x1, y1, x2, y2 = seg
+	return ((x1 + x2)/2.0, (y1 + y2)/2.0)
+
+def distance(a, b):
+	return ((a[0] - b[0])**2 + (a[1] - b[1])**2) ** 0.5
+
+class LayoutTest(unittest.TestCase):
+
+	def test_double_bonds_inside_ring(self):
+		depiction = depict(BENZALDEHYDE)
+		width, height, points, segments, labels = _layout(depiction)
+
+		ring = [points[i] for i in range(6)]
+		centre = (sum(p[0] for p in ring)/6.0, sum(p[1] for p in ring)/6.0)
+
+		# Each drawn bond's line is followed by the second line of a
+		# double bond; the unpositioned C=O is not drawn.
+		self.assertEqual(len(segments), 6 + 3)
+		pos = 0
+		for a, b, order in depiction.bonds:
+			if a not in points or b not in points:
+				continue
+			bond = segments[pos]
+			pos += 1
+			if order != 2:
+				continue
+			second = segments[pos]
+			pos += 1
+			self.assertTrue(distance(midpoint(second), centre) <
+					distance(midpoint(bond), centre) - 5.0)
+			self.assertTrue(distance(second[:2], second[2:]) <
+					distance(bond[:2], bond[2:]))
+
+	def test_double_bond_side(self):
+		# The second line goes to the side of the neighbour, whichever
+		# way the bond is given.
+		for y, bonds in ((-40.0, [(0, 1, 2), (1, 2, 1)]),
+				(40.0, [(1, 0, 2), (1, 2, 1)])):
+			coords = {0: (0.0, 0.0), 1: (50.0, 0.0), 2: (75.0, y)}
+			depiction = Depiction('C=CC', 3, coords, ['C']*3, bonds)
+			segments = _layout(depiction, margin=50.0)[3]
+			self.assertEqual(len(segments), 3)
+			self.assertEqual(segments[1][1], segments[1][3])
+			offset = segments[1][1] - segments[0][1]
+			self.assertEqual(abs(offset), 6.0)
+			self.assertTrue(offset * y > 0)
+
+	def test_terminal_double_bond(self):
+		coords = {0: (0.0, 0.0), 1: (50.0, 0.0)}
+		depiction = Depiction('C=O', 2, coords, ['C', 'O'], [(0, 1, 2)])
+		segments = _layout(depiction, margin=0.0)[3]
+		self.assertEqual(len(segments), 2)
+		x1, y1, x2, y2 = segments[1]
+		self.assertEqual((x1, x2, abs(y1), abs(y2)), (0.0, 50.0, 6.0, 6.0))
+
+	def test_labels(self):
+		coords = {0: (0.0, 0.0), 1: (50.0, 0.0)}
+		depiction = Depiction('CO', 2, coords, ['C', 'O'], [(0, 1, 1)])
+		labels = _layout(depiction, margin=10.0)[4]
+		self.assertEqual(labels, [(60.0, 10.0, 'O')])
+
+class SVGTest(unittest.TestCase):
+
+	def test_svg(self):
+		depiction = depict(BENZALDEHYDE)
+		doc = minidom.parseString(depiction_to_svg(depiction, scale=2.0))
+		svg = doc.documentElement
+		self.assertEqual(svg.tagName, 'svg')
+		self.assertEqual(len(svg.getElementsByTagName('line')), 9)
+		self.assertEqual(svg.getElementsByTagName('title')[0]
+				.firstChild.data, BENZALDEHYDE)
+		self.assertEqual(float(svg.getAttribute('width')),
+				2*20.0 + 2*86.6)
+
+	def test_escapes_title(self):
+		depiction = Depiction('C<&>"', 0, {})
+		doc = minidom.parseString(depiction_to_svg(depiction))
+		self.assertEqual(doc.getElementsByTagName('title')[0]
+				.firstChild.data, 'C<&>"')
+
+class RenderManyTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_render_many(self):
+		depictions = [depict('c1ccccc1'),
+				DepictionError("Failed.", 'C1'),
+				depict(BENZALDEHYDE)]
+		out = os.path.join(self.dir, 'out')
+		self.assertEqual(render_many(depictions, out), 2)
+		self.assertEqual(sorted(os.listdir(out)),
+				['000000.svg', '000002.svg'])
+		with open(os.path.join(out, '000002.svg')) as f:
+			minidom.parse(f)
+
+	def test_invalid_format(self):
+		self.assertRaises(Exception, render_many, [], self.dir, 'gif')
+
+if __name__ == '__main__':
+	unittest.main()
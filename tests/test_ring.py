@@ -0,0 +1,103 @@
+"""
+Tests for ring.py: ring relations and ring partitioning.
+"""
+
+import unittest
+
+from smiles import smiles_to_molecule
+from molecule import Molecule
+from ring import Ring, partition_rings, popcount
+from tests.helpers import ring_bonds
+
+def groups_of(smiles):
+	"""The ring groups of a molecule, as sorted lists of sorted rings."""
+	mol = smiles_to_molecule(smiles, cached=False)
+	return [sorted(sorted(ring) for ring in group)
+			for group in partition_rings(mol.rings)]
+
+class SharedCountTest(unittest.TestCase):
+
+	# Fused rings 0-5 and 4-9 sharing the 4-5 bond, a ring 9-12 spiro
+	# at atom 9, and an unrelated ring 13-15.
+	BONDS = ring_bonds(6) + [(4, 6, 1), (6, 7, 1), (7, 8, 1), (8, 9, 1),
+			(9, 5, 1), (9, 10, 1), (10, 11, 1), (11, 12, 1), (12, 9, 1)] + \
+			ring_bonds(3, 13)
+	PATHS = [[0, 1, 2, 3, 4, 5], [4, 6, 7, 8, 9, 5], [9, 10, 11, 12],
+			[13, 14, 15]]
+
+	def rings(self, mol=None):
+		return [Ring(path, mol=mol) for path in self.PATHS]
+
+	def test_counts_match_sets(self):
+		mol = Molecule(['C']*16, bonds=self.BONDS)
+		for rings in (self.rings(), self.rings(mol)):
+			for a in rings:
+				for b in rings:
+					self.assertEqual(a.sharedAtomCount(b),
+							len(set(a) & set(b)))
+					self.assertEqual(a.sharedBondCount(b),
+							len(a.bonds & b.bonds))
+
+	def test_relations(self):
+		mol = Molecule(['C']*16, bonds=self.BONDS)
+		fusedA, fusedB, spiro, other = self.rings(mol)
+		self.assertEqual((fusedA.sharedAtomCount(fusedB),
+				fusedA.sharedBondCount(fusedB)), (2, 1))
+		self.assertTrue(fusedA.isFusedTo(fusedB))
+		self.assertEqual((fusedB.sharedAtomCount(spiro),
+				fusedB.sharedBondCount(spiro)), (1, 0))
+		self.assertTrue(spiro.isSpiroTo(fusedB))
+		self.assertEqual((fusedA.sharedAtomCount(other),
+				fusedA.sharedBondCount(other)), (0, 0))
+		self.assertEqual(fusedA.sharedBondCount(fusedA), 6)
+
+	def test_masks(self):
+		mol = Molecule(['C']*16, bonds=self.BONDS)
+		ring = self.rings(mol)[2]
+		self.assertEqual(ring.atomMask, (1 << 9) | (1 << 10) | (1 << 11) |
+				(1 << 12))
+		self.assertEqual(popcount(ring.bondMask), 4)
+		self.assertEqual(self.rings()[2].bondMask, None)
+
+class PartitionTest(unittest.TestCase):
+
+	def test_disjoint(self):
+		self.assertEqual(groups_of('c1ccccc1CCc1ccccc1'),
+				[[range(6)], [range(8, 14)]])
+		self.assertEqual(groups_of('c1ccc2ccccc2c1.C1CC1'),
+				[[[0, 1, 2, 3, 8, 9], [3, 4, 5, 6, 7, 8]], [[10, 11, 12]]])
+
+	def test_spiro(self):
+		self.assertEqual(groups_of('C1CC12CCC2'), [[[0, 1, 2], [2, 3, 4, 5]]])
+		# Spiro to one ring, fused to another.
+		self.assertEqual(groups_of('C1CC2(CC1)CCC1CCCC12'),
+				[[[0, 1, 2, 3, 4], [2, 5, 6, 7, 11], [7, 8, 9, 10, 11]]])
+
+	def test_bridged(self):
+		# Cubane: every ring is fused to others, so one group.
+		self.assertEqual(groups_of('C12C3C4C1C5C2C3C45'),
+				[[[0, 1, 2, 3], [0, 1, 5, 6], [0, 3, 4, 5], [1, 2, 6, 7]]])
+
+		# Norbornane's rings share two bonds: neither fused nor spiro.
+		# Ring.isBridgedTo() is not supported yet, so they are kept
+		# apart.
+		self.assertEqual(groups_of('C1CC2CCC1C2'),
+				[[[0, 1, 2, 5, 6]], [[2, 3, 4, 5, 6]]])
+
+	def test_order_and_ids(self):
+		# Groups come in order of their first ring, rings in input order.
+		rings = [Ring([10, 11, 12]), Ring([0, 1, 2, 3]), Ring([3, 4, 5]),
+				Ring([12, 13, 14]), Ring([20, 21, 22])]
+		groups = partition_rings(rings)
+		self.assertEqual([group.rgId for group in groups], [0, 1, 2])
+		self.assertEqual([[list(r) for r in group] for group in groups],
+				[[[10, 11, 12], [12, 13, 14]], [[0, 1, 2, 3], [3, 4, 5]],
+				[[20, 21, 22]]])
+
+	def test_single_ring(self):
+		groups = partition_rings([Ring([0, 1, 2])])
+		self.assertEqual(len(groups), 1)
+		self.assertEqual(list(groups[0][0]), [0, 1, 2])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,49 @@
+"""
+Tests for ring analysis (ring peeling) in analysis.rings.
+"""
+
+import unittest
+
+from ring import Ring, RingGroup, RING_TYPES
+from smiles import smiles_to_molecule
+from analysis.rings import ring_analysis
+
+def cube_faces():
+	"""The six faces of a cube, atoms 0-7 labelled by their corner."""
+	faces = []
+	for bit in (1, 2, 4):
+		a, b = [x for x in (1, 2, 4) if x != bit]
+		for v in (0, bit):
+			faces.append(Ring([v, v | a, v | a | b, v | b]))
+	return faces
+
+class RingAnalysisTest(unittest.TestCase):
+
+	def test_fused(self):
+		mol = smiles_to_molecule('c1ccc2cc3ccccc3cc2c1', cached=False)
+		group, = mol.ringGroups
+		ring_analysis([group])
+
+		types = [ring.type for ring in group.peelOrder]
+		self.assertEqual(types, [RING_TYPES.FUSED, RING_TYPES.FUSED,
+				RING_TYPES.CORE])
+		# The middle ring is central, so an outer ring goes first.
+		first = group.peelOrder[0]
+		self.assertEqual(sum(first.sharedBondCount(ring)
+				for ring in group.peelOrder[1:]), 1)
+
+	def test_bridged(self):
+		# Every face shares a bond with four others, too many for a
+		# fused ring, and none is central: peeling has to start with a
+		# bridged ring.
+		group = RingGroup(cube_faces())
+		ring_analysis([group])
+
+		self.assertEqual(len(group.peelOrder), 6)
+		self.assertEqual(sorted(ring.groupOffset
+				for ring in group.peelOrder), range(6))
+		self.assertEqual(group.peelOrder[0].type, RING_TYPES.BRIDGED)
+		self.assertEqual(group.peelOrder[-1].type, RING_TYPES.CORE)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests for the depiction pipeline in sdg.py.
+"""
+
+import unittest
+import warnings
+
+from smiles import smiles_to_molecule
+from sdg import depict, depict_many, analyze_molecule, DepictionError
+
+# Ring construction fails on fluorescein's spiro ring group.
+FLUORESCEIN = 'c1ccc2c(c1)C(=O)OC23c4ccc(cc4Oc5c3ccc(c5)O)O'
+
+class DepictTest(unittest.TestCase):
+
+	def setUp(self):
+		self._warnings = warnings.catch_warnings()
+		self._warnings.__enter__()
+		warnings.simplefilter('ignore')
+
+	def tearDown(self):
+		self._warnings.__exit__()
+
+	def test_depict(self):
+		depiction = depict('c1ccc2ccccc2c1')
+		self.assertEqual(depiction.size, 10)
+		self.assertEqual(len(depiction.coords), 10)
+		self.assertEqual(depiction.numRings, 2)
+		self.assertEqual(depiction.numRingGroups, 1)
+
+	def test_repeated_failure_raises(self):
+		for x in range(2):
+			self.assertRaises(DepictionError, depict, FLUORESCEIN)
+
+	def test_failed_analysis_is_not_kept(self):
+		mol = smiles_to_molecule(FLUORESCEIN, cached=False)
+		for x in range(2):
+			self.assertRaises(Exception, analyze_molecule, mol)
+		self.assertFalse(mol.ringGroups[0].constructed)
+
+	def test_analysis_is_kept(self):
+		mol = smiles_to_molecule('c1ccc2ccccc2c1', cached=False)
+		rings, chains, ringGroups = analyze_molecule(mol)
+		self.assertTrue(ringGroups[0].constructed)
+		self.assertTrue(analyze_molecule(mol)[2] is ringGroups)
+
+class DepictManyTest(unittest.TestCase):
+
+	SMILES = ['C' * n for n in range(2, 13)] + [FLUORESCEIN, 'C1CC',
+			'c1ccccc1', 'CC(C)(C)O']
+
+	def setUp(self):
+		self._warnings = warnings.catch_warnings()
+		self._warnings.__enter__()
+		warnings.simplefilter('ignore')
+
+	def tearDown(self):
+		self._warnings.__exit__()
+
+	def check(self, results):
+		self.assertEqual(len(results), len(self.SMILES))
+		for smiles, result in zip(self.SMILES, results):
+			self.assertEqual(result.smiles, smiles)
+
+		# Failures are reported in place, and the rest still depicted.
+		self.assertEqual([mol.size for mol in results[:11]], range(2, 13))
+		for error in results[11:13]:
+			self.assertTrue(isinstance(error, DepictionError))
+		self.assertEqual((results[13].size, results[13].numRings), (6, 1))
+		self.assertEqual(results[14].size, 5)
+
+	def test_one_worker(self):
+		self.check(list(depict_many(self.SMILES)))
+
+	def test_workers(self):
+		self.check(list(depict_many(self.SMILES, workers=3, chunkSize=2)))
+		self.check(list(depict_many(iter(self.SMILES), workers=2,
+				chunkSize=5)))
+
+if __name__ == '__main__':
+	unittest.main()
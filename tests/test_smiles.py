@@ -0,0 +1,234 @@
+"""
+Tests for the SMILES parser and writer in smiles.py.
+"""
+
+import os
+import random
+import re
+import shutil
+import tempfile
+import unittest
+
+from molecule import Molecule
+from smiles import smiles_to_molecule, molecule_to_smiles, \
+		canonical_smiles, parse_file, iter_parse_file, SmilesParseError, \
+		clear_molecule_cache, set_molecule_cache_size, molecule_cache_stats, \
+		MOLECULE_CACHE_SIZE
+from canonical.morgan import canonicalize
+from benchmarks.synthetic import polyphenyl
+from tests.helpers import molecule_bonds, renumber
+
+def parse(smiles):
+	"""Parse without the molecule cache."""
+	return smiles_to_molecule(smiles, cached=False)
+
+def graph_form(mol):
+	"""Canonical atom types and bonds; equal for isomorphic molecules."""
+	canon = canonicalize(mol)
+	return (canon.types, sorted(molecule_bonds(canon)))
+
+def random_graph(rnd, size):
+	"""Random carbon skeleton of single bonds, at most four per atom."""
+	degrees = [0 for x in range(size)]
+	bonds = set()
+	for x in range(3*size):
+		a = rnd.randrange(size)
+		b = rnd.randrange(size)
+		a, b = min(a, b), max(a, b)
+		if a == b or (a, b) in bonds or degrees[a] > 3 or degrees[b] > 3:
+			continue
+		bonds.add((a, b))
+		degrees[a] += 1
+		degrees[b] += 1
+	return Molecule(['C']*size, bonds=[(a, b, 1) for a, b in sorted(bonds)])
+
+class ParserTest(unittest.TestCase):
+
+	def test_single_atom(self):
+		mol = parse('C')
+		self.assertEqual(mol.size, 1)
+		self.assertEqual(molecule_bonds(mol), [])
+
+	def test_ring_closure(self):
+		mol = parse('C1CCCCC1')
+		self.assertEqual(len(molecule_bonds(mol)), 6)
+		self.assertEqual(mol.alphaAtoms[0], (1, 5))
+
+	def test_reused_ring_label(self):
+		# Two cyclopropanes joined by a single bond.
+		mol = parse('C1CC1C1CC1')
+		self.assertEqual(sorted(molecule_bonds(mol)), [(0, 1, 1), (0, 2, 1),
+				(1, 2, 1), (2, 3, 1), (3, 4, 1), (3, 5, 1), (4, 5, 1)])
+
+	def test_disconnected(self):
+		mol = parse('C1CC1.C1CCC1')
+		self.assertEqual(mol.size, 7)
+		self.assertEqual(len(molecule_bonds(mol)), 7)
+		self.assertEqual(mol.getBondOrder(2, 3), 0)
+
+	def test_isotope_is_not_a_ring_closure(self):
+		mol = parse('[13C]C1CC1')
+		self.assertEqual(mol.types, ('C', 'C', 'C', 'C'))
+		self.assertEqual(int(mol.isotopes[0]), 13)
+		self.assertEqual(len(molecule_bonds(mol)), 4)
+
+	def test_two_digit_ring_label(self):
+		# '%10' is label 10, and the '5' after it a label of its own.
+		mol = parse('C%105CCCC%10CCC5')
+		self.assertEqual(sorted(molecule_bonds(mol))[:3],
+				[(0, 1, 1), (0, 4, 1), (0, 7, 1)])
+		for smiles in ('C%1CCC%1', 'C%aCCC', 'CCC%'):
+			self.assertRaises(Exception, parse, smiles)
+
+	def test_bond_orders(self):
+		mol = parse('C=CC#N')
+		self.assertEqual(mol.getBondOrder(0, 1), 2)
+		self.assertEqual(mol.getBondOrder(1, 2), 1)
+		self.assertEqual(mol.getBondOrder(2, 3), 3)
+
+	def test_unclosed(self):
+		for smiles in ('C1CC', 'C1CC2CC1', 'C(C', 'CC)C'):
+			self.assertRaises(SmilesParseError, parse, smiles)
+
+class MoleculeCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		clear_molecule_cache()
+
+	def tearDown(self):
+		set_molecule_cache_size(MOLECULE_CACHE_SIZE)
+		clear_molecule_cache()
+
+	def test_fresh_molecules(self):
+		first = smiles_to_molecule('c1ccc2ccccc2c1')
+		second = smiles_to_molecule('c1ccc2ccccc2c1')
+		self.assertFalse(first is second)
+		self.assertEqual(molecule_bonds(first), molecule_bonds(second))
+		self.assertEqual(second.types, first.types)
+		self.assertEqual(molecule_cache_stats()['hits'], 1)
+		self.assertEqual(molecule_cache_stats()['misses'], 1)
+
+		# Perception is the molecule's own.
+		self.assertFalse(first.rings is second.rings)
+
+	def test_disabled(self):
+		set_molecule_cache_size(0)
+		smiles_to_molecule('CCO')
+		smiles_to_molecule('CCO')
+		self.assertEqual(molecule_cache_stats()['size'], 0)
+		self.assertEqual(molecule_cache_stats()['hits'], 0)
+
+	def test_errors_are_not_cached(self):
+		for x in range(2):
+			self.assertRaises(SmilesParseError, smiles_to_molecule, 'C1CC')
+		self.assertEqual(molecule_cache_stats()['size'], 0)
+
+class WriterTest(unittest.TestCase):
+
+	SMILES = [
+		'CCCCCC',
+		'CC(C)CCC',
+		'C#CCCCC',
+		'O=Cc1ccc(O)c(OC)c1',
+		'O=[N+]([O-])c1cc(ccc1N)[N+]([O-])=O',
+		'c1ccc2c(c1)ccc3c2ccc4c3cccc4',
+		'C12C3C4C1C5C2C3C45',
+		'C1CCCCC1C1CCCCC1',
+		'CC(=O)O.O',
+		'[13C]C1CC1',
+	]
+
+	def test_round_trip(self):
+		"""Writing the parsed canonical SMILES gives it back."""
+		for smiles in self.SMILES:
+			canon = canonical_smiles(smiles)
+			self.assertEqual(canonical_smiles(canon), canon)
+
+			mol = parse(smiles)
+			again = parse(canon)
+			self.assertEqual(sorted(again.types), sorted(mol.types))
+			self.assertEqual(len(molecule_bonds(again)),
+					len(molecule_bonds(mol)))
+
+	def test_renumbering_invariance(self):
+		rnd = random.Random(3)
+		for smiles in self.SMILES:
+			mol = parse(smiles)
+			expected = molecule_to_smiles(mol)
+			for x in range(5):
+				self.assertEqual(molecule_to_smiles(renumber(mol, rnd)),
+						expected)
+
+	def test_many_open_ring_closures(self):
+		"""The writer's output parses back to an isomorphic graph."""
+		rnd = random.Random(11)
+		twoDigit = 0
+		for x in range(150):
+			mol = random_graph(rnd, rnd.randrange(10, 30))
+			smiles = molecule_to_smiles(mol)
+			if '%' in smiles:
+				twoDigit += 1
+			self.assertEqual(graph_form(parse(smiles)), graph_form(mol))
+
+		# Most of these hold more than nine ring closures open at once.
+		self.assertTrue(twoDigit > 50)
+
+	def test_equivalent_inputs(self):
+		self.assertEqual(canonical_smiles('OCC'), canonical_smiles('CCO'))
+		self.assertEqual(canonical_smiles('C1CC1.C1CCC1'),
+				canonical_smiles('C1CCC1.C1CC1'))
+
+	def test_ring_labels_are_reused(self):
+		canon = canonical_smiles(polyphenyl(120))
+		labels = [int(x) for x in re.findall(r'%(\d+)', canon)]
+		self.assertTrue(max(labels or [0]) <= 99)
+		self.assertEqual(parse(canon).size, 720)
+
+class ParseFileTest(unittest.TestCase):
+
+	LINES = [
+		'# A comment, then a blank line',
+		'',
+		'CCO ethanol',
+		'c1ccccc1\tbenzene ring',
+		'C1CC broken',
+		'CC(=O)O',
+		'C(C',
+	] + ['C' * n for n in range(1, 30)]
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, 'input.smi')
+		with open(self.path, 'w') as f:
+			f.write('\n'.join(self.LINES) + '\n')
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def check(self, results):
+		self.assertEqual(len(results), len(self.LINES) - 2)
+
+		ethanol, benzene, broken, acid, branch = results[:5]
+		self.assertEqual((ethanol.size, ethanol.informalName), (3, 'ethanol'))
+		self.assertEqual(benzene.informalName, 'benzene ring')
+		self.assertEqual(acid.size, 4)
+		self.assertEqual(acid.informalName, None)
+
+		for error, lineNum, smiles in ((broken, 5, 'C1CC'),
+				(branch, 7, 'C(C')):
+			self.assertTrue(isinstance(error, SmilesParseError))
+			self.assertEqual((error.lineNum, error.smiles), (lineNum, smiles))
+
+		# Input order is kept.
+		self.assertEqual([mol.size for mol in results[5:]], range(1, 30))
+
+	def test_one_worker(self):
+		self.check(parse_file(self.path))
+		self.check(list(iter_parse_file(self.path)))
+
+	def test_workers(self):
+		self.check(parse_file(self.path, workers=3, chunkSize=4))
+		self.check(list(iter_parse_file(self.path, workers=2, chunkSize=1)))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for binary molecule storage in store.py.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from smiles import smiles_to_molecule
+from molecule import Molecule
+from store import encode_molecule, decode_molecule, write_collection, \
+		MoleculeCollection
+from tests.helpers import molecule_bonds
+
+SMILES = [
+	'C',
+	'CC(=O)O',
+	'O=[N+]([O-])c1ccccc1',
+	'[13CH3]C1CC1',
+	'c1ccc2ccccc2c1',
+	'C#N',
+]
+
+def parse(smiles):
+	return smiles_to_molecule(smiles, cached=False)
+
+class RecordTest(unittest.TestCase):
+
+	def assertSameMolecule(self, mol, other):
+		self.assertEqual(other.size, mol.size)
+		self.assertEqual(list(other.types), list(mol.types))
+		self.assertEqual(list(other.charges), list(mol.charges))
+		self.assertEqual([int(x) for x in other.isotopes],
+				[int(x) for x in mol.isotopes])
+		self.assertEqual(molecule_bonds(other), molecule_bonds(mol))
+
+	def test_round_trip(self):
+		for smiles in SMILES:
+			mol = parse(smiles)
+			decoded, coords = decode_molecule(encode_molecule(mol))
+			self.assertSameMolecule(mol, decoded)
+			self.assertEqual(coords, None)
+			self.assertEqual(decoded.smiles.string, smiles)
+
+	def test_aromatic_bond_order(self):
+		mol = Molecule(['C', 'C'], bonds=[(0, 1, 1.5)])
+		decoded = decode_molecule(encode_molecule(mol))[0]
+		self.assertEqual(decoded.getBondOrder(0, 1), 1.5)
+
+	def test_inline_type(self):
+		# 'cl' has no type code.
+		mol = Molecule(['cl', 'C'], bonds=[(0, 1, 1)])
+		decoded = decode_molecule(encode_molecule(mol))[0]
+		self.assertEqual(list(decoded.types), ['cl', 'C'])
+
+	def test_coords(self):
+		mol = parse('CCO')
+		coords = {0: (1.5, -2.0), 2: (0.25, 4.0)}
+		decoded, stored = decode_molecule(encode_molecule(mol, coords))
+		self.assertEqual(stored, coords)
+
+	def test_rings(self):
+		mol = parse('c1ccc2ccccc2c1')
+		data = encode_molecule(mol, rings=True)
+		decoded = decode_molecule(data)[0]
+		self.assertEqual(sorted(sorted(r) for r in decoded.rings),
+				sorted(sorted(r) for r in mol.rings))
+
+		ring = list(mol.rings[0])
+		data = encode_molecule(mol, rings=[ring])
+		self.assertEqual([list(r) for r in decode_molecule(data)[0].rings],
+				[ring])
+
+	def test_offset(self):
+		first = encode_molecule(parse('CC'))
+		second = encode_molecule(parse('CCO'))
+		decoded = decode_molecule(first + second, len(first))[0]
+		self.assertEqual(decoded.size, 3)
+
+	def test_truncated(self):
+		data = encode_molecule(parse('c1ccccc1'))
+		self.assertRaises(Exception, decode_molecule, data[:len(data)/2])
+
+class CollectionTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, 'library.sdgc')
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_collection(self):
+		molecules = [parse(s) for s in SMILES]
+		molecules[1] = (molecules[1], {0: (1.0, 2.0)})
+		self.assertEqual(write_collection(self.path, molecules),
+				len(SMILES))
+
+		with MoleculeCollection(self.path) as library:
+			self.assertEqual(len(library), len(SMILES))
+			self.assertEqual([mol.size for mol, coords in library],
+					[parse(s).size for s in SMILES])
+			self.assertEqual(library[1][1], {0: (1.0, 2.0)})
+			self.assertEqual(library[-1][0].smiles.string, SMILES[-1])
+			self.assertEqual(decode_molecule(library.getRecord(2))[0].size,
+					library[2][0].size)
+			self.assertRaises(IndexError, library.__getitem__, len(SMILES))
+
+	def test_empty_collection(self):
+		self.assertEqual(write_collection(self.path, []), 0)
+		with MoleculeCollection(self.path) as library:
+			self.assertEqual(len(library), 0)
+			self.assertEqual(list(library), [])
+
+	def test_not_a_collection(self):
+		with open(self.path, 'wb') as f:
+			f.write('not a collection file')
+		self.assertRaises(Exception, MoleculeCollection, self.path)
+
+if __name__ == '__main__':
+	unittest.main()
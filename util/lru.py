@@ -0,0 +1,71 @@
+"""
+Bounded least recently used (LRU) mapping.
+"""
+
+from collections import OrderedDict
+
+class LRUCache(object):
+	"""
+	Mapping of at most maxSize items. Adding to a full cache evicts the
+	least recently used item; get() and put() count as uses.
+
+	Lookups and evictions are counted (see stats()).
+	"""
+
+	def __init__(self, maxSize):
+		self.maxSize = maxSize
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._items = OrderedDict() # Least recently used first
+
+	def __len__(self):
+		return len(self._items)
+
+	def __contains__(self, key):
+		return key in self._items
+
+	def get(self, key, default=None):
+		"""The item's value, or default if it is not cached."""
+		try:
+			value = self._items.pop(key)
+		except KeyError:
+			self.misses += 1
+			return default
+
+		self._items[key] = value
+		self.hits += 1
+		return value
+
+	def put(self, key, value):
+		"""Add or replace an item, evicting as needed."""
+		if key in self._items:
+			del self._items[key]
+		elif self.maxSize <= 0:
+			return
+		self._items[key] = value
+		self._evict()
+
+	def resize(self, maxSize):
+		"""Change the size limit, evicting as needed. 0 disables."""
+		self.maxSize = maxSize
+		self._evict()
+
+	def _evict(self):
+		"""Drop the least recently used items while over size."""
+		while len(self._items) > max(self.maxSize, 0):
+			self._items.popitem(last=False)
+			self.evictions += 1
+
+	def clear(self):
+		"""Drop every item and reset the counters."""
+		self._items.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def stats(self):
+		"""Counters: {'hits', 'misses', 'evictions', 'size', 'maxSize'}."""
+		return {'hits': self.hits, 'misses': self.misses,
+				'evictions': self.evictions, 'size': len(self._items),
+				'maxSize': self.maxSize}
@@ -0,0 +1,53 @@
+"""
+Chunked process pool utilities for bulk processing.
+"""
+
+from collections import deque
+
+def chunked(items, chunkSize):
+	"""Generate lists of up to chunkSize items from an iterable."""
+	chunk = []
+	for item in items:
+		chunk.append(item)
+		if len(chunk) >= chunkSize:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+def imap_chunks(func, items, workers=1, chunkSize=1000):
+	"""
+	Apply func to chunks (lists) of the items in worker processes, and
+	yield the elements of the lists it returns, in input order.
+
+	The items are consumed lazily, and at most two chunks per worker
+	are in flight at once, so memory use does not grow with the input.
+	With one worker, everything happens in this process. func must be
+	a module-level function, so that it can be pickled.
+	"""
+	if workers <= 1:
+		for chunk in chunked(items, chunkSize):
+			for result in func(chunk):
+				yield result
+		return
+
+	# Only load multiprocessing when worker processes are wanted; it
+	# is slow to import.
+	import multiprocessing
+
+	pool = multiprocessing.Pool(workers)
+	try:
+		pending = deque()
+		for chunk in chunked(items, chunkSize):
+			pending.append(pool.apply_async(func, (chunk,)))
+			if len(pending) < 2*workers:
+				continue
+			for result in pending.popleft().get():
+				yield result
+
+		while pending:
+			for result in pending.popleft().get():
+				yield result
+	finally:
+		pool.terminate()
+		pool.join()